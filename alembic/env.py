@@ -22,6 +22,7 @@ if config.config_file_name is not None:
 from app.db.models_base import Base
 from app.models.user import User
 from app.models.calorie import Calorie
+from app.models.fdc_food import FdcFood, FdcNutrient, FdcFoodNutrient, FdcFoodPortion, FdcSearchToken
 target_metadata = Base.metadata
 
 
@@ -0,0 +1,82 @@
+"""add fdc mirror tables
+
+Revision ID: 3c1f7a9d2b64
+Revises: fbd908f04808
+Create Date: 2026-10-18 10:12:41.208334
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f7a9d2b64'
+down_revision: Union[str, Sequence[str], None] = 'fbd908f04808'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('fdc_foods',
+    sa.Column('fdc_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('data_type', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('food_category', sa.String(), nullable=True),
+    sa.Column('brand_owner', sa.String(), nullable=True),
+    sa.Column('brand_name', sa.String(), nullable=True),
+    sa.Column('serving_size', sa.Float(), nullable=True),
+    sa.Column('serving_size_unit', sa.String(), nullable=True),
+    sa.Column('household_serving_text', sa.String(), nullable=True),
+    sa.Column('publication_date', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('fdc_id')
+    )
+    op.create_index(op.f('ix_fdc_foods_data_type'), 'fdc_foods', ['data_type'], unique=False)
+    op.create_table('fdc_nutrients',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('unit_name', sa.String(), nullable=True),
+    sa.Column('nutrient_number', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_fdc_nutrients_nutrient_number'), 'fdc_nutrients', ['nutrient_number'], unique=False)
+    op.create_table('fdc_food_nutrients',
+    sa.Column('fdc_id', sa.Integer(), nullable=False),
+    sa.Column('nutrient_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['fdc_id'], ['fdc_foods.fdc_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['nutrient_id'], ['fdc_nutrients.id'], ),
+    sa.PrimaryKeyConstraint('fdc_id', 'nutrient_id')
+    )
+    op.create_table('fdc_food_portions',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('fdc_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=True),
+    sa.Column('measure_unit', sa.String(), nullable=True),
+    sa.Column('modifier', sa.String(), nullable=True),
+    sa.Column('portion_description', sa.String(), nullable=True),
+    sa.Column('gram_weight', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['fdc_id'], ['fdc_foods.fdc_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_fdc_food_portions_fdc_id'), 'fdc_food_portions', ['fdc_id'], unique=False)
+    op.create_table('fdc_search_tokens',
+    sa.Column('token', sa.String(), nullable=False),
+    sa.Column('fdc_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['fdc_id'], ['fdc_foods.fdc_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('token', 'fdc_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('fdc_search_tokens')
+    op.drop_index(op.f('ix_fdc_food_portions_fdc_id'), table_name='fdc_food_portions')
+    op.drop_table('fdc_food_portions')
+    op.drop_table('fdc_food_nutrients')
+    op.drop_index(op.f('ix_fdc_nutrients_nutrient_number'), table_name='fdc_nutrients')
+    op.drop_table('fdc_nutrients')
+    op.drop_index(op.f('ix_fdc_foods_data_type'), table_name='fdc_foods')
+    op.drop_table('fdc_foods')
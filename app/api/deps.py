@@ -7,8 +7,22 @@ from app.utils.exceptions import (
     NotFoundException,
     MethodNotAllowedException,
     UnprocessableEntityException,
+    ServiceUnavailableException,
 )
 from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def get_request_db(request: Request) -> AsyncSession:
+    """
+    Return the request's database session, opening it on first use.
+    Requires DBSessionMiddleware, which closes the session after the response.
+    """
+    db_session = getattr(request.state, "db_session", None)
+    if db_session is None:
+        raise RuntimeError("DBSessionMiddleware is not installed")
+    return db_session.get()
+
 
 class BaseController:
     def __init__(self, prefix: str):
@@ -36,6 +50,7 @@ class BaseController:
             NotFoundException,
             MethodNotAllowedException,
             UnprocessableEntityException,
+            ServiceUnavailableException,
             HTTPException,
         ) as exc:
             return self.handle_http_exception(exc)
@@ -52,6 +67,7 @@ class BaseController:
             NotFoundException,
             MethodNotAllowedException,
             UnprocessableEntityException,
+            ServiceUnavailableException,
             HTTPException,
         ) as exc:
             return self.handle_http_exception(exc)
@@ -70,6 +86,7 @@ class BaseController:
             NotFoundException,
             MethodNotAllowedException,
             UnprocessableEntityException,
+            ServiceUnavailableException,
             HTTPException,
         ) as exc:
             return self.handle_http_exception(exc)
@@ -86,6 +103,7 @@ class BaseController:
             NotFoundException,
             MethodNotAllowedException,
             UnprocessableEntityException,
+            ServiceUnavailableException,
             HTTPException,
         ) as exc:
             return self.handle_http_exception(exc)
@@ -102,6 +120,7 @@ class BaseController:
             NotFoundException,
             MethodNotAllowedException,
             UnprocessableEntityException,
+            ServiceUnavailableException,
             HTTPException,
         ) as exc:
             return self.handle_http_exception(exc)
@@ -1,8 +1,8 @@
 from fastapi import Request
-from app.api.deps import BaseController
+from app.api.deps import BaseController, get_request_db
 from app.managers.user_manager import UserManager
 from app.schemas.auth import UserLogin
-from app.middleware.security import verify_password
+from app.managers.password_hash_manager import PasswordHashManager
 from app.processors.auth_processor import AuthProcessor
 from app.utils.exceptions import UnauthorizedException
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,9 +12,13 @@ class LoginController(BaseController):
     async def process_post(self, request: Request):
         data = await request.json()
         login_data = UserLogin(**data)
-        db: AsyncSession = request.state.db
+        db: AsyncSession = get_request_db(request)
         user = await UserManager.get_by_email(db, login_data.email)
-        if not user or not verify_password(login_data.password, user.password_hash, user.password_salt):
+        if user:
+            valid = await PasswordHashManager.verify_password(login_data.password, user.password_hash, user.password_salt)
+        else:
+            valid = await PasswordHashManager.verify_password(login_data.password, None)
+        if not valid:
             raise UnauthorizedException("Invalid credentials")
         await UserManager.update_last_login(db, user)
         access_token = AuthProcessor.create_access_token({"sub": str(user.uuid), "email": user.email})
@@ -1,8 +1,8 @@
 from fastapi import Request
-from app.api.deps import BaseController
+from app.api.deps import BaseController, get_request_db
 from app.managers.user_manager import UserManager
 from app.schemas.auth import UserCreate, UserRead
-from app.middleware.security import hash_password
+from app.managers.password_hash_manager import PasswordHashManager
 from app.utils.exceptions import BadRequestException
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.processors.auth_processor import AuthProcessor
@@ -12,11 +12,11 @@ class RegisterController(BaseController):
     async def process_post(self, request: Request):
         data = await request.json()
         user_data = UserCreate(**data)
-        db: AsyncSession = request.state.db
+        db: AsyncSession = get_request_db(request)
         existing = await UserManager.get_by_email(db, user_data.email)
         if existing:
             raise BadRequestException("Email already registered")
-        password_hash, password_salt = hash_password(user_data.password)
+        password_hash, password_salt = await PasswordHashManager.hash_password(user_data.password)
         user = await UserManager.create_user(
             db,
             name=user_data.name,
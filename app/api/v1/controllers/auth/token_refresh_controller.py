@@ -2,7 +2,6 @@ from fastapi import Request
 from app.api.deps import BaseController
 from app.processors.auth_processor import AuthProcessor
 from app.utils.exceptions import UnauthorizedException
-from sqlalchemy.ext.asyncio import AsyncSession
 from app.managers.redis_manager import RedisManager
 
 class RefreshController(BaseController):
@@ -12,7 +11,6 @@ class RefreshController(BaseController):
 
     async def process_post(self, request: Request):
         data = await request.json()
-        db: AsyncSession = request.state.db
         token = data.get("refresh_token")
         if await RedisManager.get_key(f"blacklist:{token}"):
             raise UnauthorizedException("Refresh token is blacklisted")
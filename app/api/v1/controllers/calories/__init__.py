@@ -1,5 +1,7 @@
 from .usda_recipe_search_controller import UsdaRecipeSearchController
+from .usda_meal_search_controller import UsdaMealSearchController
 
 routes = [
-    UsdaRecipeSearchController("/calories/usda-recipe-search").router
+    UsdaRecipeSearchController("/calories/usda-recipe-search").router,
+    UsdaMealSearchController("/calories/usda-meal-search").router
 ]
@@ -0,0 +1,32 @@
+from fastapi import Request
+from pydantic import ValidationError
+from app.api.deps import BaseController
+from app.config.settings import settings
+from app.managers.calorie_history_manager import CalorieHistoryManager
+from app.processors.calorie_processor import CalorieProcessor
+from app.schemas.calorie import MealSearchRequest
+from app.utils.exceptions import BadRequestException
+
+class UsdaMealSearchController(BaseController):
+    async def process_post(self, request: Request):
+        try:
+            meal = MealSearchRequest(**await request.json())
+        except (ValueError, TypeError, ValidationError) as exc:
+            raise BadRequestException(f"Invalid meal payload: {exc}")
+        if len(meal.items) > settings.MEAL_MAX_ITEMS:
+            raise BadRequestException(f"A meal can contain at most {settings.MEAL_MAX_ITEMS} items.")
+        result = await CalorieProcessor.lookup_meal(meal.items)
+        if result["resolved"]:
+            resolved = [item for item in result["items"] if item["status"] == "ok"]
+            CalorieHistoryManager.record(
+                title=", ".join(item["query"] for item in resolved),
+                ingredients=[
+                    {
+                        "query": item["query"], "servings": item["servings"], "unit": item["portion"]["unit"],
+                        "grams": item["portion"]["grams"], "food_id": item["best_match"]["food_id"],
+                    }
+                    for item in resolved
+                ],
+                calories=result["totals"]["calories"],
+            )
+        return result
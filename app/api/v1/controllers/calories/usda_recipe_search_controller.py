@@ -1,15 +1,15 @@
+from typing import Optional, Tuple
 from fastapi import Request
+from fastapi.responses import JSONResponse
 from app.api.deps import BaseController
-from app.services.external_services.calorie_service import CalorieService
-from app.config.settings import Settings
-from app.utils.exceptions import BadRequestException
-from app.utils.fuzzy_matcher import fuzzy_compare
-
-settings = Settings()
+from app.managers.calorie_history_manager import CalorieHistoryManager
+from app.processors.calorie_processor import CalorieProcessor
+from app.utils.exceptions import BadRequestException, NotFoundException
+from app.utils.portion_engine import UnknownUnitError
 
 class UsdaRecipeSearchController(BaseController):
-    async def process_get(self, request: Request):
-        query = request.query_params.get("query")
+    @staticmethod
+    def _portion_params(request: Request) -> Tuple[float, Optional[str]]:
         servings = request.query_params.get("servings", 1)
         try:
             servings = float(servings)
@@ -17,51 +17,40 @@ class UsdaRecipeSearchController(BaseController):
                 raise BadRequestException("Servings must be a positive number.")
         except ValueError:
             raise BadRequestException("Servings must be a number.")
+        return servings, request.query_params.get("unit") or None
+
+    async def process_get(self, request: Request):
+        query = request.query_params.get("query")
+        servings, unit = self._portion_params(request)
 
         if not query:
             raise BadRequestException("Query parameter is required.")
-        service = CalorieService(api_key=settings.USDA_API_KEY)
-        response = await service.async_search_food(query)
-        # If response is an httpx.Response, get .json()
-        if hasattr(response, "json") and callable(response.json):
-            data = await response.json() if hasattr(response, "_content_consumed") else response.json()
-        else:
-            data = response
-        if total_hits := data.get("totalHits", 0) == 0:
+        try:
+            result = await CalorieProcessor.lookup(query, servings, unit)
+        except UnknownUnitError as exc:
+            raise BadRequestException(str(exc))
+        if result is None:
             return {"message": "No results found for the given query."}
-        foods = data.get("foods", [])
-        best_match = CalorieService.get_best_fuzzy_match(query, foods)
-        calories = None
-        calorie_unit = None
-        carbs = None
-        fat = None
-        protein = None
-        if best_match:
-            for nutrient in best_match.get('foodNutrients', []):
-                nutrient_name = nutrient.get('nutrientName', '')
-                nutrient_number = nutrient.get('nutrientNumber')
+        portion = result["portion"]
+        CalorieHistoryManager.record(
+            title=query,
+            ingredients=[{
+                "query": query, "servings": servings, "unit": portion["unit"], "grams": portion["grams"],
+                "food_id": result["best_match"]["food_id"],
+            }],
+            calories=portion["calories"],
+        )
+        return result
 
-                # Using fuzzy matching for nutrient names and ensuring we only take the first match
-                if calories is None and (fuzzy_compare(nutrient_name, 'Energy')['is_fuzzy_match'] or nutrient_number == '208'):
-                    calories = nutrient.get('value')
-                    calorie_unit = nutrient.get('unitName')
-                elif carbs is None and (fuzzy_compare(nutrient_name, 'Carbohydrate, by difference')['is_fuzzy_match'] or nutrient_number == '205'):
-                    carbs = nutrient.get('value')
-                elif fat is None and (fuzzy_compare(nutrient_name, 'Total lipid (fat)')['is_fuzzy_match'] or nutrient_number == '204'):
-                    fat = nutrient.get('value')
-                elif protein is None and (fuzzy_compare(nutrient_name, 'Protein')['is_fuzzy_match'] or nutrient_number == '203'):
-                    protein = nutrient.get('value')
-        return {
-            "best_match": {
-                "description": best_match.get("description"),
-                "food_id": best_match.get("fdcId"),
-                "data_type": best_match.get("dataType"),
-                "brand_owner": best_match.get("brandOwner"),
-                "food_category": best_match.get("foodCategory"),
-            },
-            "calories": calories,
-            "calorie_unit": calorie_unit,
-            "carbohydrates_g": carbs,
-            "fat_g": fat,
-            "protein_g": protein
-        }
\ No newline at end of file
+    async def process_get_by_id(self, item_id: int, request: Request):
+        if item_id <= 0:
+            raise BadRequestException("Food id must be a positive integer.")
+        servings, unit = self._portion_params(request)
+        try:
+            result = await CalorieProcessor.food_details(item_id, servings, unit)
+        except UnknownUnitError as exc:
+            raise BadRequestException(str(exc))
+        if result is None:
+            raise NotFoundException("Food not found.")
+        # Already plain JSON from FDC; jsonable_encoder would take longer than the rest of the request
+        return JSONResponse(result)
@@ -14,6 +14,22 @@ class Settings:
     DB_PORT: str = os.getenv('POSTGRES_PORT', '5432')
     DB_NAME: str = os.getenv('POSTGRES_DB', 'meal_calorie_db')
 
+    # Engine and connection pool
+    DB_ECHO: bool = os.getenv('DB_ECHO', 'false').lower() == 'true'
+    DB_POOL_SIZE: int = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW: int = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT: float = float(os.getenv('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE: int = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING: bool = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 500))
+
+    # SQLite connection profile
+    SQLITE_PRAGMAS_ENABLED: bool = os.getenv('SQLITE_PRAGMAS_ENABLED', 'true').lower() == 'true'
+    SQLITE_JOURNAL_MODE: str = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS: str = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE: int = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
     REDIS_HOST: str = os.getenv('REDIS_HOST', 'localhost')
     REDIS_PORT: int = int(os.getenv('REDIS_PORT', 6379))
     REDIS_DB: int = int(os.getenv('REDIS_DB', 1))
@@ -21,8 +37,131 @@ class Settings:
 
     JWT_SECRET: str = os.getenv('JWT_SECRET', 'supersecretjwt')
     JWT_ALGORITHM: str = os.getenv('JWT_ALGORITHM', 'HS256')
+    # Cache of already-verified access tokens used by the auth middleware
+    TOKEN_CACHE_ENABLED: bool = os.getenv('TOKEN_CACHE_ENABLED', 'true').lower() == 'true'
+    TOKEN_CACHE_SIZE: int = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+
+    # Password hashing (bcrypt runs on a dedicated thread pool)
+    BCRYPT_ROUNDS: int = int(os.getenv('BCRYPT_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+    PASSWORD_HASH_QUEUE_LIMIT: int = int(os.getenv('PASSWORD_HASH_QUEUE_LIMIT', 64))
 
     USDA_API_KEY: str = os.getenv('USDA_API_KEY', '')
+    USDA_API_TIMEOUT: float = float(os.getenv('USDA_API_TIMEOUT', 10))
+    # FoodData Central API root; point it at a stand-in server for load tests
+    USDA_API_BASE_URL: str = os.getenv('USDA_API_BASE_URL', 'https://api.nal.usda.gov/fdc/v1/')
+    # Parse search responses as they stream in, keeping only the fields used
+    # for ranking and nutrients (see app/utils/food_search_parser.py)
+    USDA_STREAM_PARSE: bool = os.getenv('USDA_STREAM_PARSE', 'false').lower() == 'true'
+
+    # Where food searches are answered from: "remote" (USDA API), "local"
+    # (imported FoodData Central mirror) or "hybrid" (local, then remote on no hits)
+    CALORIE_SEARCH_MODE: str = os.getenv('CALORIE_SEARCH_MODE', 'remote')
+
+    # Nutrients reported in addition to calories/carbs/fat/protein,
+    # e.g. "fiber_g,sodium_mg" (see app/utils/nutrient_resolver.py)
+    EXTRA_NUTRIENTS: list = [key.strip() for key in os.getenv('EXTRA_NUTRIENTS', '').split(',') if key.strip()]
+
+    # Batch meal search
+    MEAL_MAX_ITEMS: int = int(os.getenv('MEAL_MAX_ITEMS', 25))
+    MEAL_SEARCH_CONCURRENCY: int = int(os.getenv('MEAL_SEARCH_CONCURRENCY', 5))
+    MEAL_REQUEST_TIMEOUT: float = float(os.getenv('MEAL_REQUEST_TIMEOUT', 15))
+
+    # Write-behind persistence of calorie calculations
+    CALORIE_HISTORY_ENABLED: bool = os.getenv('CALORIE_HISTORY_ENABLED', 'true').lower() == 'true'
+    CALORIE_HISTORY_QUEUE_SIZE: int = int(os.getenv('CALORIE_HISTORY_QUEUE_SIZE', 10000))
+    CALORIE_HISTORY_BATCH_SIZE: int = int(os.getenv('CALORIE_HISTORY_BATCH_SIZE', 500))
+    CALORIE_HISTORY_FLUSH_INTERVAL: float = float(os.getenv('CALORIE_HISTORY_FLUSH_INTERVAL', 2))
+
+    # Shared outbound HTTP client settings
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv('HTTP_MAX_CONNECTIONS', 100))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', 20))
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 30))
+    HTTP_TIMEOUT: float = float(os.getenv('HTTP_TIMEOUT', 10))
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+    HTTP2_ENABLED: bool = os.getenv('HTTP2_ENABLED', 'false').lower() == 'true'
+
+    # USDA search response cache (L1 in-process, L2 Redis)
+    SEARCH_CACHE_ENABLED: bool = os.getenv('SEARCH_CACHE_ENABLED', 'true').lower() == 'true'
+    SEARCH_CACHE_REDIS_ENABLED: bool = os.getenv('SEARCH_CACHE_REDIS_ENABLED', 'true').lower() == 'true'
+    SEARCH_CACHE_TTL: int = int(os.getenv('SEARCH_CACHE_TTL', 3600))
+    SEARCH_CACHE_STALE_TTL: int = int(os.getenv('SEARCH_CACHE_STALE_TTL', 86400))
+    SEARCH_CACHE_MAX_ENTRIES: int = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 4096))
+    SEARCH_CACHE_MAX_BYTES: int = int(os.getenv('SEARCH_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    SEARCH_CACHE_REDIS_RETRY_SECONDS: int = int(os.getenv('SEARCH_CACHE_REDIS_RETRY_SECONDS', 30))
+
+    # Coalescing of concurrent identical USDA searches across workers
+    SEARCH_COALESCE_DISTRIBUTED: bool = os.getenv('SEARCH_COALESCE_DISTRIBUTED', 'true').lower() == 'true'
+    SEARCH_COALESCE_LOCK_TTL_MS: int = int(os.getenv('SEARCH_COALESCE_LOCK_TTL_MS', 10000))
+    SEARCH_COALESCE_WAIT_TIMEOUT: float = float(os.getenv('SEARCH_COALESCE_WAIT_TIMEOUT', 5))
+    SEARCH_COALESCE_REDIS_RETRY_SECONDS: int = int(os.getenv('SEARCH_COALESCE_REDIS_RETRY_SECONDS', 30))
+
+    # Ratio above which `fuzzy_compare` reports two strings as a match
+    FUZZY_MATCH_THRESHOLD: float = 0.85
+
+    # Adaptive USDA search: start with a small page, fetch further pages
+    # concurrently only while no result scores at least the confidence ratio
+    # (by default the fuzzy match threshold, so match quality is unchanged)
+    SEARCH_ADAPTIVE_ENABLED: bool = os.getenv('SEARCH_ADAPTIVE_ENABLED', 'true').lower() == 'true'
+    SEARCH_ADAPTIVE_PAGE_SIZES: list = [int(size) for size in os.getenv('SEARCH_ADAPTIVE_PAGE_SIZES', '10,25,50,100').split(',')]
+    SEARCH_ADAPTIVE_MAX_RESULTS: int = int(os.getenv('SEARCH_ADAPTIVE_MAX_RESULTS', 100))
+    SEARCH_ADAPTIVE_CONFIDENCE: float = float(os.getenv('SEARCH_ADAPTIVE_CONFIDENCE', FUZZY_MATCH_THRESHOLD))
+    SEARCH_ADAPTIVE_FANOUT: int = int(os.getenv('SEARCH_ADAPTIVE_FANOUT', 3))
+    SEARCH_ADAPTIVE_MAX_QUERIES: int = int(os.getenv('SEARCH_ADAPTIVE_MAX_QUERIES', 10000))
+    SEARCH_SPLIT_ENABLED: bool = os.getenv('SEARCH_SPLIT_ENABLED', 'false').lower() == 'true'
+    SEARCH_SPLIT_GROUPS: list = [
+        [data_type.strip() for data_type in group.split(',') if data_type.strip()]
+        for group in os.getenv('SEARCH_SPLIT_GROUPS', 'Foundation,SR Legacy;Survey (FNDDS);Branded').split(';')
+        if group.strip()
+    ]
+    SEARCH_SPLIT_PRIORITY: dict = {
+        data_type.strip(): float(weight)
+        for data_type, _, weight in (
+            item.rpartition('=')
+            for item in os.getenv('SEARCH_SPLIT_PRIORITY', 'Foundation=1.0,SR Legacy=1.0,Survey (FNDDS)=0.95,Branded=0.9').split(',')
+            if item.strip()
+        )
+    }
+    SEARCH_SPLIT_PAGE_SIZE: int = int(os.getenv('SEARCH_SPLIT_PAGE_SIZE', 10))
+    SEARCH_SPLIT_TIMEOUT: float = float(os.getenv('SEARCH_SPLIT_TIMEOUT', 3))
+    FOOD_DETAIL_BATCH_SIZE: int = int(os.getenv('FOOD_DETAIL_BATCH_SIZE', 20))
+    FOOD_DETAIL_BATCH_WINDOW_MS: float = float(os.getenv('FOOD_DETAIL_BATCH_WINDOW_MS', 10))
+    FOOD_DETAIL_CACHE_MAX_ENTRIES: int = int(os.getenv('FOOD_DETAIL_CACHE_MAX_ENTRIES', 10000))
+    FOOD_DETAIL_CACHE_MAX_BYTES: int = int(os.getenv('FOOD_DETAIL_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+    PORTION_CACHE_MAX_ENTRIES: int = int(os.getenv('PORTION_CACHE_MAX_ENTRIES', 50000))
+    PORTION_CACHE_TTL: int = int(os.getenv('PORTION_CACHE_TTL', 86400))
+
+    # Request rate limiting (sliding_window or token_bucket)
+    RATE_LIMIT: int = int(os.getenv('RATE_LIMIT', 60))
+    RATE_LIMIT_WINDOW_SECONDS: int = int(os.getenv('RATE_LIMIT_WINDOW_SECONDS', 60))
+    RATE_LIMIT_STRATEGY: str = os.getenv('RATE_LIMIT_STRATEGY', 'sliding_window')
+    RATE_LIMIT_REDIS_ENABLED: bool = os.getenv('RATE_LIMIT_REDIS_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_REDIS_RETRY_SECONDS: int = int(os.getenv('RATE_LIMIT_REDIS_RETRY_SECONDS', 30))
+    RATE_LIMIT_MAX_LOCAL_KEYS: int = int(os.getenv('RATE_LIMIT_MAX_LOCAL_KEYS', 10000))
+    # 'exact' checks Redis on every request; 'leased' admits from locally reserved quota slices
+    RATE_LIMIT_MODE: str = os.getenv('RATE_LIMIT_MODE', 'exact')
+    RATE_LIMIT_LEASE_FRACTION: float = float(os.getenv('RATE_LIMIT_LEASE_FRACTION', 0.05))
+    RATE_LIMIT_SYNC_INTERVAL_MS: int = int(os.getenv('RATE_LIMIT_SYNC_INTERVAL_MS', 250))
+
+    # Prometheus metrics at /metrics
+    METRICS_ENABLED: bool = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_MULTIPROC_DIR: str = os.getenv('METRICS_MULTIPROC_DIR', '')
+    METRICS_FLUSH_INTERVAL: float = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+    # /metrics needs `Authorization: Bearer <METRICS_TOKEN>` unless METRICS_PUBLIC is set
+    METRICS_TOKEN: str = os.getenv('METRICS_TOKEN', '')
+    METRICS_PUBLIC: bool = os.getenv('METRICS_PUBLIC', 'false').lower() == 'true'
+
+    # Logging (see app/utils/LOGGER_README.md)
+    LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FILE: str = os.getenv('LOG_FILE', '')
+    LOG_ENABLE_CONSOLE: bool = os.getenv('LOG_ENABLE_CONSOLE', 'true').lower() == 'true'
+    LOG_ENABLE_FILE: bool = os.getenv('LOG_ENABLE_FILE', 'true').lower() == 'true'
+    LOG_FORMAT: str = os.getenv('LOG_FORMAT', 'text')
+    LOG_ASYNC: bool = os.getenv('LOG_ASYNC', 'true').lower() == 'true'
+    LOG_QUEUE_SIZE: int = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    LOG_SAMPLE_REQUEST: float = float(os.getenv('LOG_SAMPLE_REQUEST', 1.0))
+    LOG_SAMPLE_API_CALL: float = float(os.getenv('LOG_SAMPLE_API_CALL', 1.0))
+    LOG_SAMPLE_DATABASE: float = float(os.getenv('LOG_SAMPLE_DATABASE', 1.0))
 
     @property
     def database_url(self):
@@ -1,10 +1,78 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from typing import List, Optional
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.config.settings import settings
+from app.utils.metrics import REGISTRY
 
 DATABASE_URL = settings.database_url
 
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+
+def sqlite_pragmas() -> List[str]:
+    """PRAGMAs run on every new SQLite connection (see the SQLITE_* settings)."""
+    return [
+        f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def create_engine(url: str = DATABASE_URL, echo: Optional[bool] = None, tune_sqlite: Optional[bool] = None) -> AsyncEngine:
+    """
+    Build the async engine from the DB_* settings: pool sizing, timeouts,
+    recycling and pre-ping for server databases, the asyncpg prepared
+    statement cache, and the SQLite PRAGMA profile.
+    """
+    options = {"echo": settings.DB_ECHO if echo is None else echo, "future": True}
+    is_sqlite = url.startswith("sqlite")
+    if not (is_sqlite and ":memory:" in url):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+    if url.startswith("postgresql+asyncpg"):
+        # 0 disables prepared statements, e.g. behind pgbouncer in transaction mode
+        options["connect_args"] = {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    engine = create_async_engine(url, **options)
+
+    if is_sqlite and (settings.SQLITE_PRAGMAS_ENABLED if tune_sqlite is None else tune_sqlite):
+        pragmas = sqlite_pragmas()
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    return engine
+
+
+engine = create_engine(DATABASE_URL)
+
+DB_SESSIONS_OPENED = REGISTRY.counter("db_sessions_opened_total", "Request database sessions actually opened")
+
+
+def _collect_pool_metrics():
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return []
+    return [
+        ("db_pool_size", "gauge", "Configured connection pool size", (), [((), pool.size())]),
+        ("db_pool_connections", "gauge", "Pool connections by state", ("state",), [
+            (("checked_out",), pool.checkedout()),
+            (("idle",), pool.checkedin()),
+            (("overflow",), max(0, pool.overflow())),
+        ]),
+    ]
+
+
+REGISTRY.register_collector(_collect_pool_metrics)
 
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -15,3 +83,30 @@ AsyncSessionLocal = sessionmaker(
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+
+class LazySession:
+    """
+    Request-scoped session holder. No session is created, and no pool
+    connection checked out, until `get()` is first called.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self._session_factory = session_factory
+        self._session = None
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    def get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._session_factory()
+            DB_SESSIONS_OPENED.labels().inc()
+        return self._session
+
+    async def close(self):
+        """Close the session if one was opened; uncommitted work is rolled back."""
+        if self._session is not None:
+            session, self._session = self._session, None
+            await session.close()
@@ -1,15 +1,44 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from app.config.settings import settings
 from app.api.v1.controllers import all_routers as v1_routers
 from app.middleware.authentication_middleware import CustomAuthMiddleware
 from app.middleware.rate_limiter import RateLimiterMiddleware
 from app.middleware.security import SecurityHeadersMiddleware, DBSessionMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.managers.http_client_manager import HttpClientManager
+from app.managers.redis_manager import RedisManager
+from app.managers.calorie_history_manager import CalorieHistoryManager
+from app.managers.password_hash_manager import PasswordHashManager
+from app.managers.metrics_manager import MetricsManager
 
-app = FastAPI(title="Meal Calorie Counter API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start shared clients and background writers; flush and close them on shutdown
+    await HttpClientManager.get_client()
+    await CalorieHistoryManager.start()
+    await MetricsManager.start()
+    yield
+    await MetricsManager.stop()
+    await CalorieHistoryManager.stop()
+    await HttpClientManager.close_client()
+    await RedisManager.close_client()
+    PasswordHashManager.close_executor()
+
+
+app = FastAPI(title="Meal Calorie Counter API", lifespan=lifespan)
 
 app.add_middleware(CustomAuthMiddleware)
-app.add_middleware(RateLimiterMiddleware, max_requests=60, window_seconds=60)
+# Rate limiting runs before authentication so rejected tokens are limited too;
+# it reads the user from the token itself to key limits on the user
+app.add_middleware(RateLimiterMiddleware)
 app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(DBSessionMiddleware)
+if settings.METRICS_ENABLED:
+    # Outermost, so request timings include every other middleware
+    app.add_middleware(MetricsMiddleware)
 
 for router in v1_routers:
     app.include_router(router, prefix="/api/v1")
@@ -18,3 +47,9 @@ for router in v1_routers:
 @app.get("/")
 def root():
     return {"message": "Welcome to the Meal Calorie Counter API!"}
+
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(MetricsManager.render(), media_type="text/plain; version=0.0.4")
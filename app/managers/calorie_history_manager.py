@@ -0,0 +1,117 @@
+import asyncio
+import json
+import time
+from typing import Optional
+from uuid import uuid4
+from app.config.settings import settings
+from app.managers.calorie_manager import CalorieManager
+from app.utils import get_current_datetime, error
+
+
+class CalorieHistoryManager:
+    """
+    Write-behind persistence of calorie calculations.
+
+    Request handlers call `record()`, which only puts the row on a bounded
+    asyncio queue. A background task flushes the queue with bulk INSERTs
+    whenever `CALORIE_HISTORY_BATCH_SIZE` rows are waiting or every
+    `CALORIE_HISTORY_FLUSH_INTERVAL` seconds, and drains it on shutdown.
+    When the queue is full new rows are dropped (and counted) rather than
+    slowing down the request path.
+    """
+    _queue: Optional[asyncio.Queue] = None
+    _task: Optional[asyncio.Task] = None
+    _wakeup: Optional[asyncio.Event] = None
+    _stopping: bool = False
+    _session_factory = None
+    _counters: dict = {
+        "enqueued": 0,
+        "dropped": 0,
+        "written": 0,
+        "failed": 0,
+        "batches": 0,
+        "last_flush_seconds": 0.0,
+    }
+
+    @classmethod
+    async def start(cls, session_factory=None):
+        if cls._task is not None or not settings.CALORIE_HISTORY_ENABLED:
+            return
+        if session_factory is None:
+            from app.db.database import AsyncSessionLocal
+            session_factory = AsyncSessionLocal
+        cls._session_factory = session_factory
+        cls._queue = asyncio.Queue(maxsize=settings.CALORIE_HISTORY_QUEUE_SIZE)
+        cls._wakeup = asyncio.Event()
+        cls._stopping = False
+        cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls):
+        """Stop the writer after flushing everything still queued."""
+        if cls._task is None:
+            return
+        cls._stopping = True
+        cls._wakeup.set()
+        await cls._task
+        cls._task = None
+        cls._queue = None
+
+    @classmethod
+    def record(cls, title: str, ingredients, calories: Optional[float]) -> bool:
+        """
+        Queue a calculation for persistence. Returns False if it was not
+        queued (writer not running, no calorie value, or queue full).
+        """
+        if cls._queue is None or cls._stopping or calories is None:
+            return False
+        now = get_current_datetime()
+        row = {
+            "uuid": str(uuid4()),
+            "title": title,
+            "ingredients": ingredients if isinstance(ingredients, str) else json.dumps(ingredients, separators=(",", ":")),
+            "calorie_calculation": float(calories),
+            "created_at": now,
+            "updated_at": now,
+        }
+        try:
+            cls._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            cls._counters["dropped"] += 1
+            return False
+        cls._counters["enqueued"] += 1
+        if cls._queue.qsize() >= settings.CALORIE_HISTORY_BATCH_SIZE:
+            cls._wakeup.set()
+        return True
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {**cls._counters, "queue_depth": cls._queue.qsize() if cls._queue else 0}
+
+    @classmethod
+    async def _run(cls):
+        while not cls._stopping:
+            try:
+                await asyncio.wait_for(cls._wakeup.wait(), settings.CALORIE_HISTORY_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            cls._wakeup.clear()
+            await cls._flush()
+        await cls._flush()
+
+    @classmethod
+    async def _flush(cls):
+        while not cls._queue.empty():
+            batch = []
+            while len(batch) < settings.CALORIE_HISTORY_BATCH_SIZE and not cls._queue.empty():
+                batch.append(cls._queue.get_nowait())
+            started = time.perf_counter()
+            try:
+                async with cls._session_factory() as db:
+                    await CalorieManager.bulk_create(db, batch)
+                cls._counters["written"] += len(batch)
+                cls._counters["batches"] += 1
+            except Exception as exc:
+                cls._counters["failed"] += len(batch)
+                error("Failed to persist calorie calculations", rows=len(batch), exception=str(exc))
+            cls._counters["last_flush_seconds"] = time.perf_counter() - started
@@ -0,0 +1,15 @@
+from typing import List
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.calorie import Calorie
+from app.utils import log_function_call
+
+class CalorieManager:
+    @staticmethod
+    @log_function_call(histogram="db.calorie.bulk_create")
+    async def bulk_create(db: AsyncSession, rows: List[dict]):
+        """Insert many calorie calculations in one executemany round trip."""
+        if not rows:
+            return
+        await db.execute(insert(Calorie), rows)
+        await db.commit()
@@ -0,0 +1,160 @@
+import math
+from typing import Iterable, List, Optional
+from sqlalchemy import func
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.settings import settings
+from app.models.fdc_food import FdcFood, FdcNutrient, FdcFoodNutrient, FdcFoodPortion, FdcSearchToken
+from app.utils import log_function_call
+from app.utils.fuzzy_matcher import tokenize
+
+
+class FdcManager:
+    """Queries against the local FoodData Central mirror."""
+
+    @staticmethod
+    async def insert_ignore(db: AsyncSession, model, rows: List[dict]):
+        """Bulk insert rows, skipping ones whose primary key already exists."""
+        if not rows:
+            return
+        if settings.DB_BACKEND == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        await db.execute(dialect_insert(model).on_conflict_do_nothing(), rows)
+
+    @staticmethod
+    @log_function_call(histogram="db.fdc.search_foods")
+    async def search_foods(db: AsyncSession, query: str, page_size: int = 100, data_types: Optional[Iterable[str]] = None) -> dict:
+        """
+        Token search over the local mirror. Foods are ranked by the number of
+        query tokens they contain, shorter descriptions first. The result has
+        the same shape as the FDC `foods/search` response.
+        """
+        tokens = sorted(set(tokenize(query)))
+        if not tokens:
+            return FdcManager._search_response([], 0, page_size)
+
+        matches = (
+            select(FdcSearchToken.fdc_id, func.count().label("hits"))
+            .where(FdcSearchToken.token.in_(tokens))
+            .group_by(FdcSearchToken.fdc_id)
+            .subquery()
+        )
+        ranked = select(FdcFood, matches.c.hits).join(matches, matches.c.fdc_id == FdcFood.fdc_id)
+        total = select(func.count()).select_from(matches).join(FdcFood, matches.c.fdc_id == FdcFood.fdc_id)
+        if data_types:
+            ranked = ranked.where(FdcFood.data_type.in_(list(data_types)))
+            total = total.where(FdcFood.data_type.in_(list(data_types)))
+        ranked = ranked.order_by(matches.c.hits.desc(), func.length(FdcFood.description), FdcFood.fdc_id).limit(page_size)
+
+        foods = [row[0] for row in (await db.execute(ranked)).all()]
+        total_hits = (await db.execute(total)).scalar() or 0
+        nutrients = await FdcManager._nutrients_for(db, [food.fdc_id for food in foods])
+        return FdcManager._search_response(
+            [FdcManager.to_search_food(food, nutrients.get(food.fdc_id, [])) for food in foods],
+            total_hits,
+            page_size,
+        )
+
+    @staticmethod
+    @log_function_call(histogram="db.fdc.get_foods")
+    async def get_foods(db: AsyncSession, fdc_ids: List[int]) -> dict:
+        """
+        Return fdcId -> food for the mirrored foods among `fdc_ids`, in the
+        shape of the FDC food details response (`to_details_food`).
+        """
+        if not fdc_ids:
+            return {}
+        result = await db.execute(select(FdcFood).where(FdcFood.fdc_id.in_(list(fdc_ids))))
+        foods = result.scalars().all()
+        found = [food.fdc_id for food in foods]
+        nutrients = await FdcManager._nutrients_for(db, found)
+        portions = await FdcManager.get_portions(db, found)
+        return {
+            food.fdc_id: FdcManager.to_details_food(food, nutrients.get(food.fdc_id, []), portions.get(food.fdc_id, []))
+            for food in foods
+        }
+
+    @staticmethod
+    async def get_portions(db: AsyncSession, fdc_ids: List[int]) -> dict:
+        if not fdc_ids:
+            return {}
+        result = await db.execute(select(FdcFoodPortion).where(FdcFoodPortion.fdc_id.in_(fdc_ids)))
+        portions = {}
+        for portion in result.scalars().all():
+            portions.setdefault(portion.fdc_id, []).append(portion)
+        return portions
+
+    @staticmethod
+    async def _nutrients_for(db: AsyncSession, fdc_ids: List[int]) -> dict:
+        if not fdc_ids:
+            return {}
+        result = await db.execute(
+            select(FdcFoodNutrient.fdc_id, FdcFoodNutrient.amount, FdcNutrient)
+            .join(FdcNutrient, FdcNutrient.id == FdcFoodNutrient.nutrient_id)
+            .where(FdcFoodNutrient.fdc_id.in_(fdc_ids))
+        )
+        nutrients = {}
+        for fdc_id, amount, nutrient in result.all():
+            nutrients.setdefault(fdc_id, []).append({
+                "nutrientId": nutrient.id,
+                "nutrientName": nutrient.name,
+                "nutrientNumber": nutrient.nutrient_number,
+                "unitName": nutrient.unit_name,
+                "value": amount,
+            })
+        return nutrients
+
+    @staticmethod
+    def to_search_food(food: FdcFood, food_nutrients: list) -> dict:
+        return {
+            "fdcId": food.fdc_id,
+            "description": food.description,
+            "dataType": food.data_type,
+            "brandOwner": food.brand_owner,
+            "brandName": food.brand_name,
+            "foodCategory": food.food_category,
+            "servingSize": food.serving_size,
+            "servingSizeUnit": food.serving_size_unit,
+            "householdServingFullText": food.household_serving_text,
+            "publishedDate": food.publication_date,
+            "foodNutrients": food_nutrients,
+        }
+
+    @staticmethod
+    def to_details_food(food: FdcFood, food_nutrients: list, portions: List[FdcFoodPortion]) -> dict:
+        details = FdcManager.to_search_food(food, [])
+        details["foodNutrients"] = [
+            {
+                "nutrient": {
+                    "id": entry["nutrientId"],
+                    "number": entry["nutrientNumber"],
+                    "name": entry["nutrientName"],
+                    "unitName": entry["unitName"],
+                },
+                "amount": entry["value"],
+            }
+            for entry in food_nutrients
+        ]
+        details["foodPortions"] = [
+            {
+                "id": portion.id,
+                "amount": portion.amount,
+                "measureUnit": {"name": portion.measure_unit},
+                "modifier": portion.modifier,
+                "portionDescription": portion.portion_description,
+                "gramWeight": portion.gram_weight,
+            }
+            for portion in portions
+        ]
+        return details
+
+    @staticmethod
+    def _search_response(foods: list, total_hits: int, page_size: int) -> dict:
+        return {
+            "totalHits": total_hits,
+            "currentPage": 1,
+            "totalPages": math.ceil(total_hits / page_size) if page_size else 0,
+            "foods": foods,
+        }
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import re
+import time
+from typing import Any, Awaitable, Callable, Optional, Sequence
+from app.config.settings import settings
+from app.managers.redis_manager import RedisManager
+from app.utils.ttl_cache import TTLCache, FRESH, STALE
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class FoodSearchCache:
+    """
+    Two-tier cache for USDA search responses.
+
+    L1 is an in-process LRU/TTL cache, L2 is Redis (shared by all workers).
+    Stale entries are served immediately while a single background task per
+    key refreshes them from upstream.
+    """
+    KEY_PREFIX = "usda:search"
+
+    _l1: TTLCache = TTLCache(
+        max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+        ttl=settings.SEARCH_CACHE_TTL,
+        stale_ttl=settings.SEARCH_CACHE_STALE_TTL,
+        max_size=settings.SEARCH_CACHE_MAX_BYTES,
+    )
+    _refreshing: set = set()
+    _refresh_tasks: set = set()
+    _l2_retry_at: float = 0.0
+    _counters: dict = {
+        "l1_hits": 0,
+        "l2_hits": 0,
+        "stale_hits": 0,
+        "misses": 0,
+        "refreshes": 0,
+        "refresh_errors": 0,
+        "l2_errors": 0,
+    }
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return _WHITESPACE.sub(" ", query.strip().lower())
+
+    @classmethod
+    def make_key(cls, query: str, page_size: int, page_number: int = 1, data_types: Optional[Sequence[str]] = None) -> str:
+        key = f"{cls.KEY_PREFIX}:{page_size}"
+        if page_number != 1:
+            key += f":p{page_number}"
+        if data_types:
+            key += f":t{','.join(data_types)}"
+        return f"{key}:{cls.normalize_query(query)}"
+
+    @classmethod
+    async def get(cls, key: str):
+        """
+        Look the key up in L1 then L2. Returns `(data, state)` where state is
+        FRESH, STALE or None on a miss.
+        """
+        data, state = cls._l1.get(key)
+        if state is not None:
+            cls._counters["l1_hits" if state == FRESH else "stale_hits"] += 1
+            return data, state
+
+        raw = await cls._l2_get(key)
+        if raw is not None:
+            envelope = json.loads(raw)
+            age = time.time() - envelope["stored_at"]
+            fresh_for = settings.SEARCH_CACHE_TTL - age
+            stale_for = settings.SEARCH_CACHE_STALE_TTL + min(fresh_for, 0)
+            if stale_for > 0:
+                cls._l1.set(key, envelope["data"], ttl=max(fresh_for, 0), stale_ttl=stale_for, size=len(raw))
+                state = FRESH if fresh_for > 0 else STALE
+                cls._counters["l2_hits" if state == FRESH else "stale_hits"] += 1
+                return envelope["data"], state
+
+        cls._counters["misses"] += 1
+        return None, None
+
+    @classmethod
+    async def set(cls, key: str, data: Any):
+        raw = json.dumps({"stored_at": time.time(), "data": data}, separators=(",", ":"))
+        cls._l1.set(key, data, size=len(raw))
+        await cls._l2_set(key, raw)
+
+    @classmethod
+    async def get_or_fetch(
+        cls,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda data: True,
+    ):
+        """
+        Serve `key` from cache, falling back to `fetch()` on a miss. Stale
+        entries are returned as-is and revalidated in the background.
+        """
+        data, state = await cls.get(key)
+        if state == FRESH:
+            return data
+        if state == STALE:
+            cls._schedule_refresh(key, fetch, cacheable)
+            return data
+
+        data = await fetch()
+        if cacheable(data):
+            await cls.set(key, data)
+        return data
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {**cls._counters, "l1": cls._l1.stats()}
+
+    @classmethod
+    def clear(cls):
+        cls._l1.clear()
+        for counter in cls._counters:
+            cls._counters[counter] = 0
+
+    @classmethod
+    def _schedule_refresh(cls, key: str, fetch, cacheable):
+        if key in cls._refreshing:
+            return
+        cls._refreshing.add(key)
+
+        async def refresh():
+            try:
+                data = await fetch()
+                if cacheable(data):
+                    await cls.set(key, data)
+                cls._counters["refreshes"] += 1
+            except Exception:
+                cls._counters["refresh_errors"] += 1
+            finally:
+                cls._refreshing.discard(key)
+
+        task = asyncio.create_task(refresh())
+        # Keep a reference until the refresh is done
+        cls._refresh_tasks.add(task)
+        task.add_done_callback(cls._refresh_tasks.discard)
+
+    @classmethod
+    def _l2_available(cls) -> bool:
+        return settings.SEARCH_CACHE_REDIS_ENABLED and time.monotonic() >= cls._l2_retry_at
+
+    @classmethod
+    def _l2_failed(cls):
+        # Back off from Redis for a while instead of paying a timeout per request
+        cls._counters["l2_errors"] += 1
+        cls._l2_retry_at = time.monotonic() + settings.SEARCH_CACHE_REDIS_RETRY_SECONDS
+
+    @classmethod
+    async def _l2_get(cls, key: str) -> Optional[str]:
+        if not cls._l2_available():
+            return None
+        try:
+            return await RedisManager.get_key(key)
+        except Exception:
+            cls._l2_failed()
+            return None
+
+    @classmethod
+    async def _l2_set(cls, key: str, raw: str):
+        if not cls._l2_available():
+            return
+        try:
+            ttl = int(settings.SEARCH_CACHE_TTL + settings.SEARCH_CACHE_STALE_TTL)
+            await RedisManager.set_key_with_ttl(key, raw, ttl)
+        except Exception:
+            cls._l2_failed()
+
+
+class FoodDetailCache(FoodSearchCache):
+    """
+    Two-tier cache for FDC food details, one entry per fdcId, with the
+    search cache's TTLs and Redis but its own in-process tier.
+    """
+    KEY_PREFIX = "usda:food"
+
+    _l1: TTLCache = TTLCache(
+        max_entries=settings.FOOD_DETAIL_CACHE_MAX_ENTRIES,
+        ttl=settings.SEARCH_CACHE_TTL,
+        stale_ttl=settings.SEARCH_CACHE_STALE_TTL,
+        max_size=settings.FOOD_DETAIL_CACHE_MAX_BYTES,
+    )
+    _refreshing: set = set()
+    _refresh_tasks: set = set()
+    _counters: dict = dict.fromkeys(FoodSearchCache._counters, 0)
+
+    @classmethod
+    def make_key(cls, fdc_id: int) -> str:
+        return f"{cls.KEY_PREFIX}:{fdc_id}"
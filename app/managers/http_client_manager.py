@@ -0,0 +1,40 @@
+import httpx
+from app.config.settings import settings
+
+
+class HttpClientManager:
+    """
+    Holds the process-wide httpx.AsyncClient so outbound calls reuse pooled
+    keep-alive connections instead of paying DNS/TCP/TLS setup on every request.
+    """
+    _client: httpx.AsyncClient = None
+
+    @staticmethod
+    def _http2_enabled() -> bool:
+        if not settings.HTTP2_ENABLED:
+            return False
+        try:
+            import h2  # noqa: F401  (required by httpx for HTTP/2)
+        except ImportError:
+            return False
+        return True
+
+    @classmethod
+    async def get_client(cls) -> httpx.AsyncClient:
+        if cls._client is None or cls._client.is_closed:
+            cls._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+                http2=cls._http2_enabled(),
+            )
+        return cls._client
+
+    @classmethod
+    async def close_client(cls):
+        if cls._client:
+            await cls._client.aclose()
+            cls._client = None
@@ -0,0 +1,183 @@
+import asyncio
+import fcntl
+import glob
+import json
+import os
+from typing import Optional
+from app.config.settings import settings
+from app.utils import error
+from app.utils.metrics import REGISTRY, merge_snapshots, render_prometheus
+
+
+def _counter(name: str, documentation: str, label: str, stats: dict, keys) -> tuple:
+    return (name, "counter", documentation, (label,), [((key,), stats.get(key, 0)) for key in keys])
+
+
+def _gauge(name: str, documentation: str, value) -> tuple:
+    return (name, "gauge", documentation, (), [((), value)])
+
+
+def _collect_component_metrics():
+    """Expose the counters the caches, queues and pools already keep, read at scrape time."""
+    from app.managers.calorie_history_manager import CalorieHistoryManager
+    from app.managers.food_cache_manager import FoodDetailCache, FoodSearchCache
+    from app.managers.password_hash_manager import PasswordHashManager
+    from app.managers.portion_manager import PortionManager
+    from app.processors.auth_processor import AuthProcessor
+    from app.services.external_services.calorie_service import food_batcher, search_flight, shared_search_flight
+
+    cache = FoodSearchCache.stats()
+    yield _counter("search_cache_events_total", "USDA search cache events", "event", cache,
+                   ("l1_hits", "l2_hits", "stale_hits", "misses", "refreshes", "refresh_errors", "l2_errors"))
+    yield _gauge("search_cache_entries", "Entries in the in-process search cache", cache["l1"]["entries"])
+    yield _gauge("search_cache_bytes", "Approximate size of the in-process search cache", cache["l1"]["size"])
+
+    details = FoodDetailCache.stats()
+    yield _counter("food_detail_cache_events_total", "USDA food details cache events", "event", details,
+                   ("l1_hits", "l2_hits", "stale_hits", "misses", "refreshes", "refresh_errors", "l2_errors"))
+    yield _gauge("food_detail_cache_entries", "Foods in the in-process details cache", details["l1"]["entries"])
+    yield _counter("food_detail_batches_total", "Batched food details requests", "event",
+                   food_batcher.stats(), ("batches", "keys", "coalesced"))
+    yield _gauge("portion_tables", "Cached food portion tables", PortionManager.stats()["entries"])
+
+    yield _counter("search_coalesce_local_total", "Searches through the in-process single-flight", "result",
+                   search_flight.stats(), ("calls", "coalesced"))
+    yield _counter("search_coalesce_shared_total", "Cache misses through the Redis single-flight", "role",
+                   shared_search_flight.stats(), ("leader", "follower", "fallback", "redis_errors"))
+
+    tokens = AuthProcessor.token_cache_stats()
+    yield _counter("token_cache_events_total", "Verified token cache lookups", "event", tokens, ("hits", "misses", "evictions"))
+
+    history = CalorieHistoryManager.stats()
+    yield _counter("calorie_history_rows_total", "Calorie calculations by write-behind outcome", "outcome", history,
+                   ("enqueued", "dropped", "written", "failed"))
+    yield _gauge("calorie_history_queue_depth", "Calorie calculations waiting to be written", history["queue_depth"])
+
+    hashing = PasswordHashManager.stats()
+    yield _counter("password_hash_operations_total", "bcrypt operations", "operation", hashing, ("hashed", "verified", "rejected"))
+    yield _counter("password_hash_seconds_total", "Time spent in bcrypt queueing and hashing", "phase",
+                   {"queue_wait": hashing["queue_wait_seconds_total"], "hash": hashing["hash_seconds_total"]}, ("queue_wait", "hash"))
+    yield _gauge("password_hash_pending", "bcrypt operations running or queued", hashing["pending"])
+
+
+REGISTRY.register_collector(_collect_component_metrics)
+
+
+class MetricsManager:
+    """
+    Serves the metrics registry in the Prometheus text format.
+
+    With `METRICS_MULTIPROC_DIR` set (multi-worker deployments), every worker
+    writes its snapshot to `<dir>/metrics_<pid>.json` every
+    `METRICS_FLUSH_INTERVAL` seconds, and `/metrics` on any worker returns
+    the sum over all files. When a worker starts, the files of workers that
+    have exited (including one left under its own, recycled, PID) are folded
+    into `metrics_archived.json` without their gauges and removed, so
+    counters neither go backwards nor leave a file per dead worker.
+    """
+    ARCHIVE_NAME = "metrics_archived.json"
+
+    _task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def _path(cls, name: Optional[str] = None) -> str:
+        return os.path.join(settings.METRICS_MULTIPROC_DIR, name or f"metrics_{os.getpid()}.json")
+
+    @classmethod
+    async def start(cls):
+        if cls._task is not None or not settings.METRICS_ENABLED or not settings.METRICS_MULTIPROC_DIR:
+            return
+        os.makedirs(settings.METRICS_MULTIPROC_DIR, exist_ok=True)
+        cls._archive_dead_workers()
+        cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls):
+        if cls._task is None:
+            return
+        cls._task.cancel()
+        try:
+            await cls._task
+        except asyncio.CancelledError:
+            pass
+        cls._task = None
+        snapshot = {name: metric for name, metric in REGISTRY.collect().items() if metric["type"] != "gauge"}
+        cls._write(snapshot)
+
+    @classmethod
+    def render(cls) -> str:
+        snapshot = REGISTRY.collect()
+        if settings.METRICS_MULTIPROC_DIR:
+            cls._write(snapshot)
+            snapshot = merge_snapshots(cls._read_all())
+        return render_prometheus(snapshot)
+
+    @classmethod
+    async def _run(cls):
+        while True:
+            await asyncio.sleep(settings.METRICS_FLUSH_INTERVAL)
+            cls._write(REGISTRY.collect())
+
+    @staticmethod
+    def _is_dead(pid: int) -> bool:
+        if pid == os.getpid():
+            # Written by an earlier worker with the same PID; this one has not written yet
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    @classmethod
+    def _archive_dead_workers(cls):
+        """Fold the snapshots of exited workers into the archive file and remove them."""
+        # One worker at a time, so no snapshot is archived twice
+        with open(cls._path("metrics.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead = []
+            for path in glob.glob(cls._path("metrics_*.json")):
+                pid = os.path.basename(path)[len("metrics_"):-len(".json")]
+                if pid.isdigit() and cls._is_dead(int(pid)):
+                    dead.append(path)
+            if not dead:
+                return
+            snapshots = [cls._read(path) for path in [cls._path(cls.ARCHIVE_NAME)] + dead]
+            archived = merge_snapshots(
+                {name: metric for name, metric in snapshot.items() if metric["type"] != "gauge"}
+                for snapshot in snapshots if snapshot
+            )
+            if cls._write(archived, cls._path(cls.ARCHIVE_NAME)):
+                for path in dead:
+                    os.remove(path)
+
+    @classmethod
+    def _write(cls, snapshot: dict, path: Optional[str] = None) -> bool:
+        path = path or cls._path()
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as fp:
+                json.dump(snapshot, fp, separators=(",", ":"))
+            os.replace(tmp_path, path)
+            return True
+        except OSError as exc:
+            error("Failed to write metrics snapshot", path=path, exception=str(exc))
+            return False
+
+    @staticmethod
+    def _read(path: str) -> Optional[dict]:
+        try:
+            with open(path) as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            # Missing, being replaced by its writer, or left corrupt by a crash
+            return None
+
+    @classmethod
+    def _read_all(cls):
+        for path in glob.glob(cls._path("metrics_*.json")):
+            snapshot = cls._read(path)
+            if snapshot is not None:
+                yield snapshot
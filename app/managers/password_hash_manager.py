@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+from app.config.settings import settings
+from app.middleware.security import hash_password, verify_password
+from app.utils.exceptions import ServiceUnavailableException
+
+# Verified when the account does not exist, so unknown emails cost as much
+# time as wrong passwords
+_DUMMY_HASH: Optional[str] = None
+
+
+class PasswordHashManager:
+    """
+    Runs bcrypt on a dedicated, bounded thread pool so hashing never blocks
+    the event loop (bcrypt releases the GIL while it works). At most
+    `PASSWORD_HASH_WORKERS` hashes run at once and `PASSWORD_HASH_QUEUE_LIMIT`
+    more may wait; beyond that callers get a 503 instead of piling up. A
+    hash counts as pending until its thread is done with it, even if the
+    caller went away (e.g. the client disconnected) in the meantime.
+    """
+    _executor: Optional[ThreadPoolExecutor] = None
+    _pending: int = 0
+    _lock = threading.Lock()
+    _counters: dict = {
+        "hashed": 0,
+        "verified": 0,
+        "rejected": 0,
+        "queue_wait_seconds_total": 0.0,
+        "queue_wait_seconds_max": 0.0,
+        "hash_seconds_total": 0.0,
+        "hash_seconds_max": 0.0,
+    }
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                thread_name_prefix="bcrypt",
+            )
+        return cls._executor
+
+    @classmethod
+    def close_executor(cls):
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=True)
+            cls._executor = None
+
+    @classmethod
+    async def hash_password(cls, password: str) -> Tuple[str, str]:
+        result = await cls._run(hash_password, password, settings.BCRYPT_ROUNDS)
+        cls._counters["hashed"] += 1
+        return result
+
+    @classmethod
+    async def verify_password(cls, password: str, hashed: Optional[str], salt: Optional[str] = None) -> bool:
+        """Check a password; pass `hashed=None` for a missing user to spend the same time."""
+        global _DUMMY_HASH
+        if hashed is None:
+            if _DUMMY_HASH is None:
+                _DUMMY_HASH, _ = await cls._run(hash_password, "dummy-password", settings.BCRYPT_ROUNDS)
+            await cls._run(verify_password, password, _DUMMY_HASH)
+            cls._counters["verified"] += 1
+            return False
+        result = await cls._run(verify_password, password, hashed, salt)
+        cls._counters["verified"] += 1
+        return result
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {**cls._counters, "pending": cls._pending}
+
+    @classmethod
+    async def _run(cls, fn: Callable, *args):
+        with cls._lock:
+            if cls._pending >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_LIMIT:
+                cls._counters["rejected"] += 1
+                raise ServiceUnavailableException("Too many concurrent sign-ins, please retry shortly.")
+            cls._pending += 1
+
+        submitted = time.perf_counter()
+        timings = {}
+
+        def timed():
+            started = time.perf_counter()
+            timings["wait"] = started - submitted
+            try:
+                return fn(*args)
+            finally:
+                timings["hash"] = time.perf_counter() - started
+
+        future = cls.get_executor().submit(timed)
+        # Released by the executor future (on the worker thread), not when the caller is cancelled
+        future.add_done_callback(lambda _: cls._finished(timings))
+        return await asyncio.wrap_future(future)
+
+    @classmethod
+    def _finished(cls, timings: dict):
+        with cls._lock:
+            cls._pending -= 1
+            cls._record(timings)
+
+    @classmethod
+    def _record(cls, timings: dict):
+        counters = cls._counters
+        if "wait" in timings:
+            counters["queue_wait_seconds_total"] += timings["wait"]
+            counters["queue_wait_seconds_max"] = max(counters["queue_wait_seconds_max"], timings["wait"])
+        if "hash" in timings:
+            counters["hash_seconds_total"] += timings["hash"]
+            counters["hash_seconds_max"] = max(counters["hash_seconds_max"], timings["hash"])
@@ -0,0 +1,49 @@
+from typing import Optional
+from app.config.settings import settings
+from app.utils.portion_engine import PortionTable, build_portion_table, grams_for
+from app.utils.ttl_cache import TTLCache
+
+
+class PortionManager:
+    """
+    Portion tables per fdcId, kept in-process as compact `PortionTable`
+    tuples so scaling a food again needs neither its details nor its full
+    search result. Tables built from food details replace ones built from
+    search results, never the other way round.
+    """
+
+    _tables: TTLCache = TTLCache(max_entries=settings.PORTION_CACHE_MAX_ENTRIES, ttl=settings.PORTION_CACHE_TTL)
+
+    @classmethod
+    def table_for(cls, food: dict) -> PortionTable:
+        """Return the food's portion table, building and caching it if needed."""
+        fdc_id = food.get("fdcId")
+        cached = cls.get(fdc_id)
+        if cached is not None and (cached.detailed or "foodPortions" not in food):
+            return cached
+        table = build_portion_table(food)
+        if fdc_id is not None:
+            cls._tables.set(fdc_id, table)
+        return table
+
+    @classmethod
+    def get(cls, fdc_id: Optional[int]) -> Optional[PortionTable]:
+        if fdc_id is None:
+            return None
+        return cls._tables.get(fdc_id)[0]
+
+    @classmethod
+    def grams(cls, fdc_id: Optional[int], quantity: float, unit: Optional[str] = None) -> float:
+        """
+        Grams in `quantity` of `unit` of a food, from its cached table (a
+        serving is 100 g when there is none); UnknownUnitError for unknown units.
+        """
+        return grams_for(cls.get(fdc_id), quantity, unit)
+
+    @classmethod
+    def stats(cls) -> dict:
+        return cls._tables.stats()
+
+    @classmethod
+    def clear(cls):
+        cls._tables.clear()
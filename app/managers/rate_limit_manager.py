@@ -0,0 +1,344 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+from app.config.settings import settings
+from app.managers.redis_manager import RedisManager
+from app.utils.metrics import REGISTRY
+
+RATE_LIMIT_DECISIONS = REGISTRY.counter(
+    "rate_limit_decisions_total",
+    "Rate limiter decisions by mode, where they were made (redis, a local lease, or the local fallback) and outcome",
+    ("mode", "source", "outcome"),
+)
+
+SLIDING_WINDOW = "sliding_window"
+TOKEN_BUCKET = "token_bucket"
+
+EXACT = "exact"
+LEASED = "leased"
+
+# Weighted two-window counter: the previous window counts in proportion to
+# how much of it still overlaps the sliding window. Rejected hits are not
+# counted. Grants up to `requested` hits at once (1 unless leasing) and
+# returns {granted, remaining, retry_after_ms}.
+_SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local weight = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+local retry_after_ms = tonumber(ARGV[4])
+local requested = tonumber(ARGV[5])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local free = math.floor(limit - previous * weight - current)
+local granted = math.min(requested, free)
+if granted < 1 then
+    return {0, 0, retry_after_ms}
+end
+current = redis.call('INCRBY', KEYS[1], granted)
+if current == granted then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+return {granted, free - granted, 0}
+"""
+
+# Classic token bucket refilled continuously at `rate` tokens per second,
+# timed with the Redis clock so every worker agrees.
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(requested, math.floor(tokens))
+local retry_after_ms = 0
+if granted >= 1 then
+    tokens = tokens - granted
+else
+    granted = 0
+    retry_after_ms = math.ceil((1 - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {granted, math.floor(tokens), retry_after_ms}
+"""
+
+# Hand back the unused part of a lease. Keys that already expired are left
+# alone so a release never creates a key without a TTL.
+_SLIDING_WINDOW_RELEASE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('DECRBY', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+_TOKEN_BUCKET_RELEASE_SCRIPT = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+if tokens then
+    tokens = math.min(tonumber(ARGV[2]), tokens + tonumber(ARGV[1]))
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens))
+end
+return 0
+"""
+
+
+class RateLimitDecision(NamedTuple):
+    allowed: bool
+    remaining: int
+    retry_after: float
+
+
+class _Lease:
+    """A slice of one client's quota reserved in Redis by this worker."""
+    __slots__ = ("redis_key", "window", "remaining", "free", "last_used", "denied_until")
+
+    def __init__(self, redis_key: str, window: Optional[int], remaining: int, free: int, now: float, denied_until: float = 0.0):
+        self.redis_key = redis_key
+        self.window = window
+        self.remaining = remaining
+        self.free = free
+        self.last_used = now
+        self.denied_until = denied_until
+
+
+class RateLimiter:
+    """
+    Rate limiter with sliding-window and token-bucket strategies.
+
+    In `exact` mode each decision is a single EVALSHA of an atomic Lua script
+    on the client shared with RedisManager. In `leased` mode a worker reserves
+    `lease_size` hits of a client's quota in one script call and admits
+    requests from that lease locally, so Redis is only called once per lease.
+    Leases idle for `sync_interval` seconds are handed back in one pipelined
+    batch, and a client that was refused is not re-checked in Redis until the
+    next sync. Reserved hits are counted before they are used, so a client is
+    never admitted beyond its limit; at worst it is limited early by the idle
+    leases of other workers (`lease_size` each).
+
+    If Redis is disabled or unreachable, decisions fall back to an in-process
+    table bounded to `max_local_keys` entries, least recently used first, and
+    expired entries are evicted as it goes.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        window_seconds: int,
+        strategy: str = SLIDING_WINDOW,
+        use_redis: bool = True,
+        max_local_keys: int = 10000,
+        key_prefix: str = "rate_limit",
+        mode: str = EXACT,
+        lease_fraction: float = 0.05,
+        sync_interval: float = 0.25,
+    ):
+        if strategy not in (SLIDING_WINDOW, TOKEN_BUCKET):
+            raise ValueError(f"Unknown rate limit strategy: {strategy}")
+        if mode not in (EXACT, LEASED):
+            raise ValueError(f"Unknown rate limit mode: {mode}")
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.strategy = strategy
+        self.use_redis = use_redis
+        self.max_local_keys = max_local_keys
+        self.key_prefix = key_prefix
+        self.mode = mode
+        self.lease_size = max(1, int(limit * lease_fraction))
+        self.sync_interval = sync_interval
+        self._script = None
+        self._release_script = None
+        self._redis_retry_at = 0.0
+        # key -> [last_seen, a, b]: window id/current/previous or tokens/ts
+        self._local: "OrderedDict[str, list]" = OrderedDict()
+        self._leases: "OrderedDict[str, _Lease]" = OrderedDict()
+        self._pending_releases: List[Tuple[str, int]] = []
+        self._next_sync = 0.0
+        self._sync_task: Optional[asyncio.Task] = None
+        self.stats = {
+            "allowed": 0,
+            "limited": 0,
+            "redis_errors": 0,
+            "redis_calls": 0,
+            "local_decisions": 0,
+            "lease_hits": 0,
+            "released": 0,
+        }
+
+    async def hit(self, key: str) -> RateLimitDecision:
+        decision = None
+        source = "redis"
+        if self.use_redis and time.monotonic() >= self._redis_retry_at:
+            try:
+                if self.mode == LEASED:
+                    decision, source = await self._hit_leased(key)
+                else:
+                    decision = await self._hit_redis(key)
+            except Exception:
+                self.stats["redis_errors"] += 1
+                self._redis_retry_at = time.monotonic() + settings.RATE_LIMIT_REDIS_RETRY_SECONDS
+        if decision is None:
+            source = "local"
+            self.stats["local_decisions"] += 1
+            decision = self._hit_local(key)
+        outcome = "allowed" if decision.allowed else "limited"
+        self.stats[outcome] += 1
+        RATE_LIMIT_DECISIONS.labels(self.mode, source, outcome).inc()
+        return decision
+
+    # --- Redis -------------------------------------------------------------
+
+    async def _hit_redis(self, key: str) -> RateLimitDecision:
+        granted, remaining, retry_after, _, _ = await self._reserve(key, 1, time.time())
+        return RateLimitDecision(granted > 0, remaining, retry_after)
+
+    async def _reserve(self, key: str, requested: int, now: float) -> Tuple[int, int, float, str, Optional[int]]:
+        """Reserve up to `requested` hits; returns (granted, remaining, retry_after, redis_key, window)."""
+        if self._script is None:
+            client = await RedisManager.get_client()
+            if self.strategy == SLIDING_WINDOW:
+                self._script = client.register_script(_SLIDING_WINDOW_SCRIPT)
+                self._release_script = client.register_script(_SLIDING_WINDOW_RELEASE_SCRIPT)
+            else:
+                self._script = client.register_script(_TOKEN_BUCKET_SCRIPT)
+                self._release_script = client.register_script(_TOKEN_BUCKET_RELEASE_SCRIPT)
+
+        self.stats["redis_calls"] += 1
+        if self.strategy == TOKEN_BUCKET:
+            window = None
+            redis_key = f"{self.key_prefix}:{{{key}}}:bucket"
+            granted, remaining, retry_after_ms = await self._script(
+                keys=[redis_key],
+                args=[self.limit, self.limit / self.window_seconds, requested],
+            )
+        else:
+            window = int(now // self.window_seconds)
+            elapsed = now - window * self.window_seconds
+            weight = 1 - elapsed / self.window_seconds
+            # Hash tags keep both windows of a key in the same cluster slot
+            redis_key = f"{self.key_prefix}:{{{key}}}:{window}"
+            granted, remaining, retry_after_ms = await self._script(
+                keys=[redis_key, f"{self.key_prefix}:{{{key}}}:{window - 1}"],
+                args=[self.limit, weight, self.window_seconds * 2, int((self.window_seconds - elapsed) * 1000), requested],
+            )
+        return int(granted), int(remaining), int(retry_after_ms) / 1000, redis_key, window
+
+    # --- leased mode -------------------------------------------------------
+
+    async def _hit_leased(self, key: str) -> Tuple[RateLimitDecision, str]:
+        """Decide from the key's local lease when it can; returns the decision and its source."""
+        now = time.time()
+        if now >= self._next_sync and (self._sync_task is None or self._sync_task.done()):
+            self._next_sync = now + self.sync_interval
+            self._sync_task = asyncio.create_task(self._sync(now))
+
+        lease = self._leases.get(key)
+        if lease is not None:
+            self._leases.move_to_end(key)
+            if self.strategy == SLIDING_WINDOW and lease.window != int(now // self.window_seconds):
+                # Unused hits of a finished window only weigh on the next one
+                self._drop_lease(key)
+            elif lease.remaining > 0:
+                lease.remaining -= 1
+                lease.last_used = now
+                self.stats["lease_hits"] += 1
+                return RateLimitDecision(True, lease.free + lease.remaining, 0), "lease"
+            elif now < lease.denied_until:
+                self.stats["lease_hits"] += 1
+                return RateLimitDecision(False, 0, lease.denied_until - now), "lease"
+
+        granted, free, retry_after, redis_key, window = await self._reserve(key, self.lease_size, now)
+        if granted == 0:
+            denied_until = now + min(retry_after, self.sync_interval)
+            self._store_lease(key, _Lease(redis_key, window, 0, 0, now, denied_until))
+            return RateLimitDecision(False, 0, retry_after), "redis"
+        self._store_lease(key, _Lease(redis_key, window, granted - 1, free, now))
+        return RateLimitDecision(True, free + granted - 1, 0), "redis"
+
+    def _store_lease(self, key: str, lease: _Lease):
+        self._leases[key] = lease
+        self._leases.move_to_end(key)
+        while len(self._leases) > self.max_local_keys:
+            self._drop_lease(next(iter(self._leases)))
+
+    def _drop_lease(self, key: str):
+        lease = self._leases.pop(key)
+        if lease.remaining > 0:
+            self._pending_releases.append((lease.redis_key, lease.remaining))
+
+    async def _sync(self, now: float):
+        """Hand idle leases back to Redis in one pipelined round trip."""
+        idle_before = now - self.sync_interval
+        for key in [key for key, lease in self._leases.items() if lease.last_used < idle_before]:
+            self._drop_lease(key)
+        releases, self._pending_releases = self._pending_releases, []
+        if releases:
+            await self._release(releases)
+
+    async def _release(self, releases: List[Tuple[str, int]]):
+        try:
+            client = await RedisManager.get_client()
+            async with client.pipeline(transaction=False) as pipe:
+                for redis_key, amount in releases:
+                    await self._release_script(keys=[redis_key], args=[amount, self.limit], client=pipe)
+                await pipe.execute()
+            self.stats["released"] += sum(amount for _, amount in releases)
+        except Exception:
+            # Unreleased hits only make the limit stricter until they expire
+            self.stats["redis_errors"] += 1
+
+    # --- in-process fallback -----------------------------------------------
+
+    def _hit_local(self, key: str) -> RateLimitDecision:
+        now = time.time()
+        entry = self._local.get(key)
+        if self.strategy == TOKEN_BUCKET:
+            decision, entry = self._token_bucket_local(entry, now)
+        else:
+            decision, entry = self._sliding_window_local(entry, now)
+        self._local[key] = entry
+        self._local.move_to_end(key)
+        self._evict(now)
+        return decision
+
+    def _sliding_window_local(self, entry, now: float):
+        window = int(now // self.window_seconds)
+        elapsed = now - window * self.window_seconds
+        if entry is None or entry[1] < window - 1:
+            current, previous = 0, 0
+        elif entry[1] == window - 1:
+            current, previous = 0, entry[2]
+        else:
+            current, previous = entry[2], entry[3]
+        estimated = previous * (1 - elapsed / self.window_seconds) + current
+        if estimated + 1 > self.limit:
+            decision = RateLimitDecision(False, 0, self.window_seconds - elapsed)
+        else:
+            current += 1
+            decision = RateLimitDecision(True, math.floor(self.limit - estimated - 1), 0)
+        return decision, [now, window, current, previous]
+
+    def _token_bucket_local(self, entry, now: float):
+        rate = self.limit / self.window_seconds
+        tokens = self.limit if entry is None else min(self.limit, entry[1] + (now - entry[2]) * rate)
+        if tokens >= 1:
+            tokens -= 1
+            decision = RateLimitDecision(True, math.floor(tokens), 0)
+        else:
+            decision = RateLimitDecision(False, 0, (1 - tokens) / rate)
+        return decision, [now, tokens, now]
+
+    def _evict(self, now: float):
+        # Entries untouched for two windows carry no state worth keeping
+        expire_before = now - 2 * self.window_seconds
+        local = self._local
+        while local:
+            oldest_key = next(iter(local))
+            if len(local) > self.max_local_keys or local[oldest_key][0] < expire_before:
+                del local[oldest_key]
+            else:
+                break
@@ -1,6 +1,15 @@
 import redis.asyncio as redis
+from typing import Optional
+from uuid import uuid4
 from app.config.settings import Settings as settings
 
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
 class RedisManager:
     _redis_client: redis.Redis = None
 
@@ -30,3 +39,18 @@ class RedisManager:
     async def delete_key(cls, key: str):
         client = await cls.get_client()
         await client.delete(key)
+
+    @classmethod
+    async def acquire_lock(cls, key: str, ttl_ms: int) -> Optional[str]:
+        """Take a short-lived lock; returns the owner token or None if it is held."""
+        client = await cls.get_client()
+        token = uuid4().hex
+        if await client.set(key, token, nx=True, px=ttl_ms):
+            return token
+        return None
+
+    @classmethod
+    async def release_lock(cls, key: str, token: str):
+        """Release a lock only if it is still owned by `token`."""
+        client = await cls.get_client()
+        await client.eval(_RELEASE_LOCK_SCRIPT, 1, key, token)
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable
+from app.managers.redis_manager import RedisManager
+
+
+class DistributedSingleFlight:
+    """
+    Coalesces identical upstream calls across workers through Redis.
+
+    The worker that wins a short `SET NX` lock runs `fn()` and publishes the
+    JSON result under a short-lived result key, if `cacheable(result)`; the
+    other workers poll that key until it shows up. If the leader fails or
+    got an uncacheable result (lock released without a result), the wait
+    times out or Redis is unreachable, callers simply run `fn()` themselves.
+    After a Redis error the lock is skipped for `retry_seconds`, so an
+    outage costs one timeout rather than one per call.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        lock_ttl_ms: int = 10000,
+        wait_timeout: float = 5.0,
+        poll_interval: float = 0.05,
+        retry_seconds: float = 30.0,
+    ):
+        self.namespace = namespace
+        self.lock_ttl_ms = lock_ttl_ms
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.retry_seconds = retry_seconds
+        self._retry_at = 0.0
+        self._counters = {"leader": 0, "follower": 0, "fallback": 0, "redis_errors": 0}
+
+    async def do(
+        self, key: str, fn: Callable[[], Awaitable[Any]], cacheable: Callable[[Any], bool] = lambda result: True
+    ) -> Any:
+        lock_key = f"{self.namespace}:lock:{key}"
+        result_key = f"{self.namespace}:result:{key}"
+        if time.monotonic() < self._retry_at:
+            return await fn()
+        try:
+            token = await RedisManager.acquire_lock(lock_key, self.lock_ttl_ms)
+        except Exception:
+            self._redis_failed()
+            return await fn()
+
+        if token is not None:
+            self._counters["leader"] += 1
+            try:
+                result = await fn()
+                if cacheable(result):
+                    await self._publish(result_key, result)
+                return result
+            finally:
+                await self._release(lock_key, token)
+
+        result = await self._wait_for_result(result_key, lock_key)
+        if result is not None:
+            self._counters["follower"] += 1
+            return result
+        self._counters["fallback"] += 1
+        return await fn()
+
+    def stats(self) -> dict:
+        return dict(self._counters)
+
+    def _redis_failed(self):
+        # Back off from Redis for a while instead of paying a timeout per call
+        self._counters["redis_errors"] += 1
+        self._retry_at = time.monotonic() + self.retry_seconds
+
+    async def _publish(self, result_key: str, result: Any):
+        try:
+            ttl = max(1, self.lock_ttl_ms // 1000)
+            await RedisManager.set_key_with_ttl(result_key, json.dumps(result, separators=(",", ":")), ttl)
+        except Exception:
+            self._redis_failed()
+
+    async def _release(self, lock_key: str, token: str):
+        try:
+            await RedisManager.release_lock(lock_key, token)
+        except Exception:
+            self._redis_failed()
+
+    async def _wait_for_result(self, result_key: str, lock_key: str):
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                raw = await RedisManager.get_key(result_key)
+                if raw is not None:
+                    return json.loads(raw)
+                # Lock released without a result: the leader failed
+                if await RedisManager.get_key(lock_key) is None:
+                    return None
+            except Exception:
+                self._redis_failed()
+                return None
+        return None
@@ -2,15 +2,17 @@ from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.user import User
 from uuid import uuid4
-from app.utils import get_current_datetime
+from app.utils import get_current_datetime, log_function_call
 
 class UserManager:
     @staticmethod
+    @log_function_call(histogram="db.user.get_by_email")
     async def get_by_email(db: AsyncSession, email: str):
         result = await db.execute(select(User).where(User.email == email))
         return result.scalars().first()
 
     @staticmethod
+    @log_function_call(histogram="db.user.create_user")
     async def create_user(db: AsyncSession, name: str, email: str, phone_number: str, password_hash: str, password_salt: str):
         user = User(
             uuid=str(uuid4()),
@@ -28,6 +30,7 @@ class UserManager:
         return user
 
     @staticmethod
+    @log_function_call(histogram="db.user.update_last_login")
     async def update_last_login(db: AsyncSession, user: User):
         user.last_login_at = get_current_datetime()
         await db.commit()
@@ -1,8 +1,10 @@
+import hmac
 import re
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response, JSONResponse
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 
+from app.config.settings import settings
 from app.processors.auth_processor import AuthProcessor
 
 EXEMPT_PATH_PATTERNS = [
@@ -11,22 +13,59 @@ EXEMPT_PATH_PATTERNS = [
     r"^/api/v1/auth/refresh/?$",
     r"^/api/v1/auth/logout/?$",
 ]
+# All exempt patterns compiled into a single alternation
+EXEMPT_PATH_MATCHER = re.compile("|".join(f"(?:{pattern})" for pattern in EXEMPT_PATH_PATTERNS))
+# Scraped with METRICS_TOKEN rather than a user's access token
+METRICS_PATH_MATCHER = re.compile(r"^/metrics/?$")
 
-class CustomAuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        path = request.url.path
-        if any(re.match(pattern, path) for pattern in EXEMPT_PATH_PATTERNS):
-            return await call_next(request)
-        auth_header = request.headers.get("authorization")
+
+def metrics_authorized(scope: Scope) -> bool:
+    if settings.METRICS_PUBLIC:
+        return True
+    if not settings.METRICS_TOKEN:
+        return False
+    auth_header = Headers(scope=scope).get("authorization") or ""
+    return hmac.compare_digest(auth_header.encode("utf-8"), f"Bearer {settings.METRICS_TOKEN}".encode("utf-8"))
+
+
+class CustomAuthMiddleware:
+    """Pure ASGI middleware: rejects requests without a valid access token."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        if EXEMPT_PATH_MATCHER.match(path):
+            await self.app(scope, receive, send)
+            return
+        if METRICS_PATH_MATCHER.match(path):
+            if metrics_authorized(scope):
+                await self.app(scope, receive, send)
+                return
+            response = JSONResponse(
+                {"detail": "Unauthorized: Missing or invalid metrics token."}, status_code=401
+            )
+            await response(scope, receive, send)
+            return
+        auth_header = Headers(scope=scope).get("authorization")
         if not auth_header or not auth_header.lower().startswith("bearer "):
-            return JSONResponse(
+            response = JSONResponse(
                 {"detail": "Unauthorized: Missing or invalid token."}, status_code=401
             )
+            await response(scope, receive, send)
+            return
         token = auth_header.split(" ", 1)[1]
-        payload = AuthProcessor.verify_token(token, expected_type="access")
+        payload = AuthProcessor.verify_token_cached(token, expected_type="access")
         if not payload:
-            return JSONResponse(
+            response = JSONResponse(
                 {"detail": "Unauthorized: Invalid or expired token."}, status_code=401
             )
-        request.state.user = payload
-        return await call_next(request)
+            await response(scope, receive, send)
+            return
+        # Same storage request.state uses
+        scope.setdefault("state", {})["user"] = payload
+        await self.app(scope, receive, send)
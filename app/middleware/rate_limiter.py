@@ -1,50 +1,64 @@
 # app/core/rate_limiter.py
 
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
+import math
+from typing import Optional
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 from app.config.settings import settings
+from app.managers.rate_limit_manager import RateLimiter
+from app.processors.auth_processor import AuthProcessor
 
-import time
-
-class RateLimiterMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, max_requests: int = 60, window_seconds: int = 60):
-        super().__init__(app)
-        self.max_requests = max_requests
-        self.window_seconds = window_seconds
-        self.redis = None
-        self.use_redis = True
-        self.clients = {}
-
-    async def dispatch(self, request: Request, call_next):
-        if self.redis is None and self.use_redis:
-            try:
-                import aioredis
-                self.redis = await aioredis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
-                # Test connection
-                await self.redis.ping()
-            except Exception:
-                self.use_redis = False
-
-        client_ip = request.client.host
-        now = int(time.time())
-        window = now // self.window_seconds
-
-        if self.use_redis and self.redis is not None:
-            redis_key = f"rate_limit:{client_ip}:{window}"
-            current = await self.redis.incr(redis_key)
-            if current == 1:
-                await self.redis.expire(redis_key, self.window_seconds)
-            if current > self.max_requests:
-                raise HTTPException(status_code=429, detail="Too Many Requests")
-        else:
-            if client_ip not in self.clients:
-                self.clients[client_ip] = {}
-            if window not in self.clients[client_ip]:
-                self.clients[client_ip] = {window: 1}
-            else:
-                self.clients[client_ip][window] += 1
-            if self.clients[client_ip][window] > self.max_requests:
-                raise HTTPException(status_code=429, detail="Too Many Requests")
-
-        response = await call_next(request)
-        return response
+
+class RateLimiterMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_requests: Optional[int] = None,
+        window_seconds: Optional[int] = None,
+        strategy: Optional[str] = None,
+        use_redis: Optional[bool] = None,
+        mode: Optional[str] = None,
+    ):
+        self.app = app
+        self.limiter = RateLimiter(
+            limit=max_requests or settings.RATE_LIMIT,
+            window_seconds=window_seconds or settings.RATE_LIMIT_WINDOW_SECONDS,
+            strategy=strategy or settings.RATE_LIMIT_STRATEGY,
+            use_redis=settings.RATE_LIMIT_REDIS_ENABLED if use_redis is None else use_redis,
+            max_local_keys=settings.RATE_LIMIT_MAX_LOCAL_KEYS,
+            mode=mode or settings.RATE_LIMIT_MODE,
+            lease_fraction=settings.RATE_LIMIT_LEASE_FRACTION,
+            sync_interval=settings.RATE_LIMIT_SYNC_INTERVAL_MS / 1000,
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        decision = await self.limiter.hit(self.client_key(scope))
+
+        if not decision.allowed:
+            response = JSONResponse(
+                {"detail": "Too Many Requests"},
+                status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(decision.retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def client_key(scope: Scope) -> str:
+        # Runs ahead of CustomAuthMiddleware, so missing or rejected tokens are
+        # limited by IP. Valid tokens are cached, so auth re-checks them cheaply.
+        user = scope.get("state", {}).get("user")
+        if not user:
+            auth_header = Headers(scope=scope).get("authorization")
+            if auth_header and auth_header.lower().startswith("bearer "):
+                user = AuthProcessor.verify_token_cached(auth_header.split(" ", 1)[1], expected_type="access")
+        if user and user.get("sub"):
+            return f"user:{user['sub']}"
+        return f"ip:{scope['client'][0] if scope.get('client') else 'unknown'}"
@@ -2,32 +2,69 @@
 
 import os
 import bcrypt
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from app.db.database import AsyncSessionLocal
-from app.db.database import get_db
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config.settings import settings
+from app.db.database import AsyncSessionLocal, LazySession
 
-def hash_password(password: str) -> (str, str):
-    salt = bcrypt.gensalt()
+SECURITY_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "X-XSS-Protection": "1; mode=block",
+    "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
+}
+
+# These block for the whole bcrypt computation; async code should use
+# PasswordHashManager, which runs them on a dedicated thread pool.
+def hash_password(password: str, rounds: int = settings.BCRYPT_ROUNDS) -> (str, str):
+    salt = bcrypt.gensalt(rounds=rounds)
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8'), salt.decode('utf-8')
 
-def verify_password(password: str, hashed: str, salt: str) -> bool:
-    return bcrypt.hashpw(password.encode('utf-8'), salt.encode('utf-8')).decode('utf-8') == hashed
-
-class DBSessionMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        async for db in get_db():
-            request.state.db = db
-            response = await call_next(request)
-            return response
-
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        # Add security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        return response
+def verify_password(password: str, hashed: str, salt: str = None) -> bool:
+    # The bcrypt hash embeds its salt; checkpw compares in constant time
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    except ValueError:
+        return False
+
+class DBSessionMiddleware:
+    """
+    Gives every request a lazy session holder (see `get_request_db`). The
+    session is only opened when a controller asks for it and is always
+    closed once the response has been sent.
+    """
+
+    def __init__(self, app: ASGIApp, session_factory=AsyncSessionLocal):
+        self.app = app
+        self.session_factory = session_factory
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        db_session = LazySession(self.session_factory)
+        scope.setdefault("state", {})["db_session"] = db_session
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await db_session.close()
+
+class SecurityHeadersMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                # Add security headers
+                headers = MutableHeaders(scope=message)
+                for name, value in SECURITY_HEADERS.items():
+                    headers[name] = value
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -2,7 +2,7 @@ import uuid
 from sqlalchemy import Column, String, DateTime, Float
 from sqlalchemy.dialects.postgresql import UUID
 from app.db.models_base import Base
-import datetime
+from app.utils import get_current_datetime
 
 class Calorie(Base):
     __tablename__ = 'calories'
@@ -10,5 +10,5 @@ class Calorie(Base):
     title = Column(String, nullable=False)
     ingredients = Column(String, nullable=False)  # You can use JSON or Text for more complex data
     calorie_calculation = Column(Float, nullable=False)
-    created_at = Column(DateTime, default=datetime.timezone.utc, nullable=False)
-    updated_at = Column(DateTime, default=datetime.timezone.utc, onupdate=datetime.timezone.utc, nullable=False)
+    created_at = Column(DateTime, default=get_current_datetime, nullable=False)
+    updated_at = Column(DateTime, default=get_current_datetime, onupdate=get_current_datetime, nullable=False)
@@ -0,0 +1,50 @@
+from sqlalchemy import Column, String, Integer, Float, ForeignKey
+from app.db.models_base import Base
+
+
+class FdcFood(Base):
+    """A food from the local FoodData Central mirror."""
+    __tablename__ = 'fdc_foods'
+    fdc_id = Column(Integer, primary_key=True, autoincrement=False)
+    data_type = Column(String, nullable=False, index=True)
+    description = Column(String, nullable=False)
+    food_category = Column(String, nullable=True)
+    brand_owner = Column(String, nullable=True)
+    brand_name = Column(String, nullable=True)
+    serving_size = Column(Float, nullable=True)
+    serving_size_unit = Column(String, nullable=True)
+    household_serving_text = Column(String, nullable=True)
+    publication_date = Column(String, nullable=True)
+
+
+class FdcNutrient(Base):
+    __tablename__ = 'fdc_nutrients'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String, nullable=False)
+    unit_name = Column(String, nullable=True)
+    nutrient_number = Column(String, nullable=True, index=True)
+
+
+class FdcFoodNutrient(Base):
+    __tablename__ = 'fdc_food_nutrients'
+    fdc_id = Column(Integer, ForeignKey('fdc_foods.fdc_id', ondelete='CASCADE'), primary_key=True)
+    nutrient_id = Column(Integer, ForeignKey('fdc_nutrients.id'), primary_key=True)
+    amount = Column(Float, nullable=True)
+
+
+class FdcFoodPortion(Base):
+    __tablename__ = 'fdc_food_portions'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    fdc_id = Column(Integer, ForeignKey('fdc_foods.fdc_id', ondelete='CASCADE'), nullable=False, index=True)
+    amount = Column(Float, nullable=True)
+    measure_unit = Column(String, nullable=True)
+    modifier = Column(String, nullable=True)
+    portion_description = Column(String, nullable=True)
+    gram_weight = Column(Float, nullable=True)
+
+
+class FdcSearchToken(Base):
+    """Inverted index of description/brand tokens used by local search."""
+    __tablename__ = 'fdc_search_tokens'
+    token = Column(String, primary_key=True)
+    fdc_id = Column(Integer, ForeignKey('fdc_foods.fdc_id', ondelete='CASCADE'), primary_key=True)
@@ -1,8 +1,14 @@
+import hashlib
+import time
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from app.config.settings import settings
+from app.utils.ttl_cache import TTLCache
 from typing import Optional, Dict, Any
 
+# Verified payloads keyed by token digest, each kept until the token's exp
+_verified_tokens = TTLCache(max_entries=settings.TOKEN_CACHE_SIZE)
+
 class AuthProcessor:
     @staticmethod
     def create_access_token(data: dict) -> str:
@@ -29,3 +35,29 @@ class AuthProcessor:
             return payload
         except JWTError:
             return None
+
+
+    @staticmethod
+    def verify_token_cached(token: str, expected_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Same as verify_token, but a token whose signature was already verified
+        is served from an in-process cache until it expires.
+        """
+        if not settings.TOKEN_CACHE_ENABLED:
+            return AuthProcessor.verify_token(token, expected_type)
+        key = hashlib.sha256(token.encode("utf-8")).digest()
+        payload, state = _verified_tokens.get(key)
+        if state is None:
+            payload = AuthProcessor.verify_token(token)
+            if not payload:
+                return None
+            exp = payload.get("exp")
+            if exp is not None:
+                _verified_tokens.set(key, payload, ttl=exp - time.time())
+        if expected_type and payload.get("type") != expected_type:
+            return None
+        return payload
+
+    @staticmethod
+    def token_cache_stats() -> dict:
+        return _verified_tokens.stats()
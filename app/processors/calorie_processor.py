@@ -0,0 +1,194 @@
+import asyncio
+from typing import Dict, List, Optional, Sequence, Tuple
+from fastapi import HTTPException
+from app.config.settings import settings
+from app.managers.portion_manager import PortionManager
+from app.schemas.calorie import MealItem
+from app.services.external_services.calorie_service import CalorieService
+from app.utils import error
+from app.utils.nutrient_resolver import NUTRIENTS, MACRO_KEYS, extract_nutrients
+from app.utils.portion_engine import PortionTable, UnknownUnitError, grams_for, scale_rows
+
+EXTRA_NUTRIENT_KEYS = tuple(key for key in settings.EXTRA_NUTRIENTS if key in NUTRIENTS and key not in MACRO_KEYS)
+NUTRIENT_KEYS = MACRO_KEYS + EXTRA_NUTRIENT_KEYS
+# Response fields that are scaled to portions and summed for meal totals
+TOTAL_FIELDS = ("calories", "carbohydrates_g", "fat_g", "protein_g") + EXTRA_NUTRIENT_KEYS
+
+
+class CalorieProcessor:
+    @staticmethod
+    async def lookup(query: str, servings: Optional[float] = None, unit: Optional[str] = None) -> Optional[dict]:
+        """
+        Search USDA for the query and return the calorie result for the best
+        match, or None if the search has no hits. With `servings`, the result
+        also has the nutrients of that portion (see `with_portion`).
+        """
+        found = await CalorieProcessor._lookup_with_table(query)
+        if found is None:
+            return None
+        result, table = found
+        return result if servings is None else CalorieProcessor.with_portion(result, servings, unit, table)
+
+    @staticmethod
+    async def _lookup_with_table(query: str) -> Optional[Tuple[dict, PortionTable]]:
+        """`lookup` without a portion, plus the best match's portion table."""
+        service = CalorieService(api_key=settings.USDA_API_KEY)
+        best_match = await service.async_find_best_match(query)
+        if not best_match:
+            return None
+        table = PortionManager.table_for(best_match)
+        return CalorieProcessor.build_result(best_match), table
+
+    @staticmethod
+    async def food_details(fdc_id: int, servings: Optional[float] = None, unit: Optional[str] = None) -> Optional[dict]:
+        """
+        Return the calorie result for one FDC food with its full details
+        under "food", or None if FDC has no such food. `servings` and `unit`
+        work as in `lookup`.
+        """
+        service = CalorieService(api_key=settings.USDA_API_KEY)
+        food = await service.async_get_food(fdc_id)
+        if food is None:
+            return None
+        table = PortionManager.table_for(food)
+        result = {**CalorieProcessor.build_result(food), "food": food}
+        return result if servings is None else CalorieProcessor.with_portion(result, servings, unit, table)
+
+    @staticmethod
+    def with_portion(result: dict, servings: float, unit: Optional[str] = None, table: Optional[PortionTable] = None) -> dict:
+        """
+        Add a "portion" block with the result's nutrients scaled to
+        `servings` of `unit`, plus the food's serving size and household
+        measures. `table` is the food's portion table; without it the cached
+        one is used. Raises UnknownUnitError for units the food has no measure for.
+        """
+        if table is None:
+            table = PortionManager.get(result["best_match"]["food_id"])
+        portions, errors = CalorieProcessor.scale_portions([result], [(servings, unit)], [table])
+        if errors:
+            raise errors[0]
+        portion = portions[0]
+        if table is not None:
+            portion["serving_grams"] = round(table.serving_grams, 2)
+            portion["measures"] = {name: round(grams, 2) for name, grams in table.measures}
+        return {**result, "portion": portion}
+
+    @staticmethod
+    def scale_portions(
+        results: Sequence[dict],
+        quantities: Sequence[Tuple[float, Optional[str]]],
+        tables: Optional[Sequence[Optional[PortionTable]]] = None,
+    ) -> Tuple[List[Optional[dict]], Dict[int, UnknownUnitError]]:
+        """
+        Convert each result's `(quantity, unit)` to grams with its food's
+        portion table (from `tables`, else the cached one), then scale the
+        nutrient fields of all results in one pass. Returns the portion
+        blocks (None where the unit is unknown) and the unit errors by position.
+        """
+        grams, errors = [], {}
+        for position, (result, (quantity, unit)) in enumerate(zip(results, quantities)):
+            try:
+                if tables is not None:
+                    grams.append(grams_for(tables[position], quantity, unit))
+                else:
+                    grams.append(PortionManager.grams((result.get("best_match") or {}).get("food_id"), quantity, unit))
+            except UnknownUnitError as exc:
+                grams.append(0.0)
+                errors[position] = exc
+        rows = scale_rows([[result.get(field) for field in TOTAL_FIELDS] for result in results], grams)
+        portions = [
+            None if position in errors else {
+                "quantity": quantity,
+                "unit": unit or "serving",
+                "grams": round(weight, 2),
+                **dict(zip(TOTAL_FIELDS, row)),
+            }
+            for position, ((quantity, unit), weight, row) in enumerate(zip(quantities, grams, rows))
+        ]
+        return portions, errors
+
+    @staticmethod
+    async def lookup_meal(items: List[MealItem], concurrency: int = None, timeout: float = None) -> dict:
+        """
+        Resolve every meal item concurrently, at most `concurrency` at a time,
+        within one overall deadline. Items that fail or miss the deadline are
+        reported individually. Resolved items are scaled to their servings
+        (or other unit) together, and totals are summed over those portions.
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.MEAL_SEARCH_CONCURRENCY)
+
+        async def resolve(item: MealItem):
+            async with semaphore:
+                return await CalorieProcessor.lookup(item.query)
+
+        tasks = [asyncio.ensure_future(resolve(item)) for item in items]
+        _, pending = await asyncio.wait(tasks, timeout=timeout or settings.MEAL_REQUEST_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        # Let cancelled lookups unwind before responding, so none outlives the request
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        results = []
+        resolved = []
+        for item, task in zip(items, tasks):
+            entry = {"query": item.query, "servings": item.servings}
+            if task in pending:
+                entry.update({"status": "timeout", "detail": "Lookup did not finish before the request deadline."})
+            elif isinstance(task.exception(), HTTPException):
+                entry.update({"status": "error", "detail": task.exception().detail})
+            elif task.exception() is not None:
+                # Internal error text is logged, never returned
+                error("Meal item lookup failed", query=item.query, exception=repr(task.exception()))
+                entry.update({"status": "error", "detail": "Lookup failed."})
+            elif task.result() is None:
+                entry.update({"status": "not_found", "detail": "No results found for the given query."})
+            else:
+                entry.update({"status": "ok", **task.result()})
+                resolved.append((item, entry))
+            results.append(entry)
+
+        portions, errors = CalorieProcessor.scale_portions(
+            [entry for _, entry in resolved], [(item.servings, item.unit) for item, _ in resolved]
+        )
+        totals = {field: 0.0 for field in TOTAL_FIELDS}
+        for position, ((_, entry), portion) in enumerate(zip(resolved, portions)):
+            if position in errors:
+                entry.update({"status": "error", "detail": str(errors[position])})
+                continue
+            entry["portion"] = portion
+            for field in TOTAL_FIELDS:
+                if portion[field] is not None:
+                    totals[field] += portion[field]
+
+        return {
+            "items": results,
+            "totals": {field: round(value, 2) for field, value in totals.items()},
+            "resolved": sum(1 for entry in results if entry["status"] == "ok"),
+            "failed": sum(1 for entry in results if entry["status"] != "ok"),
+        }
+
+    @staticmethod
+    def build_result(best_match: dict, nutrient_keys: Sequence[str] = NUTRIENT_KEYS) -> dict:
+        nutrients = extract_nutrients(best_match.get('foodNutrients', []), nutrient_keys)
+        food_category = best_match.get("foodCategory")
+        if isinstance(food_category, dict):
+            # Food details give the category as an object
+            food_category = food_category.get("description")
+        result = {
+            "best_match": {
+                "description": best_match.get("description"),
+                "food_id": best_match.get("fdcId"),
+                "data_type": best_match.get("dataType"),
+                "brand_owner": best_match.get("brandOwner"),
+                "food_category": food_category,
+            },
+            "calories": nutrients["calories"]["value"],
+            "calorie_unit": nutrients["calories"]["unit"],
+            "carbohydrates_g": nutrients["carbohydrates_g"]["value"],
+            "fat_g": nutrients["fat_g"]["value"],
+            "protein_g": nutrients["protein_g"]["value"]
+        }
+        for key in nutrient_keys:
+            if key not in MACRO_KEYS:
+                result[key] = nutrients[key]["value"]
+        return result
@@ -0,0 +1,254 @@
+"""
+Bulk import of the published FoodData Central dumps into the local mirror.
+
+Usage:
+    python -m app.processors.fdc_import_processor <csv-directory | dump.json> [...]
+
+CSV directories are the extracted `FoodData_Central_*_csv_*` archives
+(food.csv, nutrient.csv, food_nutrient.csv, ...). JSON files are the
+Foundation / SR Legacy / Branded / Survey downloads; they are streamed, so
+the multi-GB Branded file never has to fit in memory.
+"""
+import asyncio
+import csv
+import sys
+from pathlib import Path
+from typing import Iterable, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.managers.fdc_manager import FdcManager
+from app.models.fdc_food import FdcFood, FdcNutrient, FdcFoodNutrient, FdcFoodPortion, FdcSearchToken
+from app.utils.fuzzy_matcher import tokenize
+from app.utils.json_stream import iter_json_array
+
+# data_type values used in food.csv -> names used by the FDC API
+CSV_DATA_TYPES = {
+    "foundation_food": "Foundation",
+    "sr_legacy_food": "SR Legacy",
+    "branded_food": "Branded",
+    "survey_fndds_food": "Survey (FNDDS)",
+}
+
+# Top-level array of each JSON download
+JSON_ROOT_KEYS = ("FoundationFoods", "SRLegacyFoods", "BrandedFoods", "SurveyFoods")
+
+DEFAULT_DATA_TYPES = ("Foundation", "SR Legacy", "Branded")
+
+
+def _float(value) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _nutrient_number(value) -> Optional[str]:
+    """FDC dumps write nutrient numbers as "208" or "208.0"; the API uses "208"."""
+    if value in (None, ""):
+        return None
+    value = str(value)
+    return value[:-2] if value.endswith(".0") else value
+
+
+class FdcImportProcessor:
+    def __init__(self, db: AsyncSession, data_types: Iterable[str] = DEFAULT_DATA_TYPES, batch_size: int = 5000):
+        self.db = db
+        self.data_types = set(data_types)
+        self.batch_size = batch_size
+        self.counts = {"foods": 0, "nutrients": 0, "food_nutrients": 0, "portions": 0, "tokens": 0}
+        self._pending = {}
+        self._known_nutrients = set()
+
+    async def import_path(self, path) -> dict:
+        path = Path(path)
+        if path.is_dir():
+            await self.import_csv_dir(path)
+        else:
+            await self.import_json_file(path)
+        return self.counts
+
+    # --- CSV dumps -------------------------------------------------------
+
+    async def import_csv_dir(self, directory: Path):
+        directory = Path(directory)
+        for row in self._read_csv(directory / "nutrient.csv"):
+            await self._add_nutrient(int(row["id"]), row["name"], row.get("unit_name"), row.get("nutrient_nbr"))
+
+        categories = {row["id"]: row["description"] for row in self._read_csv(directory / "food_category.csv")}
+        measure_units = {row["id"]: row["name"] for row in self._read_csv(directory / "measure_unit.csv")}
+        branded = {}
+        for row in self._read_csv(directory / "branded_food.csv"):
+            branded[row["fdc_id"]] = (
+                row.get("brand_owner") or None,
+                row.get("brand_name") or None,
+                row.get("branded_food_category") or None,
+                _float(row.get("serving_size")),
+                row.get("serving_size_unit") or None,
+                row.get("household_serving_fulltext") or None,
+            )
+
+        imported = set()
+        for row in self._read_csv(directory / "food.csv"):
+            data_type = CSV_DATA_TYPES.get(row.get("data_type"))
+            if data_type not in self.data_types:
+                continue
+            brand_owner, brand_name, branded_category, serving_size, serving_unit, household = branded.get(
+                row["fdc_id"], (None, None, None, None, None, None)
+            )
+            fdc_id = int(row["fdc_id"])
+            imported.add(fdc_id)
+            await self._add_food({
+                "fdc_id": fdc_id,
+                "data_type": data_type,
+                "description": row["description"],
+                "food_category": categories.get(row.get("food_category_id")) or branded_category,
+                "brand_owner": brand_owner,
+                "brand_name": brand_name,
+                "serving_size": serving_size,
+                "serving_size_unit": serving_unit,
+                "household_serving_text": household,
+                "publication_date": row.get("publication_date") or None,
+            })
+        branded.clear()
+        await self._flush()
+
+        for row in self._read_csv(directory / "food_nutrient.csv"):
+            fdc_id = int(row["fdc_id"])
+            if fdc_id in imported:
+                await self._add(FdcFoodNutrient, "food_nutrients", {
+                    "fdc_id": fdc_id,
+                    "nutrient_id": int(row["nutrient_id"]),
+                    "amount": _float(row.get("amount")),
+                })
+
+        for row in self._read_csv(directory / "food_portion.csv"):
+            fdc_id = int(row["fdc_id"])
+            if fdc_id in imported:
+                await self._add(FdcFoodPortion, "portions", {
+                    "id": int(row["id"]),
+                    "fdc_id": fdc_id,
+                    "amount": _float(row.get("amount")),
+                    "measure_unit": measure_units.get(row.get("measure_unit_id")),
+                    "modifier": row.get("modifier") or None,
+                    "portion_description": row.get("portion_description") or None,
+                    "gram_weight": _float(row.get("gram_weight")),
+                })
+        await self._flush()
+
+    @staticmethod
+    def _read_csv(path: Path):
+        if not path.exists():
+            return
+        with open(path, newline="", encoding="utf-8") as fp:
+            yield from csv.DictReader(fp)
+
+    # --- JSON dumps ------------------------------------------------------
+
+    async def import_json_file(self, path: Path):
+        root_key = self._detect_root_key(path)
+        with open(path, "rb") as fp:
+            for item in iter_json_array(fp, root_key):
+                await self._add_json_food(item)
+        await self._flush()
+
+    @staticmethod
+    def _detect_root_key(path: Path) -> str:
+        with open(path, "r", encoding="utf-8") as fp:
+            head = fp.read(4096)
+        for key in JSON_ROOT_KEYS:
+            if f'"{key}"' in head:
+                return key
+        raise ValueError(f"{path} is not a FoodData Central JSON download")
+
+    async def _add_json_food(self, item: dict):
+        data_type = item.get("dataType")
+        if data_type not in self.data_types:
+            return
+        fdc_id = int(item["fdcId"])
+        category = item.get("foodCategory")
+        if isinstance(category, dict):
+            category = category.get("description")
+        await self._add_food({
+            "fdc_id": fdc_id,
+            "data_type": data_type,
+            "description": item.get("description", ""),
+            "food_category": category or item.get("brandedFoodCategory"),
+            "brand_owner": item.get("brandOwner"),
+            "brand_name": item.get("brandName"),
+            "serving_size": _float(item.get("servingSize")),
+            "serving_size_unit": item.get("servingSizeUnit"),
+            "household_serving_text": item.get("householdServingFullText"),
+            "publication_date": item.get("publicationDate"),
+        })
+        for food_nutrient in item.get("foodNutrients", []):
+            nutrient = food_nutrient.get("nutrient") or {}
+            if "id" not in nutrient:
+                continue
+            await self._add_nutrient(nutrient["id"], nutrient.get("name", ""), nutrient.get("unitName"), nutrient.get("number"))
+            await self._add(FdcFoodNutrient, "food_nutrients", {
+                "fdc_id": fdc_id,
+                "nutrient_id": nutrient["id"],
+                "amount": _float(food_nutrient.get("amount")),
+            })
+        for portion in item.get("foodPortions", []):
+            if "id" not in portion:
+                continue
+            await self._add(FdcFoodPortion, "portions", {
+                "id": portion["id"],
+                "fdc_id": fdc_id,
+                "amount": _float(portion.get("amount")),
+                "measure_unit": (portion.get("measureUnit") or {}).get("name"),
+                "modifier": portion.get("modifier"),
+                "portion_description": portion.get("portionDescription"),
+                "gram_weight": _float(portion.get("gramWeight")),
+            })
+
+    # --- batching --------------------------------------------------------
+
+    async def _add_food(self, row: dict):
+        await self._add(FdcFood, "foods", row)
+        text = " ".join(filter(None, (row["description"], row.get("brand_name"), row.get("brand_owner"))))
+        for token in set(tokenize(text)):
+            await self._add(FdcSearchToken, "tokens", {"token": token, "fdc_id": row["fdc_id"]})
+
+    async def _add_nutrient(self, nutrient_id: int, name: str, unit_name: Optional[str], number):
+        if nutrient_id in self._known_nutrients:
+            return
+        self._known_nutrients.add(nutrient_id)
+        await self._add(FdcNutrient, "nutrients", {
+            "id": nutrient_id,
+            "name": name,
+            "unit_name": unit_name,
+            "nutrient_number": _nutrient_number(number),
+        })
+
+    async def _add(self, model, counter: str, row: dict):
+        rows = self._pending.setdefault(model, [])
+        rows.append(row)
+        self.counts[counter] += 1
+        if len(rows) >= self.batch_size:
+            await self._flush()
+
+    async def _flush(self):
+        # Parents first so foreign keys hold on backends that enforce them
+        for model in (FdcNutrient, FdcFood, FdcFoodNutrient, FdcFoodPortion, FdcSearchToken):
+            rows = self._pending.pop(model, None)
+            if rows:
+                await FdcManager.insert_ignore(self.db, model, rows)
+        await self.db.commit()
+
+
+async def main(paths):
+    from app.db.database import AsyncSessionLocal
+    for path in paths:
+        async with AsyncSessionLocal() as db:
+            counts = await FdcImportProcessor(db).import_path(path)
+        print(f"{path}: {counts}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    asyncio.run(main(sys.argv[1:]))
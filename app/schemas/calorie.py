@@ -0,0 +1,11 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+class MealItem(BaseModel):
+    query: str = Field(min_length=1)
+    servings: float = Field(default=1, gt=0)
+    # "serving" by default; also g, oz, lb or a household measure such as "cup"
+    unit: Optional[str] = Field(default=None, min_length=1)
+
+class MealSearchRequest(BaseModel):
+    items: List[MealItem] = Field(min_length=1)
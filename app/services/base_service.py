@@ -1,13 +1,32 @@
+import time
 import requests
+from typing import Any, Awaitable, Callable, Optional
 from urllib.parse import urljoin
 import httpx
+from app.managers.http_client_manager import HttpClientManager
+from app.utils import log_function_call
+from app.utils.metrics import REGISTRY
+
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    "upstream_requests_total",
+    "Outbound API calls by service, method and outcome (ok, http_4xx, http_5xx, timeout, error)",
+    ("service", "method", "outcome"),
+)
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    "upstream_request_duration_seconds",
+    "Outbound API call latency by service and method",
+    ("service", "method"),
+)
 
 class BaseService:
-    def __init__(self, base_url: str = ""):
+    def __init__(self, base_url: str = "", timeout: Optional[float] = None):
         self.base_url = base_url
+        # Per-service timeout; None falls back to the shared client's default
+        self.timeout = timeout
         self.endpoint = ""
         self.params = {}
         self.data = {}
+        self.json = None
         self.headers = {}
         self.method = "GET"
 
@@ -23,6 +42,10 @@ class BaseService:
         self.data = data
         return self
 
+    def set_json(self, json: Any):
+        self.json = json
+        return self
+
     def set_headers(self, headers: dict):
         self.headers = headers
         return self
@@ -41,21 +64,71 @@ class BaseService:
             url=url,
             params=self.params if self.method == "GET" else None,
             data=self.data if self.method in ["POST", "PUT", "PATCH"] else None,
-            headers=self.headers
+            json=self.json if self.method in ["POST", "PUT", "PATCH"] else None,
+            headers=self.headers,
+            timeout=self.timeout
         )
         return response
 
+    def _request_options(self) -> dict:
+        return {
+            "method": self.method,
+            "url": self.generate_url(),
+            "params": self.params if self.method == "GET" else None,
+            "data": self.data if self.method in ["POST", "PUT", "PATCH"] else None,
+            "json": self.json if self.method in ["POST", "PUT", "PATCH"] else None,
+            "headers": self.headers,
+            "timeout": self.timeout if self.timeout is not None else httpx.USE_CLIENT_DEFAULT,
+        }
+
+    @staticmethod
+    def _outcome(status_code: int) -> str:
+        if status_code >= 500:
+            return "http_5xx"
+        if status_code >= 400:
+            return "http_4xx"
+        return "ok"
+
+    @log_function_call(histogram="service.http_request")
     async def async_make_request(self):
-        url = self.generate_url()
-        async with httpx.AsyncClient() as client:
-            response = await client.request(
-                method=self.method,
-                url=url,
-                params=self.params if self.method == "GET" else None,
-                data=self.data if self.method in ["POST", "PUT", "PATCH"] else None,
-                headers=self.headers
-            )
-            return response
+        # Captured before the first await, so concurrent calls on one service can't mix up their parameters
+        options = self._request_options()
+        client = await HttpClientManager.get_client()
+        service = type(self).__name__
+        started = time.perf_counter()
+        try:
+            response = await client.request(**options)
+        except Exception as exc:
+            outcome = "timeout" if isinstance(exc, httpx.TimeoutException) else "error"
+            UPSTREAM_REQUESTS.labels(service, options["method"], outcome).inc()
+            raise
+        finally:
+            UPSTREAM_LATENCY.labels(service, options["method"]).observe(time.perf_counter() - started)
+        UPSTREAM_REQUESTS.labels(service, options["method"], self._outcome(response.status_code)).inc()
+        return response
+
+    @log_function_call(histogram="service.http_stream")
+    async def async_make_streaming_request(self, consume: Callable[[httpx.Response], Awaitable]):
+        """
+        Like `async_make_request`, but `consume(response)` gets the response
+        before its body is read, so it can process the body as it arrives.
+        Returns what `consume` returns; latency includes reading the body.
+        """
+        options = self._request_options()
+        client = await HttpClientManager.get_client()
+        service = type(self).__name__
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            async with client.stream(**options) as response:
+                outcome = self._outcome(response.status_code)
+                return await consume(response)
+        except httpx.TimeoutException:
+            outcome = "timeout"
+            raise
+        finally:
+            UPSTREAM_REQUESTS.labels(service, options["method"], outcome).inc()
+            UPSTREAM_LATENCY.labels(service, options["method"]).observe(time.perf_counter() - started)
 
     def invoke(self):
         """
@@ -68,3 +141,9 @@ class BaseService:
         Main method to be called for making the request asynchronously.
         """
         return await self.async_make_request()
+
+    async def async_invoke_streaming(self, consume: Callable[[httpx.Response], Awaitable]):
+        """
+        Make the request asynchronously, handing the unread response to `consume`.
+        """
+        return await self.async_make_streaming_request(consume)
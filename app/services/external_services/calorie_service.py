@@ -1,11 +1,50 @@
+import asyncio
+import math
+from typing import Dict, List, Optional, Sequence
+import httpx
 from app.services.base_service import BaseService
-from app.utils.constant import CALORIE_API
-from app.utils.fuzzy_matcher import fuzzy_compare
+from app.config.settings import settings
+from app.db.database import AsyncSessionLocal
+from app.managers.fdc_manager import FdcManager
+from app.managers.food_cache_manager import FoodDetailCache, FoodSearchCache
+from app.managers.single_flight_manager import DistributedSingleFlight
+from app.utils import log_function_call, warning
+from app.utils.food_ranker import FoodRanker
+from app.utils.food_search_parser import FoodSearchParser
+from app.utils.exceptions import ServiceUnavailableException
+from app.utils.metrics import REGISTRY
+from app.utils.micro_batcher import MicroBatcher
+from app.utils.page_size_tuner import PageSizeTuner
+from app.utils.single_flight import SingleFlight
+
+# Identical in-flight searches share one upstream call, per process and across workers
+search_flight = SingleFlight()
+shared_search_flight = DistributedSingleFlight(
+    "usda:flight",
+    lock_ttl_ms=settings.SEARCH_COALESCE_LOCK_TTL_MS,
+    wait_timeout=settings.SEARCH_COALESCE_WAIT_TIMEOUT,
+    retry_seconds=settings.SEARCH_COALESCE_REDIS_RETRY_SECONDS,
+)
+
+# Learns the first page size per query for the adaptive search
+page_size_tuner = PageSizeTuner(settings.SEARCH_ADAPTIVE_PAGE_SIZES, max_queries=settings.SEARCH_ADAPTIVE_MAX_QUERIES)
+ADAPTIVE_SEARCHES = REGISTRY.counter(
+    "usda_adaptive_searches_total",
+    "Adaptive searches by whether a confident match was found before the result limit",
+    ("result",),
+)
+ADAPTIVE_PAGES = REGISTRY.counter("usda_adaptive_pages_total", "Result pages fetched by adaptive searches")
+SPLIT_BRANCHES = REGISTRY.counter(
+    "usda_split_branches_total",
+    "Branches of data type split searches by data types and outcome",
+    ("data_types", "result"),
+)
 
 class CalorieService(BaseService):
-    def __init__(self, api_key: str):
-        super().__init__(base_url=CALORIE_API)
+    def __init__(self, api_key: str, mode: str = None):
+        super().__init__(base_url=settings.USDA_API_BASE_URL, timeout=settings.USDA_API_TIMEOUT)
         self.api_key = api_key
+        self.mode = mode or settings.CALORIE_SEARCH_MODE
 
     def search_food(self, query: str, page_size: int = 100):
         self.set_endpoint("foods/search")
@@ -18,34 +57,311 @@ class CalorieService(BaseService):
         })
         return self.invoke()
 
-    async def async_search_food(self, query: str, page_size: int = 100):
-        self.set_endpoint("foods/search")
-        self.set_method("GET")
-        self.set_params({
+    @log_function_call(histogram="service.usda_search")
+    async def async_search_food(
+        self, query: str, page_size: int = 100, page_number: int = 1, data_types: Optional[Sequence[str]] = None
+    ) -> dict:
+        """
+        Search USDA foods and return the parsed JSON body, served through the
+        two-tier search cache when it is enabled. Cache misses for the same
+        query are coalesced into a single upstream call.
+
+        In "local" mode the imported FoodData Central mirror answers instead
+        (always with the first page); "hybrid" falls back to the API when the
+        mirror has no hits. `data_types` restricts the search to those FDC
+        data types.
+        """
+        if self.mode in ("local", "hybrid"):
+            data = await self.async_search_local(query, page_size, data_types)
+            if self.mode == "local" or data["totalHits"]:
+                return data
+        key = FoodSearchCache.make_key(query, page_size, page_number, data_types)
+        fetch = lambda: self._async_fetch_search_coalesced(key, query, page_size, page_number, data_types)
+        if not settings.SEARCH_CACHE_ENABLED:
+            return await fetch()
+        return await FoodSearchCache.get_or_fetch(key, fetch, cacheable=lambda data: "foods" in data)
+
+    async def async_find_best_match(self, query: str) -> dict:
+        """
+        Search for the query and return the best fuzzy match (see
+        `get_best_fuzzy_match`), or {} when there are no hits. With
+        `SEARCH_SPLIT_ENABLED` the data type groups are searched separately
+        (see `async_search_split`); otherwise, against the API, this uses the
+        adaptive search when it is enabled.
+        """
+        if settings.SEARCH_SPLIT_ENABLED:
+            ranked = await self.async_search_split(query, 1)
+            if not ranked:
+                return {}
+            _, ratio, food = ranked[0]
+            best_food = food.copy()
+            best_food['fuzzy_score'] = ratio
+            return best_food
+        if settings.SEARCH_ADAPTIVE_ENABLED and self.mode == "remote":
+            return await self._async_find_best_match_adaptive(query)
+        data = await self.async_search_food(query)
+        if data.get("totalHits", 0) == 0:
+            return {}
+        return self.get_best_fuzzy_match(query, data.get("foods", []))
+
+    async def _async_find_best_match_adaptive(self, query: str) -> dict:
+        """
+        Ask for a first page sized by `page_size_tuner`. While no food scores
+        `SEARCH_ADAPTIVE_CONFIDENCE`, fetch the following pages up to
+        `SEARCH_ADAPTIVE_MAX_RESULTS` results, `SEARCH_ADAPTIVE_FANOUT` at a
+        time, and stop (cancelling the rest) as soon as one does. The best
+        match over everything fetched is returned, earlier pages winning ties.
+        """
+        normalized = FoodSearchCache.normalize_query(query)
+        page_size = page_size_tuner.initial_page_size(normalized)
+        max_pages = max(1, math.ceil(settings.SEARCH_ADAPTIVE_MAX_RESULTS / page_size))
+        best = (-1.0, 0, None)  # (score, -page_number, food)
+        depth = 0
+
+        def consider(page_number: int, data: dict) -> bool:
+            """Rank one page; returns True once a confident match is known."""
+            nonlocal best, depth
+            foods = data.get("foods") or []
+            ranked = self.rank_foods(query, foods, 1)
+            if ranked and (ranked[0][0], -page_number) > best[:2]:
+                score, food = ranked[0]
+                best = (score, -page_number, food)
+                if score >= settings.SEARCH_ADAPTIVE_CONFIDENCE:
+                    position = next(index for index, candidate in enumerate(foods) if candidate is food)
+                    depth = (page_number - 1) * page_size + position + 1
+                    return True
+            return False
+
+        first = await self.async_search_food(query, page_size, 1)
+        total_hits = first.get("totalHits", 0)
+        if total_hits == 0:
+            return {}
+        pages_fetched = 1
+        confident = consider(1, first)
+        last_page = min(max_pages, math.ceil(total_hits / page_size))
+
+        next_page = 2
+        while not confident and next_page <= last_page:
+            wave = range(next_page, min(next_page + settings.SEARCH_ADAPTIVE_FANOUT, last_page + 1))
+            next_page = wave.stop
+            tasks = {asyncio.ensure_future(self.async_search_food(query, page_size, number)): number for number in wave}
+            try:
+                pending = set(tasks)
+                while pending and not confident:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in sorted(done, key=tasks.get):
+                        pages_fetched += 1
+                        if task.exception() is None:
+                            confident = consider(tasks[task], task.result()) or confident
+                        else:
+                            # A missing later page only narrows the candidates
+                            warning("USDA search page failed", query=query, page=tasks[task], exception=str(task.exception()))
+            finally:
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+                    elif not task.cancelled():
+                        task.exception()
+
+        if not confident:
+            depth = min(total_hits, last_page * page_size)
+        page_size_tuner.record(normalized, depth)
+        ADAPTIVE_SEARCHES.labels("confident" if confident else "exhausted").inc()
+        ADAPTIVE_PAGES.inc(amount=pages_fetched)
+
+        score, _, food = best
+        if food is None:
+            return {}
+        best_food = food.copy()
+        best_food['fuzzy_score'] = score
+        return best_food
+
+    @log_function_call(histogram="service.usda_search_split")
+    async def async_search_split(self, query: str, k: Optional[int] = None) -> list:
+        """
+        Search every `SEARCH_SPLIT_GROUPS` group of data types concurrently,
+        one page of `SEARCH_SPLIT_PAGE_SIZE` foods each, and return the merged
+        foods ranked by `rank_merged` (at most `k`). A branch that fails or
+        takes longer than `SEARCH_SPLIT_TIMEOUT` seconds is left out of the
+        merge; the first error is raised only when every branch failed.
+        """
+        groups = settings.SEARCH_SPLIT_GROUPS
+        results = await asyncio.gather(
+            *(
+                asyncio.wait_for(
+                    self.async_search_food(query, settings.SEARCH_SPLIT_PAGE_SIZE, 1, group),
+                    settings.SEARCH_SPLIT_TIMEOUT,
+                )
+                for group in groups
+            ),
+            return_exceptions=True,
+        )
+
+        branches, errors = [], []
+        for group, result in zip(groups, results):
+            data_types = ",".join(group)
+            if isinstance(result, BaseException):
+                outcome = "timeout" if isinstance(result, asyncio.TimeoutError) else "error"
+                SPLIT_BRANCHES.labels(data_types, outcome).inc()
+                warning("USDA search branch failed", query=query, data_types=data_types, outcome=outcome, exception=repr(result))
+                errors.append(result)
+            else:
+                SPLIT_BRANCHES.labels(data_types, "ok").inc()
+                branches.append(result.get("foods") or [])
+        if errors and not branches:
+            raise errors[0]
+        return self.rank_merged(query, branches, settings.SEARCH_SPLIT_PRIORITY, k)
+
+    @log_function_call(histogram="service.usda_foods")
+    async def async_get_foods(self, fdc_ids: Sequence[int]) -> Dict[int, Optional[dict]]:
+        """
+        Return fdcId -> full food details (portions, all nutrients), None for
+        ids FDC does not know. Each food is cached on its own; cache misses
+        from all concurrent requests are collected by `food_batcher` and
+        fetched together through FDC's multi-food endpoint. "local" mode
+        answers from the mirror, and "hybrid" only asks the API for foods
+        the mirror lacks.
+        """
+        fdc_ids = list(dict.fromkeys(fdc_ids))
+        foods = {}
+        if self.mode in ("local", "hybrid"):
+            foods = await self.async_get_local_foods(fdc_ids)
+        if self.mode != "local":
+            missing = [fdc_id for fdc_id in fdc_ids if fdc_id not in foods]
+            fetched = await asyncio.gather(*(self._async_get_food_cached(fdc_id) for fdc_id in missing))
+            foods.update(zip(missing, fetched))
+        return {fdc_id: foods.get(fdc_id) for fdc_id in fdc_ids}
+
+    async def async_get_food(self, fdc_id: int) -> Optional[dict]:
+        return (await self.async_get_foods([fdc_id]))[fdc_id]
+
+    async def async_get_local_foods(self, fdc_ids: Sequence[int]) -> dict:
+        async with AsyncSessionLocal() as db:
+            return await FdcManager.get_foods(db, fdc_ids)
+
+    async def _async_get_food_cached(self, fdc_id: int) -> Optional[dict]:
+        fetch = lambda: food_batcher.load(fdc_id)
+        if not settings.SEARCH_CACHE_ENABLED:
+            return await fetch()
+        key = FoodDetailCache.make_key(fdc_id)
+        return await FoodDetailCache.get_or_fetch(key, fetch, cacheable=lambda food: food is not None)
+
+    async def _async_fetch_foods(self, fdc_ids: List[int]) -> Dict[int, dict]:
+        """One `POST foods` call for up to `FOOD_DETAIL_BATCH_SIZE` fdcIds."""
+        self.set_endpoint("foods")
+        self.set_method("POST")
+        self.set_headers({"X-Api-Key": self.api_key})
+        self.set_json({"fdcIds": fdc_ids, "format": "full"})
+        response = await self.async_invoke()
+        if response.status_code == 404:
+            return {}
+        if response.status_code != 200:
+            raise ServiceUnavailableException(f"FoodData Central answered {response.status_code}.")
+        return {food["fdcId"]: food for food in response.json() if "fdcId" in food}
+
+    async def async_search_local(self, query: str, page_size: int = 100, data_types: Optional[Sequence[str]] = None) -> dict:
+        async with AsyncSessionLocal() as db:
+            return await FdcManager.search_foods(db, query, page_size, data_types)
+
+    async def _async_fetch_search_coalesced(
+        self, key: str, query: str, page_size: int, page_number: int = 1, data_types: Optional[Sequence[str]] = None
+    ) -> dict:
+        fetch = lambda: self._async_fetch_search(query, page_size, page_number, data_types)
+        if settings.SEARCH_COALESCE_DISTRIBUTED:
+            upstream = fetch
+            # Error bodies are not shared: other workers make their own call
+            fetch = lambda: shared_search_flight.do(key, upstream, cacheable=lambda data: "foods" in data)
+        return await search_flight.do(key, fetch)
+
+    async def _async_fetch_search(
+        self, query: str, page_size: int, page_number: int = 1, data_types: Optional[Sequence[str]] = None
+    ) -> dict:
+        params = {
             "api_key": self.api_key,
             "query": query,
-            # "dataType": data_type,
-            "pageSize": page_size
-        })
-        return await self.async_invoke()
+            "pageSize": page_size,
+            "pageNumber": page_number,
+        }
+        if data_types:
+            params["dataType"] = ",".join(data_types)
+        self.set_endpoint("foods/search")
+        self.set_method("GET")
+        self.set_params(params)
+        if settings.USDA_STREAM_PARSE:
+            return await self.async_invoke_streaming(self._parse_search_stream)
+        response = await self.async_invoke()
+        return response.json()
+
+    @staticmethod
+    async def _parse_search_stream(response: httpx.Response) -> dict:
+        """
+        Parse a search response chunk by chunk as it is received, keeping
+        only the slimmed foods. Error bodies are returned as-is.
+        """
+        if response.status_code != 200:
+            await response.aread()
+            return response.json()
+        parser = FoodSearchParser()
+        async for chunk in response.aiter_bytes():
+            parser.feed(chunk)
+        return parser.close()
 
     @staticmethod
+    @log_function_call(sample_rate=0.1, histogram="fuzzy.rank_foods")
+    def rank_foods(query: str, foods: list, k: int = 5) -> list:
+        """
+        Return the `k` foods whose descriptions best match the query as
+        `(score, food)` pairs, highest score first.
+        """
+        return FoodRanker(foods).top_k(query, k)
+
+    @staticmethod
+    @log_function_call(sample_rate=0.1, histogram="fuzzy.rank_merged")
+    def rank_merged(query: str, branches: Sequence[list], priorities: Dict[str, float], k: Optional[int] = None) -> List[tuple]:
+        """
+        Rank the foods of several searches together as `(score, ratio, food)`,
+        highest score first. `ratio` is the description match (as in
+        `rank_foods`) and `score` is the ratio times the priority of the
+        food's data type (1.0 when not listed). A food returned by more than
+        one search counts once; ties keep the ratio order, then the order of
+        the searches.
+        """
+        foods, seen = [], set()
+        for branch in branches:
+            for food in branch:
+                fdc_id = food.get("fdcId")
+                if fdc_id is not None:
+                    if fdc_id in seen:
+                        continue
+                    seen.add(fdc_id)
+                foods.append(food)
+        ranked = FoodRanker(foods).top_k(query, len(foods))
+        merged = sorted(
+            ((ratio * priorities.get(food.get("dataType"), 1.0), ratio, food) for ratio, food in ranked),
+            key=lambda entry: -entry[0],
+        )
+        return merged[:k] if k else merged
+
+    @staticmethod
+    @log_function_call(sample_rate=0.1, histogram="fuzzy.best_match")
     def get_best_fuzzy_match(query: str, foods: list) -> dict:
         """
-        Compare the search query with each food's description using fuzzy_compare.
-        Return the food with the highest similarity ratio and the ratio score.
-        """
-        best_food = None
-        best_score = -1
-        for food in foods:
-            desc = food.get('description', '')
-            result = fuzzy_compare(query, desc)
-            if result['ratio'] > best_score:
-                best_score = result['ratio']
-                best_food = food.copy()
-                best_food['fuzzy_score'] = best_score
-            
-            if result["is_fuzzy_match"]:
-                break
-            
-        return best_food if best_food else {} 
\ No newline at end of file
+        Compare the search query with each food's description using the same
+        similarity ratio as fuzzy_compare. Return the food with the highest
+        ratio, with the score added as `fuzzy_score`.
+        """
+        ranked = FoodRanker(foods).top_k(query, 1)
+        if not ranked:
+            return {}
+        score, food = ranked[0]
+        best_food = food.copy()
+        best_food['fuzzy_score'] = score
+        return best_food
+
+
+# Food detail cache misses across concurrent requests, fetched in batches
+food_batcher = MicroBatcher(
+    lambda fdc_ids: CalorieService(api_key=settings.USDA_API_KEY)._async_fetch_foods(fdc_ids),
+    max_batch=settings.FOOD_DETAIL_BATCH_SIZE,
+    window=settings.FOOD_DETAIL_BATCH_WINDOW_MS / 1000,
+)
@@ -22,4 +22,8 @@ class MethodNotAllowedException(HTTPException):
 
 class UnprocessableEntityException(HTTPException):
     def __init__(self, detail="Unprocessable Entity"):
-        super().__init__(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=detail)
\ No newline at end of file
+        super().__init__(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=detail)
+
+class ServiceUnavailableException(HTTPException):
+    def __init__(self, detail="Service Unavailable"):
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail)
\ No newline at end of file
@@ -0,0 +1,70 @@
+import heapq
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Callable, Dict, List, Sequence, Tuple
+
+
+class FoodRanker:
+    """
+    Ranks a list of foods against search queries.
+
+    Descriptions are lowercased and an inverted index of character counts
+    (character -> `(position, count)` postings) is built over them once. A
+    query is then scored against every food in one pass over the postings
+    of its characters: the characters it shares with each description give
+    an upper bound on the SequenceMatcher ratio (difflib's `quick_ratio`).
+    Foods are visited best bound first and only those whose bound can still
+    reach the current top-k get the exact ratio, computed as
+    `fuzzy_compare(query, description)` does. The result is the exact top-k
+    by ratio, ties keeping the earlier food. A ranker can be reused for any
+    number of queries over the same foods.
+    """
+
+    def __init__(self, foods: Sequence[dict], text_of: Callable[[dict], str] = lambda food: food.get('description') or ''):
+        self.foods = foods
+        self._texts: List[str] = []
+        self._index: Dict[str, List[Tuple[int, int]]] = {}
+        for position, food in enumerate(foods):
+            text = text_of(food).lower()
+            self._texts.append(text)
+            for char, count in Counter(text).items():
+                self._index.setdefault(char, []).append((position, count))
+
+    def __len__(self):
+        return len(self.foods)
+
+    def upper_bounds(self, query: str) -> List[Tuple[float, int]]:
+        """`(bound, position)` for every food, highest bound first, then by position."""
+        query = query.lower()
+        shared = [0] * len(self.foods)
+        for char, wanted in Counter(query).items():
+            for position, count in self._index.get(char, ()):
+                shared[position] += count if count < wanted else wanted
+        query_length = len(query)
+        bounds = [
+            (2.0 * common / total if (total := query_length + len(text)) else 1.0, position)
+            for position, (common, text) in enumerate(zip(shared, self._texts))
+        ]
+        bounds.sort(key=lambda item: (-item[0], item[1]))
+        return bounds
+
+    def top_k(self, query: str, k: int = 1) -> List[Tuple[float, dict]]:
+        """Return up to `k` `(ratio, food)` pairs, highest ratio first."""
+        if not self.foods or k <= 0:
+            return []
+        # Same argument order as fuzzy_compare: the ratio is not symmetric
+        matcher = SequenceMatcher(None, query.lower())
+        heap: List[Tuple[float, int]] = []
+        for bound, position in self.upper_bounds(query):
+            # A bound equal to the floor can still tie it and win on position
+            if len(heap) == k and bound < heap[0][0]:
+                break
+            matcher.set_seq2(self._texts[position])
+            # Ties keep the earlier food (negated position in the heap key)
+            entry = (matcher.ratio(), -position)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+        return [(ratio, self.foods[-position]) for ratio, position in sorted(heap, reverse=True)]
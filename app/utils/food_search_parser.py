@@ -0,0 +1,84 @@
+from typing import Dict, Optional, Union
+from app.utils.json_stream import JsonArrayStreamer
+from app.utils.nutrient_resolver import resolve_nutrient
+
+# Top-level members of a foods/search response that are kept
+SEARCH_FIELDS = ("totalHits", "currentPage", "totalPages")
+# Food fields used for ranking, the result and portion conversions
+FOOD_FIELDS = (
+    "fdcId", "description", "dataType", "brandOwner", "foodCategory",
+    "servingSize", "servingSizeUnit", "householdServingFullText", "foodMeasures",
+)
+
+# Whether a nutrient is known, by nutrient id (an FDC id fixes the number,
+# name and unit). FDC has a few hundred nutrients, so this saves resolving
+# every entry again; entries without an id are always resolved.
+_KNOWN_IDS: Dict[int, bool] = {}
+_KNOWN_MAX_ENTRIES = 4096
+
+
+def _is_known(entry: dict) -> bool:
+    nutrient_id = entry.get("nutrientId")
+    known = _KNOWN_IDS.get(nutrient_id)
+    if known is None:
+        known = resolve_nutrient(entry) is not None
+        if nutrient_id is not None and len(_KNOWN_IDS) < _KNOWN_MAX_ENTRIES:
+            _KNOWN_IDS[nutrient_id] = known
+    return known
+
+
+def slim_food(food: dict) -> dict:
+    """
+    Keep only the fields of a search result food that are used downstream,
+    and only the `foodNutrients` entries that resolve to a known nutrient
+    (see `nutrient_resolver.NUTRIENTS`). Extracting nutrients from the slim
+    food gives the same result as from the original.
+    """
+    slim = {field: food[field] for field in FOOD_FIELDS if field in food}
+    slim["foodNutrients"] = [
+        {
+            "nutrientId": entry.get("nutrientId"),
+            "nutrientNumber": entry.get("nutrientNumber"),
+            "nutrientName": entry.get("nutrientName"),
+            "unitName": entry.get("unitName"),
+            "value": entry.get("value"),
+        }
+        for entry in food.get("foodNutrients") or ()
+        if _is_known(entry)
+    ]
+    return slim
+
+
+class FoodSearchParser:
+    """
+    Incremental parser for USDA `foods/search` responses. Bytes are pushed in
+    with `feed()` as they arrive; each food is slimmed down (`slim_food`) as
+    soon as it is complete, so neither the raw body nor the full food objects
+    (Branded and Foundation foods list dozens of nutrients each) are ever held
+    for the whole page.
+    """
+
+    def __init__(self):
+        self._streamer = JsonArrayStreamer("foods")
+        self._foods = []
+
+    def feed(self, chunk: Union[bytes, str]):
+        self._foods.extend(slim_food(food) for food in self._streamer.feed(chunk))
+
+    def close(self) -> dict:
+        """Finish parsing and return the slimmed response; raises ValueError on truncated input."""
+        self._foods.extend(slim_food(food) for food in self._streamer.close())
+        fields = self._streamer.fields
+        data = {field: fields[field] for field in SEARCH_FIELDS if field in fields}
+        if self._streamer.found:
+            data["foods"] = self._foods
+        return data
+
+
+def parse_search_response(body: Union[bytes, str], chunk_size: Optional[int] = None) -> dict:
+    """Parse a complete response body with `FoodSearchParser`, optionally in chunks."""
+    parser = FoodSearchParser()
+    chunk_size = chunk_size or len(body) or 1
+    for start in range(0, len(body), chunk_size):
+        parser.feed(body[start:start + chunk_size])
+    return parser.close()
@@ -1,14 +1,34 @@
 import difflib
+import re
+from app.config.settings import settings
 
 
 def fuzzy_compare(s1: str, s2: str) -> dict:
     """
     Compare two strings using difflib's SequenceMatcher for fuzzy logic.
-    Returns a dict with similarity ratio (0-1) and is_fuzzy_match (True if ratio > 0.85).
+    Returns a dict with similarity ratio (0-1) and is_fuzzy_match (True if ratio > settings.FUZZY_MATCH_THRESHOLD).
     """
     ratio = difflib.SequenceMatcher(None, s1.lower(), s2.lower()).ratio()
-    is_fuzzy_match = ratio > 0.85
+    is_fuzzy_match = ratio > settings.FUZZY_MATCH_THRESHOLD
     return {
         'ratio': ratio,
         'is_fuzzy_match': is_fuzzy_match
     }
+
+
+_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercase the text and collapse punctuation/whitespace to single spaces,
+    e.g. "Cheese, cheddar (sharp)" -> "cheese cheddar sharp".
+    """
+    return " ".join(_TOKEN_PATTERN.findall(text.lower()))
+
+
+def tokenize(text: str) -> list:
+    """
+    Split text into lowercase search tokens, dropping single characters.
+    """
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if len(token) > 1]
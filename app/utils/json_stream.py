@@ -0,0 +1,202 @@
+import codecs
+import json
+import re
+from typing import Any, IO, Iterator, List, Union
+
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+_NOT_BRACKET = re.compile(r'[^\[\]{}]+')
+
+
+class JsonArrayStreamer:
+    """
+    Incremental parser for a JSON object whose large member is an array.
+
+    Bytes are pushed in with `feed()`; the elements of the top-level array
+    `key` are returned one at a time as soon as they are complete, so the
+    array is never held in memory as a whole. Every other top-level member
+    is decoded normally and kept in `fields`.
+
+    Each element is decoded with the C-accelerated `json` decoder; only the
+    top-level structure is walked by hand. An element cut off by the end of
+    a chunk is decoded again with the next chunk; if it is still incomplete
+    (it spans more than a chunk), its bracket depth is then tracked over the
+    text as it arrives and it is decoded once more, when it is whole, so
+    large elements cost linear rather than quadratic time.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.fields = {}
+        # Whether the document has an array under `key` at all
+        self.found = False
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._state = "start"
+        self._current_key = None
+        # Progress through an incomplete object or array: how far past its
+        # start it has been scanned, and the bracket depth there (or None)
+        self._scan_offset = 0
+        self._scan_depth = None
+        # Whether decoding the current value already failed once
+        self._retried = False
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def feed(self, chunk: Union[bytes, str]) -> List[Any]:
+        if isinstance(chunk, bytes):
+            chunk = self._text_decoder.decode(chunk)
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return self._parse()
+
+    def close(self) -> List[Any]:
+        """Signal end of input; raises ValueError if the document is incomplete."""
+        self._buffer = self._buffer[self._pos:] + self._text_decoder.decode(b"", final=True)
+        self._pos = 0
+        self._eof = True
+        items = self._parse()
+        if not self.done:
+            raise ValueError("Incomplete JSON document")
+        return items
+
+    def _skip(self, chars: str = _WHITESPACE) -> bool:
+        """Skip `chars`; returns False if the buffer ran out."""
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer) and buffer[pos] in chars:
+            pos += 1
+        self._pos = pos
+        return pos < len(buffer)
+
+    def _expect(self, char: str) -> bool:
+        if not self._skip():
+            return False
+        if self._buffer[self._pos] != char:
+            raise ValueError(f"Expected {char!r} at offset {self._pos}")
+        self._pos += 1
+        return True
+
+    def _scan_value(self) -> bool:
+        """
+        Track the bracket depth of an incomplete object or array over the text
+        added since the last call; returns True once it is closed.
+        """
+        start = self._pos
+        structure = _STRING.sub("", self._buffer[start + self._scan_offset:])
+        quote = structure.find('"')
+        if quote >= 0:
+            # A string still open at the end is scanned again from its quote next time
+            self._scan_offset = len(self._buffer) - start - (len(structure) - quote)
+            structure = structure[:quote]
+        else:
+            self._scan_offset = len(self._buffer) - start
+        brackets = _NOT_BRACKET.sub("", structure)
+        # Without matched pairs, what is left is unmatched closers then unmatched openers
+        while "{}" in brackets or "[]" in brackets:
+            brackets = brackets.replace("{}", "").replace("[]", "")
+        closers = len(brackets) - len(brackets.lstrip("]}"))
+        if closers >= self._scan_depth:
+            self._scan_depth = None
+            return True
+        self._scan_depth += len(brackets) - 2 * closers
+        return False
+
+    def _decode_value(self):
+        """Decode one value, or return (None, False) if it is not complete yet."""
+        if self._scan_depth is not None:
+            if not self._scan_value():
+                return None, False
+            value, self._pos = _decoder.raw_decode(self._buffer, self._pos)
+            self._retried = False
+            return value, True
+        try:
+            value, end = _decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if self._eof:
+                raise
+            if not self._retried:
+                # Most values cut off by a chunk end are complete with the next chunk
+                self._retried = True
+            elif self._buffer[self._pos] in "{[":
+                # Past the opening bracket
+                self._scan_offset, self._scan_depth = 1, 1
+                if self._scan_value():
+                    # Complete, so the error is in the document itself
+                    raise
+            return None, False
+        # A number ending exactly at the buffer edge may continue in the next chunk
+        if end >= len(self._buffer) and not self._eof:
+            return None, False
+        self._pos = end
+        self._retried = False
+        return value, True
+
+    def _parse(self) -> List[Any]:
+        items = []
+        while not self.done:
+            if self._state == "start":
+                if not self._expect("{"):
+                    break
+                self._state = "key"
+            elif self._state == "key":
+                if not self._skip(_WHITESPACE + ","):
+                    break
+                if self._buffer[self._pos] == "}":
+                    self._pos += 1
+                    self.done = True
+                    break
+                key, complete = self._decode_value()
+                if not complete:
+                    break
+                self._current_key = key
+                self._state = "colon"
+            elif self._state == "colon":
+                if not self._expect(":"):
+                    break
+                self._state = "array_start" if self._current_key == self.key else "value"
+            elif self._state == "value":
+                if not self._skip():
+                    break
+                value, complete = self._decode_value()
+                if not complete:
+                    break
+                self.fields[self._current_key] = value
+                self._state = "key"
+            elif self._state == "array_start":
+                if not self._skip():
+                    break
+                if self._buffer[self._pos] != "[":
+                    # Not an array after all (e.g. null); keep it as a plain field
+                    self._state = "value"
+                    continue
+                self._pos += 1
+                self.found = True
+                self._state = "items"
+            elif self._state == "items":
+                if not self._skip(_WHITESPACE + ","):
+                    break
+                if self._buffer[self._pos] == "]":
+                    self._pos += 1
+                    self._state = "key"
+                    continue
+                item, complete = self._decode_value()
+                if not complete:
+                    break
+                items.append(item)
+        return items
+
+
+def iter_json_array(fp: IO, key: str, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """
+    Yield the elements of the top-level array `key` from a JSON file object
+    without loading the whole document.
+    """
+    streamer = JsonArrayStreamer(key)
+    while True:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            break
+        yield from streamer.feed(chunk)
+    yield from streamer.close()
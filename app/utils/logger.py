@@ -1,20 +1,89 @@
+import atexit
+import copy
+import inspect
 import logging
 import os
+import queue
+import random
 import sys
-from datetime import datetime
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from typing import Optional, Dict, Any
 import json
 from functools import wraps
 import traceback
+from app.utils.metrics import get_histogram
+
+
+class ContextFormatter(logging.Formatter):
+    """Text formatter that appends the structured context passed to AppLogger."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        context = getattr(record, "context", None)
+        if context:
+            context_str = " | ".join([f"{k}={v}" for k, v in context.items()])
+            message = f"{message} | Context: {context_str}"
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    """Renders each record as one JSON object per line, context fields included."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "file": record.filename,
+            "line": record.lineno,
+            "function": record.funcName,
+        }
+        context = getattr(record, "context", None)
+        if context:
+            entry.update(context)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks the caller: records are dropped (and
+    counted) when the writer thread falls behind, and only the message is
+    resolved here; all other formatting happens on the writer thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
 
 class AppLogger:
     """
     A comprehensive logger class for the meal calorie counter application.
     Supports multiple log levels, file and console output, and structured logging.
+
+    By default records go through a bounded in-memory queue to a background
+    writer thread, so console and file I/O never run on the calling thread.
     """
     
+
     def __init__(
         self,
         name: str = "meal_calorie_counter",
@@ -24,7 +93,11 @@ class AppLogger:
         backup_count: int = 5,
         enable_console: bool = True,
         enable_file: bool = True,
-        format_string: Optional[str] = None
+        format_string: Optional[str] = None,
+        json_format: bool = False,
+        use_queue: bool = True,
+        queue_size: int = 10000,
+        sample_rates: Optional[Dict[str, float]] = None
     ):
         """
         Initialize the logger with specified configuration.
@@ -38,38 +111,72 @@ class AppLogger:
             enable_console: Whether to log to console
             enable_file: Whether to log to file
             format_string: Custom format string for log messages
+            json_format: Write one JSON object per line instead of text
+            use_queue: Hand records to a background writer thread
+            queue_size: Records buffered for the writer before new ones are dropped
+            sample_rates: Fraction of high-volume events to keep, keyed by
+                event ("request", "api_call", "database"); failures are always kept
         """
         self.name = name
         self.log_level = getattr(logging, log_level.upper(), logging.INFO)
+        self.sample_rates = dict(sample_rates or {})
+        self.queue_handler: Optional[_BoundedQueueHandler] = None
+        self.listener: Optional[QueueListener] = None
         
         # Create logger
         self.logger = logging.getLogger(name)
         self.logger.setLevel(self.log_level)
         
         # Clear existing handlers to avoid duplicates
+        _stop_listener(name)
         self.logger.handlers.clear()
         
         # Set up formatter
-        if format_string is None:
-            format_string = (
-                "%(asctime)s | %(name)s | %(levelname)s | "
-                "%(filename)s:%(lineno)d | %(funcName)s | %(message)s"
-            )
-        self.formatter = logging.Formatter(format_string)
+        if json_format:
+            self.formatter = JsonFormatter()
+        else:
+            if format_string is None:
+                format_string = (
+                    "%(asctime)s | %(name)s | %(levelname)s | "
+                    "%(filename)s:%(lineno)d | %(funcName)s | %(message)s"
+                )
+            self.formatter = ContextFormatter(format_string)
         
         # Set up handlers
+        self.handlers = []
         if enable_console:
             self._setup_console_handler()
         
         if enable_file:
             self._setup_file_handler(log_file, max_file_size, backup_count)
+
+        if use_queue and self.handlers:
+            self._setup_queue(queue_size)
+        else:
+            for handler in self.handlers:
+                self.logger.addHandler(handler)
+
+    def _setup_queue(self, queue_size: int):
+        """Route records through a bounded queue to a background writer thread."""
+        log_queue = queue.Queue(maxsize=queue_size)
+        self.queue_handler = _BoundedQueueHandler(log_queue)
+        self.logger.addHandler(self.queue_handler)
+        self.listener = QueueListener(log_queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+        _listeners[self.name] = self.listener
+
+    def close(self):
+        """Flush queued records and stop the writer thread."""
+        if self.listener is not None:
+            _stop_listener(self.name)
+            self.listener = None
     
     def _setup_console_handler(self):
         """Set up console logging handler."""
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(self.log_level)
         console_handler.setFormatter(self.formatter)
-        self.logger.addHandler(console_handler)
+        self.handlers.append(console_handler)
     
     def _setup_file_handler(self, log_file: Optional[str], max_file_size: int, backup_count: int):
         """Set up file logging handler with rotation."""
@@ -93,43 +200,65 @@ class AppLogger:
         )
         file_handler.setLevel(self.log_level)
         file_handler.setFormatter(self.formatter)
-        self.logger.addHandler(file_handler)
+        self.handlers.append(file_handler)
     
-    def debug(self, message: str, **kwargs):
+    def debug(self, message: str, *args, **kwargs):
         """Log debug message with optional structured data."""
-        self._log_with_context(logging.DEBUG, message, **kwargs)
+        self._log_with_context(logging.DEBUG, message, *args, **kwargs)
     
-    def info(self, message: str, **kwargs):
+    def info(self, message: str, *args, **kwargs):
         """Log info message with optional structured data."""
-        self._log_with_context(logging.INFO, message, **kwargs)
+        self._log_with_context(logging.INFO, message, *args, **kwargs)
     
-    def warning(self, message: str, **kwargs):
+    def warning(self, message: str, *args, **kwargs):
         """Log warning message with optional structured data."""
-        self._log_with_context(logging.WARNING, message, **kwargs)
+        self._log_with_context(logging.WARNING, message, *args, **kwargs)
     
-    def error(self, message: str, **kwargs):
+    def error(self, message: str, *args, **kwargs):
         """Log error message with optional structured data."""
-        self._log_with_context(logging.ERROR, message, **kwargs)
+        self._log_with_context(logging.ERROR, message, *args, **kwargs)
     
-    def critical(self, message: str, **kwargs):
+    def critical(self, message: str, *args, **kwargs):
         """Log critical message with optional structured data."""
-        self._log_with_context(logging.CRITICAL, message, **kwargs)
+        self._log_with_context(logging.CRITICAL, message, *args, **kwargs)
     
-    def _log_with_context(self, level: int, message: str, **kwargs):
-        """Log message with optional structured context data."""
-        if kwargs:
-            # Add structured data to message
-            context_str = " | ".join([f"{k}={v}" for k, v in kwargs.items()])
-            full_message = f"{message} | Context: {context_str}"
-        else:
-            full_message = message
-        
-        self.logger.log(level, full_message)
+    def _log_with_context(self, level: int, message: str, *args, **kwargs):
+        """
+        Log message with optional structured context data. `args` are merged
+        into `message` %-style, only if the record is actually emitted; the
+        context is rendered by the formatter.
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        self.logger.log(level, message, *args, extra={"context": kwargs})
+
+    def _sampled(self, event: str, context: Dict[str, Any]) -> bool:
+        """Decide whether to keep one occurrence of a sampled event."""
+        rate = self.sample_rates.get(event, 1.0)
+        if rate >= 1.0:
+            return True
+        if random.random() >= rate:
+            return False
+        # Lets readers scale sampled counts back up
+        context["sample_rate"] = rate
+        return True
+
+    def is_enabled_for(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def dropped_records(self) -> int:
+        """Records discarded because the writer queue was full."""
+        return self.queue_handler.dropped if self.queue_handler else 0
     
     def log_request(self, method: str, url: str, status_code: int, response_time: float, **kwargs):
-        """Log HTTP request details."""
-        self.info(
-            f"HTTP {method} {url} - Status: {status_code} - Time: {response_time:.3f}s",
+        """Log HTTP request details (sampled by "request" unless status >= 500)."""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        if status_code < 500 and not self._sampled("request", kwargs):
+            return
+        self._log_with_context(
+            logging.INFO,
+            "HTTP %s %s - Status: %s - Time: %.3fs", method, url, status_code, response_time,
             method=method,
             url=url,
             status_code=status_code,
@@ -138,9 +267,12 @@ class AppLogger:
         )
     
     def log_database_operation(self, operation: str, table: str, duration: float, **kwargs):
-        """Log database operation details."""
-        self.info(
-            f"DB {operation} on {table} - Duration: {duration:.3f}s",
+        """Log database operation details (sampled by "database")."""
+        if not self.logger.isEnabledFor(logging.INFO) or not self._sampled("database", kwargs):
+            return
+        self._log_with_context(
+            logging.INFO,
+            "DB %s on %s - Duration: %.3fs", operation, table, duration,
             operation=operation,
             table=table,
             duration=duration,
@@ -149,8 +281,9 @@ class AppLogger:
     
     def log_user_action(self, user_id: str, action: str, **kwargs):
         """Log user actions."""
-        self.info(
-            f"User {user_id} performed {action}",
+        self._log_with_context(
+            logging.INFO,
+            "User %s performed %s", user_id, action,
             user_id=user_id,
             action=action,
             **kwargs
@@ -158,9 +291,11 @@ class AppLogger:
     
     def log_exception(self, exception: Exception, context: str = "", **kwargs):
         """Log exception with full traceback."""
-        error_msg = f"Exception in {context}: {str(exception)}"
-        self.error(
-            error_msg,
+        if not self.logger.isEnabledFor(logging.ERROR):
+            return
+        self._log_with_context(
+            logging.ERROR,
+            "Exception in %s: %s", context, exception,
             exception_type=type(exception).__name__,
             exception_message=str(exception),
             traceback=traceback.format_exc(),
@@ -169,8 +304,9 @@ class AppLogger:
     
     def log_performance(self, operation: str, duration: float, **kwargs):
         """Log performance metrics."""
-        self.info(
-            f"Performance: {operation} took {duration:.3f}s",
+        self._log_with_context(
+            logging.INFO,
+            "Performance: %s took %.3fs", operation, duration,
             operation=operation,
             duration=duration,
             **kwargs
@@ -178,18 +314,23 @@ class AppLogger:
     
     def log_security_event(self, event_type: str, details: str, **kwargs):
         """Log security-related events."""
-        self.warning(
-            f"Security Event: {event_type} - {details}",
+        self._log_with_context(
+            logging.WARNING,
+            "Security Event: %s - %s", event_type, details,
             event_type=event_type,
             details=details,
             **kwargs
         )
     
     def log_api_call(self, service: str, endpoint: str, success: bool, **kwargs):
-        """Log external API calls."""
-        status = "SUCCESS" if success else "FAILED"
-        self.info(
-            f"API Call: {service} {endpoint} - {status}",
+        """Log external API calls (sampled by "api_call" unless they failed)."""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        if success and not self._sampled("api_call", kwargs):
+            return
+        self._log_with_context(
+            logging.INFO,
+            "API Call: %s %s - %s", service, endpoint, "SUCCESS" if success else "FAILED",
             service=service,
             endpoint=endpoint,
             success=success,
@@ -198,8 +339,9 @@ class AppLogger:
     
     def log_calorie_calculation(self, food_item: str, calories: float, **kwargs):
         """Log calorie calculation events."""
-        self.info(
-            f"Calorie calculation: {food_item} = {calories} calories",
+        self._log_with_context(
+            logging.INFO,
+            "Calorie calculation: %s = %s calories", food_item, calories,
             food_item=food_item,
             calories=calories,
             **kwargs
@@ -213,84 +355,159 @@ class AppLogger:
         """Set the logging level."""
         self.log_level = getattr(logging, level.upper(), logging.INFO)
         self.logger.setLevel(self.log_level)
-        for handler in self.logger.handlers:
+        for handler in self.logger.handlers + self.handlers:
             handler.setLevel(self.log_level)
 
 
-def log_function_call(logger: AppLogger):
+def log_function_call(logger: Optional[AppLogger] = None, sample_rate: float = 1.0, histogram: Optional[str] = None):
     """
-    Decorator to log function calls with timing and parameters.
+    Decorator to log function calls with timing and parameters. Works on both
+    regular and coroutine functions.
+
+    Every call is timed with `perf_counter_ns` and recorded in the latency
+    histogram `histogram` (default: the function's module and qualified name,
+    see `app.utils.metrics.latency_snapshot`). Entry/exit debug records, and
+    the `str()` of the arguments, are only produced when DEBUG is enabled,
+    for a `sample_rate` fraction of calls. Exceptions are always logged.
     
     Usage:
         @log_function_call(logger)
         def my_function(param1, param2):
             return result
+
+        @log_function_call(sample_rate=0.01)
+        async def hot_path(query):
+            ...
     """
     def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            start_time = datetime.now()
-            
-            # Log function entry
-            logger.debug(
-                f"Entering function {func.__name__}",
-                function=func.__name__,
+        name = func.__name__
+        latency = get_histogram(histogram or f"{func.__module__}.{func.__qualname__}")
+
+        def enter(log: AppLogger, args, kwargs) -> bool:
+            if not log.is_enabled_for(logging.DEBUG):
+                return False
+            if sample_rate < 1.0 and random.random() >= sample_rate:
+                return False
+            log.debug(
+                "Entering function %s", name,
+                function=name,
                 args=str(args),
                 kwargs=str(kwargs)
             )
-            
-            try:
-                result = func(*args, **kwargs)
-                duration = (datetime.now() - start_time).total_seconds()
-                
-                # Log successful completion
-                logger.debug(
-                    f"Function {func.__name__} completed successfully",
-                    function=func.__name__,
+            return True
+
+        def completed(log: AppLogger, traced: bool, start_ns: int, result):
+            duration = (time.perf_counter_ns() - start_ns) / 1e9
+            latency.observe(duration)
+            if traced:
+                log.debug(
+                    "Function %s completed successfully", name,
+                    function=name,
                     duration=duration,
                     result_type=type(result).__name__
                 )
-                
+
+        def failed(log: AppLogger, start_ns: int, exc: Exception, args, kwargs):
+            duration = (time.perf_counter_ns() - start_ns) / 1e9
+            latency.observe(duration)
+            log.log_exception(
+                exc,
+                f"Function {name}",
+                function=name,
+                duration=duration,
+                args=str(args),
+                kwargs=str(kwargs)
+            )
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                log = logger or default_logger
+                traced = enter(log, args, kwargs)
+                start_ns = time.perf_counter_ns()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    failed(log, start_ns, e, args, kwargs)
+                    raise
+                completed(log, traced, start_ns, result)
                 return result
-                
+
+            async_wrapper.histogram = latency
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            log = logger or default_logger
+            traced = enter(log, args, kwargs)
+            start_ns = time.perf_counter_ns()
+            try:
+                result = func(*args, **kwargs)
             except Exception as e:
-                duration = (datetime.now() - start_time).total_seconds()
-                
-                # Log exception
-                logger.log_exception(
-                    e,
-                    f"Function {func.__name__}",
-                    function=func.__name__,
-                    duration=duration,
-                    args=str(args),
-                    kwargs=str(kwargs)
-                )
+                failed(log, start_ns, e, args, kwargs)
                 raise
-        
+            completed(log, traced, start_ns, result)
+            return result
+
+        wrapper.histogram = latency
         return wrapper
     return decorator
 
 
+# Writer threads by logger name, so re-creating a logger replaces its writer
+_listeners: Dict[str, QueueListener] = {}
+
+
+def _stop_listener(name: str):
+    listener = _listeners.pop(name, None)
+    if listener is not None:
+        listener.stop()
+
+
+@atexit.register
+def _stop_all_listeners():
+    for name in list(_listeners):
+        _stop_listener(name)
+
+
+def _default_logger() -> AppLogger:
+    from app.config.settings import settings
+    return AppLogger(
+        log_level=settings.LOG_LEVEL,
+        log_file=settings.LOG_FILE or None,
+        enable_console=settings.LOG_ENABLE_CONSOLE,
+        enable_file=settings.LOG_ENABLE_FILE,
+        json_format=settings.LOG_FORMAT == "json",
+        use_queue=settings.LOG_ASYNC,
+        queue_size=settings.LOG_QUEUE_SIZE,
+        sample_rates={
+            "request": settings.LOG_SAMPLE_REQUEST,
+            "api_call": settings.LOG_SAMPLE_API_CALL,
+            "database": settings.LOG_SAMPLE_DATABASE,
+        },
+    )
+
+
 # Default logger instance
-default_logger = AppLogger()
+default_logger = _default_logger()
 
 # Convenience functions using default logger
-def debug(message: str, **kwargs):
+def debug(message: str, *args, **kwargs):
     """Log debug message using default logger."""
-    default_logger.debug(message, **kwargs)
+    default_logger.debug(message, *args, **kwargs)
 
-def info(message: str, **kwargs):
+def info(message: str, *args, **kwargs):
     """Log info message using default logger."""
-    default_logger.info(message, **kwargs)
+    default_logger.info(message, *args, **kwargs)
 
-def warning(message: str, **kwargs):
+def warning(message: str, *args, **kwargs):
     """Log warning message using default logger."""
-    default_logger.warning(message, **kwargs)
+    default_logger.warning(message, *args, **kwargs)
 
-def error(message: str, **kwargs):
+def error(message: str, *args, **kwargs):
     """Log error message using default logger."""
-    default_logger.error(message, **kwargs)
+    default_logger.error(message, *args, **kwargs)
 
-def critical(message: str, **kwargs):
+def critical(message: str, *args, **kwargs):
     """Log critical message using default logger."""
-    default_logger.critical(message, **kwargs) 
\ No newline at end of file
+    default_logger.critical(message, *args, **kwargs) 
\ No newline at end of file
@@ -0,0 +1,285 @@
+import abc
+import math
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+# Upper bounds in seconds, roughly x2.5 apart from 100us to 30s
+DEFAULT_LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram. Recording is a bisect and two additions,
+    so it is cheap enough for hot paths; percentiles are estimated from the
+    buckets (linear interpolation inside the matching bucket).
+    """
+
+    def __init__(self, name: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.buckets = tuple(buckets)
+        # One extra slot for observations above the last bound
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Estimated q-th percentile (0-100) in seconds, or None if empty."""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / bucket_count)
+            seen += bucket_count
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum_seconds": self.sum,
+            "mean_seconds": self.sum / self.count if self.count else None,
+            "max_seconds": self.max,
+            "p50_seconds": self.percentile(50),
+            "p95_seconds": self.percentile(95),
+            "p99_seconds": self.percentile(99),
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], self.counts)),
+        }
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.sum = 0.0
+            self.max = 0.0
+
+
+class _CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class MetricFamily(abc.ABC):
+    """A named metric with fixed label names; `labels()` returns the child for one label set."""
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child(values))
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self, values):
+        ...
+
+    @abc.abstractmethod
+    def samples(self) -> list:
+        ...
+
+
+class Counter(MetricFamily):
+    kind = "counter"
+
+    def _new_child(self, values):
+        return _CounterValue()
+
+    def inc(self, *values, amount: float = 1.0):
+        self.labels(*values).inc(amount)
+
+    def samples(self) -> list:
+        return [[list(values), child.value] for values, child in list(self._children.items())]
+
+
+class Histogram(MetricFamily):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self, values):
+        return LatencyHistogram(self.name, self.buckets)
+
+    def observe(self, seconds: float, *values):
+        self.labels(*values).observe(seconds)
+
+    def samples(self) -> list:
+        return [
+            [list(values), {"buckets": list(child.buckets), "counts": list(child.counts), "sum": child.sum, "count": child.count}]
+            for values, child in list(self._children.items())
+        ]
+
+
+class MetricsRegistry:
+    """
+    Process-wide metric families plus collectors, which are called only at
+    scrape time to report values other components already keep (pool
+    usage, cache counters, queue depths). Recording on the hot path is a
+    dict lookup and an addition.
+    """
+
+    def __init__(self):
+        self._families: Dict[str, MetricFamily] = {}
+        self._collectors: List[Callable[[], Iterable[tuple]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, family: MetricFamily) -> MetricFamily:
+        with self._lock:
+            return self._families.setdefault(family.name, family)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[tuple]]):
+        """
+        `collector()` yields `(name, kind, documentation, labelnames, samples)`
+        tuples, where kind is "counter" or "gauge" and samples is a list of
+        `(label_values, value)`.
+        """
+        self._collectors.append(collector)
+
+    def collect(self) -> dict:
+        """JSON-serializable snapshot of every metric, as used by `render_prometheus` and `merge_snapshots`."""
+        snapshot = {}
+        for name, family in list(self._families.items()):
+            snapshot[name] = {"type": family.kind, "help": family.documentation, "labelnames": list(family.labelnames), "samples": family.samples()}
+        for collector in self._collectors:
+            try:
+                for name, kind, documentation, labelnames, samples in collector():
+                    snapshot[name] = {
+                        "type": kind,
+                        "help": documentation,
+                        "labelnames": list(labelnames),
+                        "samples": [[list(values), float(value)] for values, value in samples],
+                    }
+            except Exception:
+                # A broken collector must not take the whole endpoint down
+                continue
+        return snapshot
+
+
+REGISTRY = MetricsRegistry()
+
+# Durations recorded by `log_function_call`, one label per wrapped function
+FUNCTION_LATENCY = REGISTRY.histogram(
+    "function_duration_seconds",
+    "Duration of instrumented functions (service calls, fuzzy matching, DB managers)",
+    ("function",),
+)
+
+
+def get_histogram(name: str) -> LatencyHistogram:
+    """Return the process-wide histogram called `name`, creating it on first use."""
+    return FUNCTION_LATENCY.labels(name)
+
+
+def latency_snapshot(prefix: str = "") -> Dict[str, dict]:
+    """Snapshots of every histogram whose name starts with `prefix`."""
+    children = sorted(FUNCTION_LATENCY._children.items())
+    return {values[0]: histogram.snapshot() for values, histogram in children if values[0].startswith(prefix)}
+
+
+def reset_histograms():
+    for histogram in list(FUNCTION_LATENCY._children.values()):
+        histogram.reset()
+
+
+def merge_snapshots(snapshots: Iterable[dict]) -> dict:
+    """Sum snapshots from several processes: counters, gauges and histogram buckets add up."""
+    merged: dict = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for values, value in metric["samples"]:
+                key = tuple(values)
+                if metric["type"] == "histogram":
+                    current = target["samples"].get(key)
+                    if current is None or current["buckets"] != value["buckets"]:
+                        target["samples"][key] = {**value, "counts": list(value["counts"])}
+                    else:
+                        current["counts"] = [a + b for a, b in zip(current["counts"], value["counts"])]
+                        current["sum"] += value["sum"]
+                        current["count"] += value["count"]
+                else:
+                    target["samples"][key] = target["samples"].get(key, 0.0) + value
+    for metric in merged.values():
+        metric["samples"] = [[list(key), value] for key, value in metric["samples"].items()]
+    return merged
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(labelnames, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    return repr(value) if math.isfinite(value) else ("+Inf" if value > 0 else "-Inf" if value < 0 else "NaN")
+
+
+_INF_BUCKET = 'le="+Inf"'
+
+
+def render_prometheus(snapshot: dict) -> str:
+    """Render a snapshot in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labelnames"]
+        for values, value in sorted(metric["samples"], key=lambda sample: sample[0]):
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_label_text(labelnames, values)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(value["buckets"], value["counts"]):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{name}_bucket{_label_text(labelnames, values, le)} {cumulative}")
+            lines.append(f"{name}_bucket{_label_text(labelnames, values, _INF_BUCKET)} {value['count']}")
+            lines.append(f"{name}_sum{_label_text(labelnames, values)} {_number(value['sum'])}")
+            lines.append(f"{name}_count{_label_text(labelnames, values)} {value['count']}")
+    return "\n".join(lines) + "\n"
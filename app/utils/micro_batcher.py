@@ -0,0 +1,78 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class MicroBatcher:
+    """
+    Collects keys requested concurrently within a short window and loads
+    them with one `fetch_many(keys)` call per batch of up to `max_batch`.
+
+    The first key of a batch starts a `window`-second timer; the batch is
+    sent when the timer fires or as soon as it is full. `fetch_many` returns
+    a dict of key -> value, and keys missing from it resolve to None. An
+    error fails every key of that batch. A key that is already pending
+    shares the pending future, and waiters are shielded from each other's
+    cancellation, like `SingleFlight`.
+    """
+
+    def __init__(self, fetch_many: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]], max_batch: int = 20, window: float = 0.01):
+        self.fetch_many = fetch_many
+        self.max_batch = max_batch
+        self.window = window
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight = set()
+        self.batches = 0
+        self.keys = 0
+        self.coalesced = 0
+
+    async def load(self, key: Hashable) -> Any:
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = future
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: List[Hashable]) -> Dict[Hashable, Any]:
+        values = await asyncio.gather(*(self.load(key) for key in keys))
+        return dict(zip(keys, values))
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "keys": self.keys, "coalesced": self.coalesced, "pending": len(self._pending)}
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            self.batches += 1
+            self.keys += len(batch)
+            task = asyncio.ensure_future(self._run(batch))
+            # Keep a reference until the batch is done
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, batch: Dict[Hashable, asyncio.Future]):
+        try:
+            values = await self.fetch_many(list(batch))
+        except asyncio.CancelledError:
+            for future in batch.values():
+                future.cancel()
+            raise
+        except Exception as exc:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(exc)
+                    # Retrieved here in case every waiter went away
+                    future.exception()
+            return
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(values.get(key))
@@ -0,0 +1,109 @@
+from functools import lru_cache
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+from app.utils.fuzzy_matcher import fuzzy_compare
+
+
+class CanonicalNutrient(NamedTuple):
+    key: str
+    name: str
+    unit: str
+    # FDC nutrient numbers and ids, in order of preference
+    numbers: Tuple[str, ...]
+    ids: Tuple[int, ...]
+
+
+# Nutrients the API can report, keyed by the field name used in responses.
+NUTRIENTS: Dict[str, CanonicalNutrient] = {nutrient.key: nutrient for nutrient in (
+    # Foundation foods often only carry the Atwater energy values
+    CanonicalNutrient("calories", "Energy", "KCAL", ("208", "958", "957"), (1008, 2048, 2047)),
+    CanonicalNutrient("protein_g", "Protein", "G", ("203",), (1003,)),
+    CanonicalNutrient("fat_g", "Total lipid (fat)", "G", ("204",), (1004,)),
+    CanonicalNutrient("carbohydrates_g", "Carbohydrate, by difference", "G", ("205", "205.2"), (1005, 1050)),
+    CanonicalNutrient("fiber_g", "Fiber, total dietary", "G", ("291",), (1079,)),
+    CanonicalNutrient("sugars_g", "Total Sugars", "G", ("269",), (2000,)),
+    CanonicalNutrient("saturated_fat_g", "Fatty acids, total saturated", "G", ("606",), (1258,)),
+    CanonicalNutrient("cholesterol_mg", "Cholesterol", "MG", ("601",), (1253,)),
+    CanonicalNutrient("sodium_mg", "Sodium, Na", "MG", ("307",), (1093,)),
+    CanonicalNutrient("potassium_mg", "Potassium, K", "MG", ("306",), (1092,)),
+    CanonicalNutrient("calcium_mg", "Calcium, Ca", "MG", ("301",), (1087,)),
+    CanonicalNutrient("iron_mg", "Iron, Fe", "MG", ("303",), (1089,)),
+    CanonicalNutrient("vitamin_a_ug", "Vitamin A, RAE", "UG", ("320",), (1106,)),
+    CanonicalNutrient("vitamin_c_mg", "Vitamin C, total ascorbic acid", "MG", ("401",), (1162,)),
+    CanonicalNutrient("vitamin_d_ug", "Vitamin D (D2 + D3)", "UG", ("328",), (1114,)),
+)}
+
+MACRO_KEYS = ("calories", "carbohydrates_g", "fat_g", "protein_g")
+
+# (key, preference rank) lookups; lower rank wins when a food lists several
+_BY_ID = {nutrient_id: (nutrient.key, rank) for nutrient in NUTRIENTS.values() for rank, nutrient_id in enumerate(nutrient.ids)}
+_BY_NUMBER = {number: (nutrient.key, rank) for nutrient in NUTRIENTS.values() for rank, number in enumerate(nutrient.numbers)}
+# Name matches rank after every id/number match
+_NAME_RANK = 100
+
+
+@lru_cache(maxsize=4096)
+def resolve_nutrient_name(name: str, unit: str) -> Optional[str]:
+    """
+    Map a free-text nutrient name to a canonical key with fuzzy matching.
+    Memoized, so each distinct name/unit pair is only compared once.
+    """
+    for nutrient in NUTRIENTS.values():
+        if unit and unit.upper() != nutrient.unit:
+            continue
+        if fuzzy_compare(name, nutrient.name)['is_fuzzy_match']:
+            return nutrient.key
+    return None
+
+
+def resolve_nutrient(food_nutrient: dict) -> Optional[Tuple[str, int]]:
+    """
+    Return `(key, rank)` for one `foodNutrients` entry, or None if it is not
+    a known nutrient. Accepts both the search shape (`nutrientId`, ...) and
+    the food details shape (`nutrient: {id, number, ...}`).
+    """
+    nutrient = food_nutrient.get('nutrient')
+    if nutrient:
+        nutrient_id, number = nutrient.get('id'), nutrient.get('number')
+        name, unit = nutrient.get('name'), nutrient.get('unitName')
+    else:
+        nutrient_id, number = food_nutrient.get('nutrientId'), food_nutrient.get('nutrientNumber')
+        name, unit = food_nutrient.get('nutrientName'), food_nutrient.get('unitName')
+
+    resolved = _BY_ID.get(nutrient_id) or _BY_NUMBER.get(number)
+    if resolved:
+        return resolved
+    if name:
+        key = resolve_nutrient_name(name, unit or '')
+        if key:
+            return key, _NAME_RANK
+    return None
+
+
+def extract_nutrients(food_nutrients: Iterable[dict], keys: Iterable[str] = MACRO_KEYS) -> Dict[str, dict]:
+    """
+    Pull the requested nutrients out of a food's `foodNutrients` in a single
+    pass. Returns `{key: {"value": ..., "unit": ...}}` for every requested key,
+    with None values for nutrients the food does not list.
+    """
+    wanted = set(keys)
+    best: Dict[str, Tuple[int, dict]] = {}
+    for food_nutrient in food_nutrients:
+        resolved = resolve_nutrient(food_nutrient)
+        if not resolved:
+            continue
+        key, rank = resolved
+        if key in wanted and (key not in best or rank < best[key][0]):
+            best[key] = (rank, food_nutrient)
+
+    extracted = {}
+    for key in keys:
+        if key not in best:
+            extracted[key] = {"value": None, "unit": None}
+            continue
+        food_nutrient = best[key][1]
+        if 'nutrient' in food_nutrient:
+            value, unit = food_nutrient.get('amount'), (food_nutrient['nutrient'] or {}).get('unitName')
+        else:
+            value, unit = food_nutrient.get('value'), food_nutrient.get('unitName')
+        extracted[key] = {"value": value, "unit": unit}
+    return extracted
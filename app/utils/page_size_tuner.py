@@ -0,0 +1,56 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+
+class PageSizeTuner:
+    """
+    Learns how many search results each query needs before a confident
+    match turns up, and picks the first page size from that.
+
+    Every finished search reports its depth: the position of the confident
+    match, or everything that was fetched when none was found. Depths are
+    kept as an exponentially weighted average per query (bounded LRU) and
+    over all queries; the first page for a query is the smallest allowed
+    size covering its average, or the global one for unseen queries.
+    """
+
+    def __init__(self, page_sizes: Sequence[int], max_queries: int = 10000, alpha: float = 0.3):
+        self.page_sizes = tuple(sorted(page_sizes))
+        self.max_queries = max_queries
+        self.alpha = alpha
+        self._depths: "OrderedDict[str, float]" = OrderedDict()
+        self._global_depth: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _average(self, previous: Optional[float], depth: float) -> float:
+        return depth if previous is None else previous + self.alpha * (depth - previous)
+
+    def expected_depth(self, query: str) -> Optional[float]:
+        depth = self._depths.get(query)
+        return self._global_depth if depth is None else depth
+
+    def initial_page_size(self, query: str) -> int:
+        depth = self.expected_depth(query)
+        if depth is None:
+            return self.page_sizes[0]
+        for page_size in self.page_sizes:
+            if page_size >= depth:
+                return page_size
+        return self.page_sizes[-1]
+
+    def record(self, query: str, depth: int):
+        with self._lock:
+            self._depths[query] = self._average(self._depths.get(query), depth)
+            self._depths.move_to_end(query)
+            while len(self._depths) > self.max_queries:
+                self._depths.popitem(last=False)
+            self._global_depth = self._average(self._global_depth, depth)
+
+    def stats(self) -> dict:
+        return {"queries": len(self._depths), "global_depth": self._global_depth}
+
+    def clear(self):
+        with self._lock:
+            self._depths.clear()
+            self._global_depth = None
@@ -0,0 +1,149 @@
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+# FDC nutrient amounts are per 100 g (per 100 ml for some Branded foods)
+BASIS_GRAMS = 100.0
+# Mass units, and volume units weighed as water when a food gives no better measure
+GRAMS_PER_UNIT: Dict[str, float] = {
+    "g": 1.0, "gram": 1.0, "grams": 1.0, "grm": 1.0,
+    "mg": 0.001, "kg": 1000.0,
+    "oz": 28.349523125, "ounce": 28.349523125, "ounces": 28.349523125, "onz": 28.349523125,
+    "lb": 453.59237, "lbs": 453.59237, "pound": 453.59237, "pounds": 453.59237,
+    "ml": 1.0, "mlt": 1.0, "l": 1000.0,
+}
+SERVING_UNITS = ("serving", "servings")
+
+_AMOUNT_PREFIX = re.compile(r"^\s*(\d+/\d+|\d+(?:\.\d+)?)\s*")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class UnknownUnitError(ValueError):
+    pass
+
+
+class PortionTable(NamedTuple):
+    """Grams in one serving, and in one of each household measure (by normalized name)."""
+    serving_grams: float
+    measures: Tuple[Tuple[str, float], ...]
+    # Built from food details (`foodPortions`), which list more measures than search results
+    detailed: bool = False
+
+
+def normalize_unit(unit: str) -> str:
+    return _WHITESPACE.sub(" ", unit.strip().lower().rstrip("."))
+
+
+def _has_letters(text: Optional[str]) -> bool:
+    return bool(text) and any(char.isalpha() for char in text)
+
+
+def _singular(unit: str) -> str:
+    return unit[:-1] if unit.endswith("s") and not unit.endswith("ss") else unit
+
+
+def _parse_amount(text: str) -> Tuple[float, str]:
+    """Split a leading amount off a measure text: "2 tbsp" -> (2.0, "tbsp")."""
+    match = _AMOUNT_PREFIX.match(text)
+    if not match:
+        return 1.0, text
+    amount = match.group(1)
+    if "/" in amount:
+        numerator, denominator = amount.split("/")
+        value = float(numerator) / float(denominator) if float(denominator) else 1.0
+    else:
+        value = float(amount)
+    return value or 1.0, text[match.end():]
+
+
+def _portion_measures(food: dict) -> Iterable[Tuple[int, str, float]]:
+    """`(rank, name, grams per unit)` from details `foodPortions` or search `foodMeasures`."""
+    for index, portion in enumerate(food.get("foodPortions") or ()):
+        grams = portion.get("gramWeight")
+        if not grams:
+            continue
+        unit_name = ((portion.get("measureUnit") or {}).get("name") or "").strip()
+        # Survey (FNDDS) modifiers are numeric codes, not words
+        modifier = portion.get("modifier") if _has_letters(portion.get("modifier")) else None
+        if unit_name and unit_name.lower() != "undetermined":
+            name = f"{unit_name}, {modifier}" if modifier else unit_name
+            amount = portion.get("amount") or 1.0
+        else:
+            description = portion.get("portionDescription")
+            parsed, name = _parse_amount(description if _has_letters(description) else modifier or "")
+            amount = portion.get("amount") or parsed
+        yield portion.get("sequenceNumber") or index + 1, name, grams / amount
+    for index, measure in enumerate(food.get("foodMeasures") or ()):
+        grams = measure.get("gramWeight")
+        text = measure.get("disseminationText") or measure.get("modifier") or ""
+        if not grams or not text:
+            continue
+        amount, name = _parse_amount(text)
+        yield measure.get("rank") or index + 1, name, grams / amount
+
+
+def build_portion_table(food: dict) -> PortionTable:
+    """
+    Read a food's serving and household measures from either FDC shape.
+    A serving is the label serving for Branded foods, else the first
+    listed portion, else 100 g (the basis of the nutrient amounts).
+    """
+    measures: List[Tuple[str, float]] = []
+    seen = set()
+
+    def add(name: str, grams: float):
+        name = normalize_unit(name)
+        if name and name not in seen and name not in SERVING_UNITS and name != "quantity not specified" and grams > 0:
+            seen.add(name)
+            measures.append((name, float(grams)))
+
+    serving_grams = None
+    serving_unit = normalize_unit(food.get("servingSizeUnit") or "")
+    if food.get("servingSize") and serving_unit in GRAMS_PER_UNIT:
+        serving_grams = float(food["servingSize"]) * GRAMS_PER_UNIT[serving_unit]
+        household = food.get("householdServingFullText")
+        if household:
+            amount, name = _parse_amount(household)
+            add(name, serving_grams / amount)
+
+    for _, name, grams in sorted(_portion_measures(food), key=lambda measure: measure[0]):
+        if serving_grams is None:
+            serving_grams = grams
+        add(name, grams)
+
+    return PortionTable(serving_grams or BASIS_GRAMS, tuple(measures), "foodPortions" in food)
+
+
+def grams_for(table: Optional[PortionTable], quantity: float, unit: Optional[str] = None) -> float:
+    """
+    Grams in `quantity` of `unit`: servings (the default), a mass unit, or
+    one of the food's household measures ("cup" also matches "cup, chopped").
+    Without a table a serving is 100 g. Raises UnknownUnitError otherwise.
+    """
+    unit = normalize_unit(unit or "serving")
+    if unit in SERVING_UNITS:
+        return quantity * (table.serving_grams if table else BASIS_GRAMS)
+    measures = table.measures if table else ()
+    for name, grams in measures:
+        if name == unit:
+            return quantity * grams
+    if unit in GRAMS_PER_UNIT:
+        return quantity * GRAMS_PER_UNIT[unit]
+    # "cups" also matches "cup, chopped" and "slice" matches "slices (1 oz)"
+    wanted = _singular(unit)
+    for name, grams in measures:
+        if _singular(name.split(",")[0].split(" (")[0]) == wanted:
+            return quantity * grams
+    available = ", ".join(repr(name) for name in ("serving", "g", "oz") + tuple(name for name, _ in measures))
+    raise UnknownUnitError(f"Unknown unit {unit!r}; use one of: {available}.")
+
+
+def scale_rows(rows: Sequence[Sequence[Optional[float]]], grams: Sequence[float]) -> List[List[Optional[float]]]:
+    """
+    Scale per-100 g nutrient rows (one per food, same columns) to the given
+    grams in a single pass over the matrix; missing values stay None.
+    """
+    factors = [weight / BASIS_GRAMS for weight in grams]
+    return [
+        [None if value is None else round(value * factor, 2) for value in row]
+        for row, factor in zip(rows, factors)
+    ]
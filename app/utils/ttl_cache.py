@@ -0,0 +1,106 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+FRESH = "fresh"
+STALE = "stale"
+
+
+class TTLCache:
+    """
+    In-process LRU cache with per-entry TTL and size-based eviction.
+
+    Entries stay "fresh" for their TTL and are then served as "stale" for
+    `stale_ttl` more seconds so callers can revalidate in the background.
+    Eviction happens in LRU order once either `max_entries` or `max_size`
+    (the sum of the sizes given to `set`) is exceeded.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300, stale_ttl: float = 0, max_size: Optional[int] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self.current_size = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (value, fresh_until, stale_until, size)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, float, int]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, record=False)[1] is not None
+
+    def get(self, key: Hashable, record: bool = True) -> Tuple[Any, Optional[str]]:
+        """
+        Return `(value, state)` where state is FRESH, STALE or None on a miss.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            if record:
+                self.misses += 1
+            return None, None
+        value, fresh_until, stale_until, _ = entry
+        now = time.monotonic()
+        if now >= stale_until:
+            self._remove(key)
+            if record:
+                self.misses += 1
+            return None, None
+        self._entries.move_to_end(key)
+        if now < fresh_until:
+            if record:
+                self.hits += 1
+            return value, FRESH
+        if record:
+            self.stale_hits += 1
+        return value, STALE
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, stale_ttl: Optional[float] = None, size: int = 1):
+        if key in self._entries:
+            self._remove(key)
+        ttl = self.ttl if ttl is None else ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        if ttl <= 0 and stale_ttl <= 0:
+            return
+        if self.max_size is not None and size > self.max_size:
+            return
+        now = time.monotonic()
+        self._entries[key] = (value, now + ttl, now + ttl + stale_ttl, size)
+        self.current_size += size
+        self._evict()
+
+    def delete(self, key: Hashable):
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self.current_size = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "size": self.current_size,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self.current_size -= entry[3]
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_size is not None and self.current_size > self.max_size)
+        ):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
@@ -0,0 +1,125 @@
+"""
+Throughput of the database-bound auth routes (register, login) with the
+previous engine setup against the tuned one.
+
+Usage:
+    python -m benchmarks.bench_auth_db [--users 200] [--logins 4] [--concurrency 20] [--output results.json]
+
+Both runs use a fresh SQLite file and the real auth controllers behind
+DBSessionMiddleware. "previous" is `create_async_engine(url, echo=True)`
+with SQLite defaults (rollback journal, synchronous=FULL); "tuned" is
+`app.db.database.create_engine` with the configured pool and PRAGMA
+profile. Echo output goes to /dev/null, so its cost is the logging itself,
+not the terminal. bcrypt runs at cost 4 to keep the focus on the database.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api.v1.controllers.auth import routes as auth_routes
+from app.config.settings import settings
+from app.db.database import create_engine
+from app.db.models_base import Base
+from app.middleware.security import DBSessionMiddleware
+import app.models.user  # noqa: F401  (registers the users table)
+
+
+def build_app(engine) -> FastAPI:
+    bench_app = FastAPI()
+    for router in auth_routes:
+        bench_app.include_router(router, prefix="/api/v1")
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    bench_app.add_middleware(DBSessionMiddleware, session_factory=session_factory)
+    return bench_app
+
+
+async def run_calls(client: httpx.AsyncClient, calls, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def timed(call):
+        async with semaphore:
+            started = time.perf_counter_ns()
+            response = await call()
+            timings.append((time.perf_counter_ns() - started) / 1e6)
+            assert response.status_code == 200, response.text
+
+    await asyncio.gather(*(timed(call) for call in calls))
+    return timings
+
+
+def summarize(timings: list, elapsed: float) -> dict:
+    timings.sort()
+    return {
+        "requests": len(timings),
+        "requests_per_second": round(len(timings) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(timings), 2),
+        "p50_ms": round(timings[len(timings) // 2], 2),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 2),
+    }
+
+
+async def measure(engine, users: int, logins: int, concurrency: int) -> dict:
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    transport = httpx.ASGITransport(app=build_app(engine))
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        def register(i):
+            body = {"name": f"User {i}", "email": f"user{i}@example.com", "phone_number": f"555{i:07d}", "password": "bench-password"}
+            return lambda: client.post("/api/v1/auth/register/", json=body)
+
+        def login(i):
+            body = {"email": f"user{i}@example.com", "password": "bench-password"}
+            return lambda: client.post("/api/v1/auth/login/", json=body)
+
+        started = time.perf_counter()
+        timings = await run_calls(client, [register(i) for i in range(users)], concurrency)
+        results["register"] = summarize(timings, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        timings = await run_calls(client, [login(i) for _ in range(logins) for i in range(users)], concurrency)
+        results["login"] = summarize(timings, time.perf_counter() - started)
+    await engine.dispose()
+    return results
+
+
+async def main(users: int, logins: int, concurrency: int, output: str = None):
+    settings.BCRYPT_ROUNDS = 4
+    results = {}
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+        # echo=True attaches a stdout handler when the engine is created
+        with contextlib.redirect_stdout(devnull):
+            previous = create_async_engine(f"sqlite+aiosqlite:///{directory}/previous.sqlite3", echo=True, future=True)
+        results["previous"] = await measure(previous, users, logins, concurrency)
+        tuned = create_engine(f"sqlite+aiosqlite:///{directory}/tuned.sqlite3")
+        results["tuned"] = await measure(tuned, users, logins, concurrency)
+
+    for name in ("previous", "tuned"):
+        for route, stats in results[name].items():
+            print(f"{name:>8} {route:>8}: {stats['requests_per_second']:>8} req/s  "
+                  f"mean {stats['mean_ms']:>7} ms  p50 {stats['p50_ms']:>7} ms  p95 {stats['p95_ms']:>7} ms")
+    if output:
+        with open(output, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--logins", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.logins, args.concurrency, args.output))
@@ -0,0 +1,305 @@
+"""
+End-to-end load test: the app under uvicorn, its USDA calls answered by
+the local stand-in server (benchmarks/fake_usda.py), driven with a mix of
+search, food details, login, register and refresh traffic at one or more
+concurrency levels.
+
+Usage:
+    python -m benchmarks.bench_load [--mix mixed] [--concurrency 10,50] [--requests 2000] [--workers 1]
+        [--usda-latency-ms 80] [--usda-jitter-ms 20] [--usda-failure-rate 0.0] [--output results.json]
+
+`--mix` is one of the presets below or weights such as
+`search=0.8,details=0.1,login=0.1`; `details` fetches one food by fdcId,
+among copies of the recorded foods. Each concurrency level runs
+`--requests` requests from that many concurrent clients (closed loop,
+after `--warmup` unmeasured requests) and reports throughput,
+p50/p95/p99 latency and status codes per operation, plus the calls the
+fake USDA server received. `--users` accounts are registered before
+measuring; login and refresh pick among them.
+
+The app runs against a fresh SQLite file, with the rate limit lifted
+(`--rate-limit` to keep one) and console/file logging off. Settings not
+set here come from the environment as usual, e.g. `SEARCH_CACHE_ENABLED=false`
+to send every search upstream or `BCRYPT_ROUNDS=4` to take bcrypt out of
+the auth numbers. Without a reachable Redis, refresh answers 500 (it
+checks the token blacklist) and caches and rate limits stay in-process.
+
+Server output is hidden unless `--verbose`. `--target URL` skips starting
+anything and loads an app you started yourself, e.g. with
+`USDA_API_BASE_URL=http://127.0.0.1:8765/fdc/v1/` and
+`python -m benchmarks.fake_usda` running.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+MIXES = {
+    "search": {"search": 1.0},
+    "details": {"details": 1.0},
+    "auth": {"login": 0.6, "refresh": 0.3, "register": 0.1},
+    "mixed": {"search": 0.7, "refresh": 0.15, "login": 0.1, "register": 0.05},
+}
+OPERATIONS = ("search", "details", "login", "refresh", "register")
+PASSWORD = "bench-password"
+# Distinct copies of every recorded food that `details` picks among
+DETAIL_COPIES = 10
+
+
+def parse_mix(value: str) -> dict:
+    if value in MIXES:
+        return MIXES[value]
+    mix = {}
+    for part in value.split(","):
+        operation, _, weight = part.partition("=")
+        if operation not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {operation!r}")
+        mix[operation] = float(weight or 1)
+    return mix
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(timings: list, statuses: dict, elapsed: float) -> dict:
+    timings = sorted(timings)
+    return {
+        "requests": len(timings),
+        "errors": sum(count for status, count in statuses.items() if not status.startswith("2")),
+        "statuses": dict(sorted(statuses.items())),
+        "requests_per_second": round(len(timings) / elapsed, 1) if elapsed else None,
+        "mean_ms": round(sum(timings) / len(timings), 2) if timings else None,
+        **{f"p{q}_ms": round(percentile(timings, q), 2) if timings else None for q in (50, 95, 99)},
+    }
+
+
+async def wait_for(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{url} did not come up within {timeout}s")
+                await asyncio.sleep(0.1)
+
+
+def create_database(path: str):
+    from app.db.database import create_engine
+    from app.db.models_base import Base
+    import app.models.calorie  # noqa: F401
+    import app.models.fdc_food  # noqa: F401
+    import app.models.user  # noqa: F401
+
+    async def create():
+        engine = create_engine(f"sqlite+aiosqlite:///{path}", echo=False)
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        await engine.dispose()
+
+    asyncio.run(create())
+
+
+def start_servers(args, directory: str) -> tuple:
+    """Start the fake USDA server and the app; returns (app_url, usda_url, processes)."""
+    usda_port, app_port = free_port(), free_port()
+    output = None if args.verbose else subprocess.DEVNULL
+    database = os.path.join(directory, "load.sqlite3")
+    create_database(database)
+
+    usda = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_usda", "--port", str(usda_port),
+        "--latency-ms", str(args.usda_latency_ms), "--jitter-ms", str(args.usda_jitter_ms),
+        "--failure-rate", str(args.usda_failure_rate), "--seed", "1",
+    ], stdout=output, stderr=output)
+    env = {
+        **os.environ,
+        "USDA_API_BASE_URL": f"http://127.0.0.1:{usda_port}/fdc/v1/",
+        "USDA_API_KEY": os.environ.get("USDA_API_KEY", "bench"),
+        "DB_BACKEND": "sqlite",
+        "SQLITE_DB_PATH": database,
+        "RATE_LIMIT": str(args.rate_limit or 10 ** 9),
+        "LOG_ENABLE_CONSOLE": "false",
+        "LOG_ENABLE_FILE": "false",
+        "METRICS_MULTIPROC_DIR": os.path.join(directory, "metrics") if args.workers > 1 else "",
+    }
+    app = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(app_port),
+        "--workers", str(args.workers), "--no-access-log", "--log-level", "warning",
+    ], env=env, stdout=output, stderr=output)
+    app_url, usda_url = f"http://127.0.0.1:{app_port}", f"http://127.0.0.1:{usda_port}"
+    asyncio.run(wait_for(f"{usda_url}/stats"))
+    asyncio.run(wait_for(app_url))
+    return app_url, usda_url, [app, usda]
+
+
+class LoadDriver:
+    def __init__(self, client: httpx.AsyncClient, queries: list, fdc_ids: list = (), seed: int = 1):
+        self.client = client
+        self.queries = queries
+        self.fdc_ids = fdc_ids
+        self.random = random.Random(seed)
+        self.accounts = []
+        self.serial = itertools.count()
+
+    async def register(self) -> httpx.Response:
+        index = next(self.serial)
+        email = f"load-{os.getpid()}-{index}@example.com"
+        response = await self.client.post("/api/v1/auth/register/", json={
+            "name": f"Load User {index}", "email": email, "phone_number": f"{os.getpid() % 1000:03d}{index:07d}", "password": PASSWORD,
+        })
+        if response.status_code == 200:
+            self.accounts.append({"email": email, **response.json()})
+        return response
+
+    async def login(self) -> httpx.Response:
+        account = self.random.choice(self.accounts)
+        return await self.client.post("/api/v1/auth/login/", json={"email": account["email"], "password": PASSWORD})
+
+    async def refresh(self) -> httpx.Response:
+        account = self.random.choice(self.accounts)
+        return await self.client.post("/api/v1/auth/refresh/", json={"refresh_token": account["refresh_token"]})
+
+    async def search(self) -> httpx.Response:
+        account = self.random.choice(self.accounts)
+        return await self.client.get(
+            "/api/v1/calories/usda-recipe-search/",
+            params={"query": self.random.choice(self.queries)},
+            headers={"Authorization": f"Bearer {account['access_token']}"},
+        )
+
+    async def details(self) -> httpx.Response:
+        account = self.random.choice(self.accounts)
+        return await self.client.get(
+            f"/api/v1/calories/usda-recipe-search/{self.random.choice(self.fdc_ids)}",
+            headers={"Authorization": f"Bearer {account['access_token']}"},
+        )
+
+    async def run(self, mix: dict, requests: int, concurrency: int) -> dict:
+        operations, weights = zip(*mix.items())
+        plan = self.random.choices(operations, weights, k=requests)
+        timings = {operation: [] for operation in operations}
+        statuses = {operation: {} for operation in operations}
+        position = iter(plan)
+
+        async def client_loop():
+            for operation in position:
+                started = time.perf_counter_ns()
+                try:
+                    status = str((await getattr(self, operation)()).status_code)
+                except httpx.HTTPError as exc:
+                    # Recorded under the exception name, e.g. "ReadTimeout"
+                    status = type(exc).__name__
+                timings[operation].append((time.perf_counter_ns() - started) / 1e6)
+                statuses[operation][status] = statuses[operation].get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        overall_statuses = {}
+        for counts in statuses.values():
+            for status, count in counts.items():
+                overall_statuses[status] = overall_statuses.get(status, 0) + count
+        return {
+            "concurrency": concurrency,
+            "elapsed_seconds": round(elapsed, 3),
+            "overall": summarize([t for values in timings.values() for t in values], overall_statuses, elapsed),
+            "operations": {operation: summarize(timings[operation], statuses[operation], elapsed) for operation in operations},
+        }
+
+
+async def upstream_requests(usda_url: str) -> int:
+    async with httpx.AsyncClient() as client:
+        return (await client.get(f"{usda_url}/stats")).json()["requests"]
+
+
+async def drive(app_url: str, usda_url: str, args) -> list:
+    from benchmarks.fake_usda import FDC_ID_STRIDE, load_payloads
+
+    payloads = load_payloads()
+    recorded = sorted({food["fdcId"] for payload in payloads.values() for food in payload["foods"]})
+    fdc_ids = [fdc_id + FDC_ID_STRIDE * copy for copy in range(DETAIL_COPIES) for fdc_id in recorded]
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=60) as client:
+        driver = LoadDriver(client, sorted(payloads), fdc_ids)
+        for _ in range(args.users):
+            response = await driver.register()
+            if response.status_code != 200:
+                raise RuntimeError(f"Registering load test users failed: {response.status_code} {response.text}")
+        results = []
+        for concurrency in args.concurrency:
+            await driver.run(args.mix, args.warmup, concurrency)
+            upstream_before = await upstream_requests(usda_url) if usda_url else None
+            results.append(await driver.run(args.mix, args.requests, concurrency))
+            if usda_url:
+                results[-1]["upstream_requests"] = await upstream_requests(usda_url) - upstream_before
+            overall = results[-1]["overall"]
+            print(f"concurrency {concurrency:>4}: {overall['requests_per_second']:>8} req/s  p50 {overall['p50_ms']:>8} ms  "
+                  f"p95 {overall['p95_ms']:>8} ms  p99 {overall['p99_ms']:>8} ms  errors {overall['errors']}  "
+                  f"upstream {results[-1].get('upstream_requests', '-')}")
+            for operation, stats in results[-1]["operations"].items():
+                print(f"    {operation:>9}: {stats['requests']:>6} req  p50 {stats['p50_ms']:>8} ms  "
+                      f"p95 {stats['p95_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms  {stats['statuses']}")
+        return results
+
+
+def main(args):
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "verbose")}
+    with tempfile.TemporaryDirectory() as directory:
+        processes = []
+        try:
+            if args.target:
+                app_url, usda_url = args.target, None
+            else:
+                app_url, usda_url, processes = start_servers(args, directory)
+            results = asyncio.run(drive(app_url, usda_url, args))
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=30)
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump({"config": config, "results": results}, fp, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", type=parse_mix, default="mixed")
+    parser.add_argument("--concurrency", type=lambda value: [int(level) for level in value.split(",")], default=[10, 50])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--rate-limit", type=int)
+    parser.add_argument("--usda-latency-ms", type=float, default=80)
+    parser.add_argument("--usda-jitter-ms", type=float, default=20)
+    parser.add_argument("--usda-failure-rate", type=float, default=0.0)
+    parser.add_argument("--target")
+    parser.add_argument("--verbose", action="store_true", help="Show the servers' output")
+    parser.add_argument("--output")
+    main(parser.parse_args())
@@ -0,0 +1,197 @@
+"""
+Micro-benchmarks for the per-request CPU work of a food search: parsing
+the USDA response, picking the best match and extracting its nutrients.
+
+Usage:
+    python -m benchmarks.bench_matching [--page-sizes 10,50,100,200] [--only best_match] [--output results.json]
+        [--baseline previous.json] [--threshold 0.1]
+
+Every operation runs on result pages built from the recorded payloads
+(benchmarks/payloads/foods_search.json) and padded to each page size:
+
+    branded / foundation / sr_legacy   foods of one data type (Branded pages
+                                       carry ingredients and label fields,
+                                       Foundation ones the longest nutrient lists)
+    mixed                              each query's own recorded results
+
+Operations, each run once per (query, page):
+
+    parse           json.loads of the response body
+    stream_parse    FoodSearchParser over 64 KiB chunks (USDA_STREAM_PARSE)
+    fuzzy_compare   fuzzy_compare against every description (the naive scan)
+    best_match      CalorieService.get_best_fuzzy_match
+    nutrients       extract_nutrients for every food on the page
+    build_result    CalorieProcessor.build_result for the best match
+    request         a search cache miss: parse, serialize the response for
+                    the search cache, best_match and build_result
+    stream_request  the same with stream_parse
+    portion_tables  build_portion_table for every food (portion cache misses)
+    scale           grams_for with prebuilt tables and one scale_rows pass
+                    for every food on the page, as for a meal
+
+For each case the report shows ops/sec (best of `--repeat` runs of at least
+`--min-time` seconds each, with the GC disabled, like timeit) and the
+tracemalloc peak per op. With `--baseline`, any case whose ops/sec fell by
+more than `--threshold` compared with that earlier `--output` file is
+listed, and the exit status is 1.
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from app.processors.calorie_processor import CalorieProcessor, NUTRIENT_KEYS, TOTAL_FIELDS
+from app.services.external_services.calorie_service import CalorieService
+from app.utils.food_search_parser import parse_search_response
+from app.utils.fuzzy_matcher import fuzzy_compare
+from app.utils.nutrient_resolver import extract_nutrients
+from app.utils.portion_engine import build_portion_table, grams_for, scale_rows
+from benchmarks.fake_usda import load_payloads, pad_foods
+
+# Typical size of the chunks httpx hands over while streaming a body
+STREAM_CHUNK_SIZE = 64 * 1024
+CORPORA = {"branded": "Branded", "foundation": "Foundation", "sr_legacy": "SR Legacy", "mixed": None}
+
+
+def build_pages(payloads: dict, corpus: str, page_size: int) -> list:
+    """`(query, foods, body)` for every recorded query."""
+    data_type = CORPORA[corpus]
+    typed = [food for payload in payloads.values() for food in payload["foods"] if food.get("dataType") == data_type]
+    pages = []
+    for position, (query, payload) in enumerate(sorted(payloads.items())):
+        if data_type is None:
+            foods = pad_foods(payload["foods"], page_size)
+        else:
+            # Rotated so every query sees a differently ordered page
+            shift = position % len(typed)
+            foods = pad_foods(typed[shift:] + typed[:shift], page_size)
+        body = json.dumps({"totalHits": payload["totalHits"], "foods": foods}).encode()
+        pages.append((query, foods, body))
+    return pages
+
+
+def naive_best_match(query: str, foods: list) -> dict:
+    return max(foods, key=lambda food: fuzzy_compare(query, food.get("description") or "")["ratio"])
+
+
+def request_path(query: str, body: bytes, stream: bool = False) -> dict:
+    data = parse_search_response(body, STREAM_CHUNK_SIZE) if stream else json.loads(body)
+    # What FoodSearchCache.set stores (and sizes the in-process entry by)
+    json.dumps({"stored_at": 0.0, "data": data}, separators=(",", ":"))
+    return CalorieProcessor.build_result(CalorieService.get_best_fuzzy_match(query, data["foods"]))
+
+
+def scale_page(tables: list, rows: list) -> list:
+    return scale_rows(rows, [grams_for(table, 1.5) for table in tables])
+
+
+def operations(pages: list) -> dict:
+    """Operation name -> list of zero-argument calls, one per page."""
+    best = {query: CalorieService.get_best_fuzzy_match(query, foods) for query, foods, _ in pages}
+    tables = {query: [build_portion_table(food) for food in foods] for query, foods, _ in pages}
+    rows = {
+        query: [[result[field] for field in TOTAL_FIELDS] for result in map(CalorieProcessor.build_result, foods)]
+        for query, foods, _ in pages
+    }
+    return {
+        "parse": [lambda body=body: json.loads(body) for _, _, body in pages],
+        "stream_parse": [lambda body=body: parse_search_response(body, STREAM_CHUNK_SIZE) for _, _, body in pages],
+        "fuzzy_compare": [lambda query=query, foods=foods: naive_best_match(query, foods) for query, foods, _ in pages],
+        "best_match": [lambda query=query, foods=foods: CalorieService.get_best_fuzzy_match(query, foods) for query, foods, _ in pages],
+        "nutrients": [lambda foods=foods: [extract_nutrients(food.get("foodNutrients", []), NUTRIENT_KEYS) for food in foods] for _, foods, _ in pages],
+        "build_result": [lambda match=best[query]: CalorieProcessor.build_result(match) for query, _, _ in pages],
+        "request": [lambda query=query, body=body: request_path(query, body) for query, _, body in pages],
+        "stream_request": [lambda query=query, body=body: request_path(query, body, stream=True) for query, _, body in pages],
+        "portion_tables": [lambda foods=foods: [build_portion_table(food) for food in foods] for _, foods, _ in pages],
+        "scale": [lambda query=query: scale_page(tables[query], rows[query]) for query, _, _ in pages],
+    }
+
+
+def run(calls: list, number: int) -> float:
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for index in range(number):
+            calls[index % len(calls)]()
+        return time.perf_counter() - started
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def measure(calls: list, min_time: float, repeat: int) -> dict:
+    number = len(calls)
+    while (elapsed := run(calls, number)) < min_time:
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.1))
+    best = min([elapsed] + [run(calls, number) for _ in range(repeat - 1)]) / number
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for call in calls:
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            call()
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ops_per_second": round(1 / best, 1),
+        "mean_us": round(best * 1e6, 2),
+        "peak_kib": round(sum(peaks) / len(peaks) / 1024, 1),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for case, stats in results.items():
+        previous = baseline.get(case)
+        if previous and stats["ops_per_second"] < previous["ops_per_second"] * (1 - threshold):
+            change = stats["ops_per_second"] / previous["ops_per_second"] - 1
+            regressions.append(f"{case}: {previous['ops_per_second']} -> {stats['ops_per_second']} ops/s ({change:+.1%})")
+    return regressions
+
+
+def main(args) -> int:
+    payloads = load_payloads()
+    results = {}
+    for corpus in args.corpora:
+        for page_size in args.page_sizes:
+            for operation, calls in operations(build_pages(payloads, corpus, page_size)).items():
+                if args.only and operation not in args.only:
+                    continue
+                case = f"{operation}/{corpus}/{page_size}"
+                results[case] = stats = measure(calls, args.min_time, args.repeat)
+                print(f"{case:>28}: {stats['ops_per_second']:>11} ops/s  {stats['mean_us']:>10} us  peak {stats['peak_kib']:>8} KiB")
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "cases": results}, fp, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = compare(results, json.load(fp)["cases"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}:")
+            print("\n".join(regressions))
+            return 1
+        print(f"\nNo case slower than the baseline by more than {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-sizes", type=lambda value: [int(size) for size in value.split(",")], default=[10, 50, 100, 200])
+    parser.add_argument("--corpora", type=lambda value: value.split(","), default=list(CORPORA))
+    parser.add_argument("--only", type=lambda value: value.split(","), help="Comma-separated operations to run")
+    parser.add_argument("--min-time", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--output")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,145 @@
+"""
+Per-request overhead of the middleware stack: the previous four
+BaseHTTPMiddleware layers against the current pure-ASGI ones.
+
+Usage:
+    python -m benchmarks.bench_middleware [--requests 2000] [--output results.json]
+
+Both stacks wrap the same trivial JSON endpoint and run the same checks
+(token verification, rate limiting, security headers, session per
+request), so the difference is the BaseHTTPMiddleware machinery. Run it
+without a reachable Redis so both rate limiters count in memory.
+"""
+import argparse
+import asyncio
+import json
+import re
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+
+from app.db.database import get_db
+from app.middleware.authentication_middleware import CustomAuthMiddleware, EXEMPT_PATH_PATTERNS
+from app.middleware.rate_limiter import RateLimiterMiddleware
+from app.middleware.security import SecurityHeadersMiddleware, DBSessionMiddleware, SECURITY_HEADERS
+from app.processors.auth_processor import AuthProcessor
+
+
+# --- previous BaseHTTPMiddleware implementations -----------------------------
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        if any(re.match(pattern, request.url.path) for pattern in EXEMPT_PATH_PATTERNS):
+            return await call_next(request)
+        auth_header = request.headers.get("authorization")
+        if not auth_header or not auth_header.lower().startswith("bearer "):
+            return JSONResponse({"detail": "Unauthorized: Missing or invalid token."}, status_code=401)
+        payload = AuthProcessor.verify_token(auth_header.split(" ", 1)[1], expected_type="access")
+        if not payload:
+            return JSONResponse({"detail": "Unauthorized: Invalid or expired token."}, status_code=401)
+        request.state.user = payload
+        return await call_next(request)
+
+
+class LegacyRateLimiterMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, max_requests: int, window_seconds: int):
+        super().__init__(app)
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.clients = {}
+
+    async def dispatch(self, request, call_next):
+        window = int(time.time()) // self.window_seconds
+        counts = self.clients.setdefault(request.client.host, {})
+        counts[window] = counts.get(window, 0) + 1
+        if counts[window] > self.max_requests:
+            return JSONResponse({"detail": "Too Many Requests"}, status_code=429)
+        return await call_next(request)
+
+
+class LegacySecurityHeadersMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        for name, value in SECURITY_HEADERS.items():
+            response.headers[name] = value
+        return response
+
+
+class LegacyDBSessionMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        async for db in get_db():
+            request.state.db = db
+            return await call_next(request)
+
+
+# --- benchmark -----------------------------------------------------------------
+
+def build_app(legacy: bool, requests: int) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"message": "pong"}
+
+    # Same order as app/main.py; the limit is high enough never to trigger
+    if legacy:
+        app.add_middleware(LegacyAuthMiddleware)
+        app.add_middleware(LegacyRateLimiterMiddleware, max_requests=requests * 10, window_seconds=60)
+        app.add_middleware(LegacySecurityHeadersMiddleware)
+        app.add_middleware(LegacyDBSessionMiddleware)
+    else:
+        app.add_middleware(CustomAuthMiddleware)
+        app.add_middleware(RateLimiterMiddleware, max_requests=requests * 10, window_seconds=60)
+        app.add_middleware(SecurityHeadersMiddleware)
+        app.add_middleware(DBSessionMiddleware)
+    return app
+
+
+async def measure(app: FastAPI, requests: int, headers: dict) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(50):
+            await client.get("/ping", headers=headers)
+        timings = []
+        for _ in range(requests):
+            started = time.perf_counter_ns()
+            response = await client.get("/ping", headers=headers)
+            timings.append((time.perf_counter_ns() - started) / 1000)
+            assert response.status_code == 200, response.text
+    timings.sort()
+    return {
+        "requests": requests,
+        "mean_us": round(statistics.fmean(timings), 1),
+        "p50_us": round(timings[len(timings) // 2], 1),
+        "p99_us": round(timings[int(len(timings) * 0.99) - 1], 1),
+    }
+
+
+async def main(requests: int, output: str = None):
+    token = AuthProcessor.create_access_token({"sub": "bench", "email": "bench@example.com"})
+    headers = {"Authorization": f"Bearer {token}"}
+    results = {}
+    for name, legacy in (("base_http_middleware", True), ("pure_asgi", False)):
+        results[name] = await measure(build_app(legacy, requests), requests, headers)
+    saved = results["base_http_middleware"]["mean_us"] - results["pure_asgi"]["mean_us"]
+    results["saved_per_request_us"] = round(saved, 1)
+
+    for name in ("base_http_middleware", "pure_asgi"):
+        stats = results[name]
+        print(f"{name:>22}: mean {stats['mean_us']:>8} us  p50 {stats['p50_us']:>8} us  p99 {stats['p99_us']:>8} us")
+    print(f"{'saved per request':>22}: {results['saved_per_request_us']} us")
+    if output:
+        with open(output, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.output))
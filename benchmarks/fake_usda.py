@@ -0,0 +1,207 @@
+"""
+Local stand-in for the FoodData Central API, so load tests need neither
+the real API nor a network.
+
+Usage:
+    python -m benchmarks.fake_usda [--port 8765] [--latency-ms 80] [--jitter-ms 20] [--failure-rate 0.01]
+    python -m benchmarks.fake_usda record --api-key KEY "apple" "chicken breast" ...
+
+`GET /fdc/v1/foods/search` answers from recorded search responses
+(benchmarks/payloads/foods_search.json, keyed by query). Queries without a
+recording get the one sharing the most words with them, or else one picked
+by hash. Results are padded to the requested `pageSize` by repeating the
+recorded foods under new fdcIds, so response sizes match the real API;
+`pageNumber` pages through them, and `dataType` (comma-separated) keeps
+only the recorded foods of those types, with `totalHits` scaled to match.
+`POST /fdc/v1/foods` returns full details for the recorded foods (and
+their padded copies) among `fdcIds`, in the details response shape.
+Every request waits `latency ± jitter` ms, and a `failure_rate` fraction
+of them answer 500.
+
+`record` fetches real responses with your API key and merges them into
+the payload file. The shipped payloads are a small sample in the API's
+response shape; record your own traffic for representative numbers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import zlib
+from functools import lru_cache
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+PAYLOADS_PATH = os.path.join(os.path.dirname(__file__), "payloads", "foods_search.json")
+USDA_API = "https://api.nal.usda.gov/fdc/v1/"
+# Added to fdcIds of repeated foods, once per repetition
+FDC_ID_STRIDE = 10_000_000
+
+
+def load_payloads(path: str = PAYLOADS_PATH) -> dict:
+    with open(path) as fp:
+        return {query.lower(): payload for query, payload in json.load(fp).items()}
+
+
+def pad_foods(foods: list, count: int) -> list:
+    """`count` foods, repeating the recorded ones under new fdcIds as needed."""
+    if not foods:
+        return []
+    return [
+        {**foods[index % len(foods)], "fdcId": foods[index % len(foods)]["fdcId"] + FDC_ID_STRIDE * (index // len(foods))}
+        for index in range(count)
+    ]
+
+
+def details_food(food: dict) -> dict:
+    """A search result food in the shape of the food details response."""
+    details = {key: value for key, value in food.items() if key not in ("foodNutrients", "foodMeasures", "score", "allHighlightFields")}
+    details["foodNutrients"] = [
+        {
+            "type": "FoodNutrient",
+            "nutrient": {"id": entry.get("nutrientId"), "number": entry.get("nutrientNumber"),
+                         "name": entry.get("nutrientName"), "unitName": entry.get("unitName")},
+            "amount": entry.get("value"),
+        }
+        for entry in food.get("foodNutrients", [])
+    ]
+    details["foodPortions"] = [
+        {
+            "id": index + 1,
+            "amount": 1.0,
+            "measureUnit": {"name": "undetermined", "abbreviation": "undetermined"},
+            "modifier": measure.get("modifier"),
+            "portionDescription": measure.get("disseminationText"),
+            "gramWeight": measure.get("gramWeight"),
+            "sequenceNumber": measure.get("rank", index + 1),
+        }
+        for index, measure in enumerate(food.get("foodMeasures") or [])
+    ]
+    return details
+
+
+def create_app(payloads: dict, latency_ms: float = 0, jitter_ms: float = 0, failure_rate: float = 0.0, seed: int = None) -> Starlette:
+    rng = random.Random(seed)
+    queries = sorted(payloads)
+    stats = {"requests": 0, "failures": 0}
+    recorded_foods = {food["fdcId"]: food for payload in payloads.values() for food in payload["foods"]}
+
+    def recording_for(query: str) -> str:
+        query = " ".join(query.lower().split())
+        if query in payloads:
+            return query
+        words = set(query.split())
+        best = max(queries, key=lambda candidate: len(words & set(candidate.split())))
+        if words & set(best.split()):
+            return best
+        return queries[zlib.crc32(query.encode()) % len(queries)]
+
+    @lru_cache(maxsize=1024)
+    def search_body(recording: str, page_size: int, page_number: int, data_types: tuple = ()) -> bytes:
+        payload = payloads[recording]
+        recorded = payload["foods"]
+        total_hits = payload["totalHits"]
+        if data_types:
+            matching = [food for food in recorded if food.get("dataType") in data_types]
+            total_hits = max(len(matching), total_hits * len(matching) // max(len(recorded), 1))
+            recorded = matching
+        start = min((page_number - 1) * page_size, total_hits)
+        foods = pad_foods(recorded, min(start + page_size, total_hits))[start:]
+        criteria = {**payload.get("foodSearchCriteria", {}), "pageSize": page_size, "pageNumber": page_number}
+        if data_types:
+            criteria["dataType"] = list(data_types)
+        return json.dumps({
+            **payload,
+            "currentPage": page_number,
+            "totalHits": total_hits,
+            "totalPages": -(-total_hits // page_size),
+            "foodSearchCriteria": criteria,
+            "foods": foods,
+        }).encode()
+
+    async def delay():
+        wait = latency_ms + rng.uniform(-jitter_ms, jitter_ms)
+        if wait > 0:
+            await asyncio.sleep(wait / 1000)
+
+    async def search(request: Request):
+        stats["requests"] += 1
+        await delay()
+        if rng.random() < failure_rate:
+            stats["failures"] += 1
+            return JSONResponse({"error": "Injected failure"}, status_code=500)
+        query = request.query_params.get("query", "")
+        page_size = max(1, min(int(request.query_params.get("pageSize", 50)), 200))
+        page_number = max(1, int(request.query_params.get("pageNumber", 1)))
+        data_types = tuple(sorted(
+            data_type.strip() for data_type in request.query_params.get("dataType", "").split(",") if data_type.strip()
+        ))
+        body = search_body(recording_for(query), page_size, page_number, data_types)
+        return Response(body, media_type="application/json")
+
+    @lru_cache(maxsize=4096)
+    def food_details(fdc_id: int):
+        food = recorded_foods.get(fdc_id % FDC_ID_STRIDE)
+        return None if food is None else {**details_food(food), "fdcId": fdc_id}
+
+    async def foods(request: Request):
+        stats["requests"] += 1
+        await delay()
+        if rng.random() < failure_rate:
+            stats["failures"] += 1
+            return JSONResponse({"error": "Injected failure"}, status_code=500)
+        fdc_ids = (await request.json()).get("fdcIds", [])[:20]
+        found = [food_details(int(fdc_id)) for fdc_id in fdc_ids]
+        return JSONResponse([food for food in found if food is not None])
+
+    async def stats_route(request: Request):
+        return JSONResponse(stats)
+
+    return Starlette(routes=[
+        Route("/fdc/v1/foods/search", search),
+        Route("/fdc/v1/foods", foods, methods=["POST"]),
+        Route("/stats", stats_route),
+    ])
+
+
+async def record(api_key: str, queries: list, page_size: int, path: str):
+    payloads = {}
+    if os.path.exists(path):
+        with open(path) as fp:
+            payloads = json.load(fp)
+    async with httpx.AsyncClient(base_url=USDA_API, timeout=30) as client:
+        for query in queries:
+            response = await client.get("foods/search", params={"api_key": api_key, "query": query, "pageSize": page_size})
+            response.raise_for_status()
+            payloads[query.lower()] = response.json()
+            print(f"recorded {query!r}: {len(payloads[query.lower()].get('foods', []))} foods")
+    with open(path, "w") as fp:
+        json.dump(payloads, fp)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payloads", default=PAYLOADS_PATH)
+    subcommands = parser.add_subparsers(dest="command")
+    recorder = subcommands.add_parser("record", help="Record real search responses into the payload file")
+    recorder.add_argument("--api-key", required=True)
+    recorder.add_argument("--page-size", type=int, default=100)
+    recorder.add_argument("queries", nargs="+")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        asyncio.run(record(args.api_key, args.queries, args.page_size, args.payloads))
+    else:
+        fake_app = create_app(load_payloads(args.payloads), args.latency_ms, args.jitter_ms, args.failure_rate, args.seed)
+        uvicorn.run(fake_app, host=args.host, port=args.port, log_level="warning", access_log=False)
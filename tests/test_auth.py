@@ -1,11 +1,18 @@
+import asyncio
+import threading
 import pytest
 from httpx import AsyncClient
 from app.main import app
 from app.managers.redis_manager import RedisManager
 from app.middleware.security import hash_password
+from app.managers.password_hash_manager import PasswordHashManager
+from app.config.settings import settings
+from app.utils.exceptions import ServiceUnavailableException
 from app.managers.user_manager import UserManager
 from app.utils import get_current_datetime
 from app.models.user import User
+from app.middleware.authentication_middleware import EXEMPT_PATH_MATCHER
+from app.processors.auth_processor import AuthProcessor
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
@@ -50,3 +57,102 @@ class TestAuthentication:
         assert response.status_code == 200
         assert response.json()["user_created"] is True
         assert "access_token" in response.json()
+
+
+class TestVerifiedTokenCache:
+
+    def test_cached_verification_skips_decode(self, monkeypatch):
+        token = AuthProcessor.create_access_token({"sub": "cache-user", "email": "cache@example.com"})
+        decodes = []
+        original = AuthProcessor.verify_token
+
+        def counting_verify(token, expected_type=None):
+            decodes.append(token)
+            return original(token, expected_type)
+
+        monkeypatch.setattr(AuthProcessor, "verify_token", staticmethod(counting_verify))
+        hits_before = AuthProcessor.token_cache_stats()["hits"]
+        first = AuthProcessor.verify_token_cached(token, expected_type="access")
+        second = AuthProcessor.verify_token_cached(token, expected_type="access")
+        assert first["sub"] == second["sub"] == "cache-user"
+        assert len(decodes) == 1
+        assert AuthProcessor.token_cache_stats()["hits"] == hits_before + 1
+
+    def test_cached_payload_still_checks_token_type(self):
+        token = AuthProcessor.create_refresh_token({"sub": "cache-user", "email": "cache@example.com"})
+        assert AuthProcessor.verify_token_cached(token) is not None
+        assert AuthProcessor.verify_token_cached(token, expected_type="access") is None
+
+    def test_invalid_tokens_are_rejected(self):
+        assert AuthProcessor.verify_token_cached("not-a-jwt", expected_type="access") is None
+
+    def test_exempt_path_matcher(self):
+        assert EXEMPT_PATH_MATCHER.match("/api/v1/auth/login")
+        assert EXEMPT_PATH_MATCHER.match("/api/v1/auth/refresh/")
+        assert not EXEMPT_PATH_MATCHER.match("/api/v1/auth/login/extra")
+        assert not EXEMPT_PATH_MATCHER.match("/api/v1/calories/usda-recipe-search/")
+
+
+class TestPasswordHashManager:
+
+    @pytest.fixture(autouse=True)
+    def fast_bcrypt(self, monkeypatch):
+        monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 4)
+
+    def test_hash_and_verify_off_the_event_loop(self):
+        async def scenario():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0)
+
+            task = asyncio.create_task(ticker())
+            password_hash, password_salt = await PasswordHashManager.hash_password("s3cret")
+            valid = await PasswordHashManager.verify_password("s3cret", password_hash, password_salt)
+            wrong = await PasswordHashManager.verify_password("wrong", password_hash, password_salt)
+            missing = await PasswordHashManager.verify_password("s3cret", None)
+            task.cancel()
+            return valid, wrong, missing, ticks
+
+        valid, wrong, missing, ticks = asyncio.run(scenario())
+        assert (valid, wrong, missing) == (True, False, False)
+        # The loop kept serving other tasks while bcrypt ran
+        assert ticks > 1
+        stats = PasswordHashManager.stats()
+        assert stats["hash_seconds_total"] > 0 and stats["pending"] == 0
+
+    def test_cost_factor_comes_from_settings(self):
+        password_hash, _ = asyncio.run(PasswordHashManager.hash_password("s3cret"))
+        assert password_hash.startswith("$2b$04$")
+
+    def test_cancelled_callers_stay_pending_until_the_hash_finishes(self):
+        release = threading.Event()
+
+        def blocking_hash():
+            release.wait(5)
+            return "hashed"
+
+        async def scenario():
+            caller = asyncio.ensure_future(PasswordHashManager._run(blocking_hash))
+            await asyncio.sleep(0.01)
+            caller.cancel()
+            await asyncio.gather(caller, return_exceptions=True)
+            # The client is gone but the bcrypt thread is still busy
+            pending_while_running = PasswordHashManager.stats()["pending"]
+            release.set()
+            deadline = asyncio.get_running_loop().time() + 5
+            while PasswordHashManager.stats()["pending"] and asyncio.get_running_loop().time() < deadline:
+                await asyncio.sleep(0.01)
+            return pending_while_running
+
+        assert asyncio.run(scenario()) == 1
+        assert PasswordHashManager.stats()["pending"] == 0
+
+    def test_full_queue_is_rejected(self, monkeypatch):
+        monkeypatch.setattr(settings, "PASSWORD_HASH_QUEUE_LIMIT", 0)
+        monkeypatch.setattr(PasswordHashManager, "_pending", settings.PASSWORD_HASH_WORKERS)
+        with pytest.raises(ServiceUnavailableException):
+            asyncio.run(PasswordHashManager.hash_password("s3cret"))
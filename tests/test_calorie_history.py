@@ -0,0 +1,62 @@
+import asyncio
+import json
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.config.settings import settings
+from app.db.models_base import Base
+from app.managers.calorie_history_manager import CalorieHistoryManager
+from app.models.calorie import Calorie
+
+
+class TestCalorieHistoryManager:
+
+    def test_rows_are_flushed_in_batches_and_on_shutdown(self, monkeypatch):
+        monkeypatch.setattr(settings, "CALORIE_HISTORY_BATCH_SIZE", 2)
+        monkeypatch.setattr(settings, "CALORIE_HISTORY_FLUSH_INTERVAL", 60)
+
+        async def scenario():
+            engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+            await CalorieHistoryManager.start(session_factory)
+            assert CalorieHistoryManager.record("apple", [{"query": "apple"}], 52)
+            assert CalorieHistoryManager.record("pear", [{"query": "pear"}], 57)
+            assert not CalorieHistoryManager.record("water", [], None)
+            # The full batch is written by the writer task; wait for it rather than a fixed time
+            deadline = asyncio.get_running_loop().time() + 5
+            while CalorieHistoryManager.stats()["written"] < 2 and asyncio.get_running_loop().time() < deadline:
+                await asyncio.sleep(0.01)
+            written_by_size = CalorieHistoryManager.stats()["written"]
+            CalorieHistoryManager.record("rice", [{"query": "rice"}], 130)
+            await CalorieHistoryManager.stop()
+
+            async with session_factory() as db:
+                rows = (await db.execute(select(Calorie).order_by(Calorie.title))).scalars().all()
+            await engine.dispose()
+            return written_by_size, rows
+
+        CalorieHistoryManager._counters.update(written=0, dropped=0)
+        written_by_size, rows = asyncio.run(scenario())
+        assert written_by_size == 2
+        assert [row.title for row in rows] == ["apple", "pear", "rice"]
+        assert json.loads(rows[0].ingredients) == [{"query": "apple"}]
+        assert rows[2].calorie_calculation == 130.0
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        async def scenario():
+            # A queue with no writer attached, so it stays full
+            CalorieHistoryManager._queue = asyncio.Queue(maxsize=1)
+            CalorieHistoryManager._wakeup = asyncio.Event()
+            CalorieHistoryManager._stopping = False
+            first = CalorieHistoryManager.record("apple", [], 52)
+            second = CalorieHistoryManager.record("pear", [], 57)
+            CalorieHistoryManager._queue = None
+            return first, second
+
+        dropped_before = CalorieHistoryManager.stats()["dropped"]
+        assert asyncio.run(scenario()) == (True, False)
+        assert CalorieHistoryManager.stats()["dropped"] == dropped_before + 1
@@ -0,0 +1,706 @@
+import asyncio
+import json
+import httpx
+import pytest
+from app.config.settings import settings
+from app.managers.food_cache_manager import FoodDetailCache, FoodSearchCache
+from app.managers.http_client_manager import HttpClientManager
+from app.managers.portion_manager import PortionManager
+from app.managers.redis_manager import RedisManager
+from app.managers.single_flight_manager import DistributedSingleFlight
+from app.processors.calorie_processor import CalorieProcessor
+from app.schemas.calorie import MealItem
+from app.services.external_services import calorie_service
+from app.services.external_services.calorie_service import CalorieService
+from app.utils.food_ranker import FoodRanker
+from app.utils.exceptions import ServiceUnavailableException
+from app.utils.food_search_parser import parse_search_response, slim_food
+from app.utils.fuzzy_matcher import fuzzy_compare
+from app.utils.micro_batcher import MicroBatcher
+from app.utils.page_size_tuner import PageSizeTuner
+from app.utils.portion_engine import UnknownUnitError, build_portion_table, grams_for, scale_rows
+from app.utils.nutrient_resolver import MACRO_KEYS, extract_nutrients, resolve_nutrient
+from app.utils.single_flight import SingleFlight
+from app.utils.ttl_cache import TTLCache, FRESH, STALE
+
+
+@pytest.fixture
+def local_search_cache(monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_CACHE_REDIS_ENABLED", False)
+    FoodSearchCache.clear()
+    yield FoodSearchCache
+    FoodSearchCache.clear()
+
+
+class TestTTLCache:
+
+    def test_lru_eviction_by_entries_and_size(self):
+        cache = TTLCache(max_entries=2, ttl=60, max_size=10)
+        cache.set("a", 1, size=4)
+        cache.set("b", 2, size=4)
+        cache.get("a")
+        cache.set("c", 3, size=4)
+        assert "b" not in cache
+        assert cache.get("a") == (1, FRESH)
+        assert cache.current_size == 8
+        assert cache.evictions == 1
+
+    def test_stale_window(self):
+        cache = TTLCache(ttl=0, stale_ttl=60)
+        cache.set("a", 1)
+        assert cache.get("a") == (1, STALE)
+        assert cache.stats()["stale_hits"] == 1
+
+
+class TestFoodSearchCache:
+
+    def test_key_normalizes_query(self):
+        assert FoodSearchCache.make_key("  Cheddar   CHEESE ", 100) == FoodSearchCache.make_key("cheddar cheese", 100)
+        assert FoodSearchCache.make_key("apple", 10) != FoodSearchCache.make_key("apple", 100)
+
+    def test_get_or_fetch_caches_and_counts(self, local_search_cache):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            return {"foods": []}
+
+        async def scenario():
+            key = local_search_cache.make_key("apple", 100)
+            await local_search_cache.get_or_fetch(key, fetch)
+            await local_search_cache.get_or_fetch(key, fetch)
+
+        asyncio.run(scenario())
+        assert len(calls) == 1
+        stats = local_search_cache.stats()
+        assert stats["misses"] == 1 and stats["l1_hits"] == 1
+
+    def test_uncacheable_results_are_not_stored(self, local_search_cache):
+        async def fetch():
+            return {"error": "forbidden"}
+
+        async def scenario():
+            key = local_search_cache.make_key("apple", 100)
+            await local_search_cache.get_or_fetch(key, fetch, cacheable=lambda data: "foods" in data)
+            return await local_search_cache.get(key)
+
+        assert asyncio.run(scenario()) == (None, None)
+
+    def test_stale_entries_are_served_and_revalidated(self, local_search_cache):
+        async def fetch():
+            return {"foods": ["fresh"]}
+
+        async def scenario():
+            key = local_search_cache.make_key("apple", 100)
+            local_search_cache._l1.set(key, {"foods": ["old"]}, ttl=0, stale_ttl=60)
+            served = await local_search_cache.get_or_fetch(key, fetch)
+            assert len(local_search_cache._refresh_tasks) == 1
+            await asyncio.gather(*local_search_cache._refresh_tasks)
+            assert not local_search_cache._refresh_tasks
+            return served, local_search_cache._l1.get(key)
+
+        served, refreshed = asyncio.run(scenario())
+        assert served == {"foods": ["old"]}
+        assert refreshed == ({"foods": ["fresh"]}, FRESH)
+
+
+class TestSingleFlight:
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"foods": []}
+
+        async def scenario():
+            return await asyncio.gather(*(flight.do("apple", fetch) for _ in range(10)))
+
+        results = asyncio.run(scenario())
+        assert len(calls) == 1
+        assert all(result == {"foods": []} for result in results)
+        assert flight.stats() == {"calls": 1, "coalesced": 9, "in_flight": 0}
+
+    def test_errors_propagate_to_every_waiter(self):
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        async def scenario():
+            return await asyncio.gather(*(flight.do("apple", fetch) for _ in range(3)), return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert len(flight) == 0
+
+
+class TestDistributedSingleFlight:
+
+    def test_unreachable_redis_is_not_retried_on_every_call(self, monkeypatch):
+        flight = DistributedSingleFlight("test:flight", retry_seconds=30)
+        attempts = []
+
+        async def unreachable(key, ttl_ms):
+            attempts.append(key)
+            raise ConnectionError("redis down")
+
+        async def fetch():
+            return {"foods": []}
+
+        async def scenario():
+            return [await flight.do("apple", fetch) for _ in range(3)]
+
+        monkeypatch.setattr(RedisManager, "acquire_lock", unreachable)
+        assert asyncio.run(scenario()) == [{"foods": []}] * 3
+        assert len(attempts) == 1
+        assert flight.stats()["redis_errors"] == 1
+
+    def test_uncacheable_results_are_not_shared(self, monkeypatch):
+        leader, follower = DistributedSingleFlight("test:flight"), DistributedSingleFlight("test:flight", poll_interval=0.001)
+        keys = {}
+
+        async def acquire_lock(key, ttl_ms):
+            if key in keys:
+                return None
+            keys[key] = "leader"
+            return "leader"
+
+        async def release_lock(key, token):
+            keys.pop(key, None)
+
+        async def set_key_with_ttl(key, value, ttl):
+            keys[key] = value
+
+        async def get_key(key):
+            return keys.get(key)
+
+        async def upstream_error():
+            await asyncio.sleep(0.01)
+            return {"error": {"code": "OVER_RATE_LIMIT"}}
+
+        async def upstream_ok():
+            return {"foods": []}
+
+        async def scenario():
+            return await asyncio.gather(
+                leader.do("apple", upstream_error, cacheable=lambda data: "foods" in data),
+                follower.do("apple", upstream_ok, cacheable=lambda data: "foods" in data),
+            )
+
+        for name, fake in [("acquire_lock", acquire_lock), ("release_lock", release_lock),
+                           ("set_key_with_ttl", set_key_with_ttl), ("get_key", get_key)]:
+            monkeypatch.setattr(RedisManager, name, fake)
+        error, result = asyncio.run(scenario())
+        assert error == {"error": {"code": "OVER_RATE_LIMIT"}}
+        assert result == {"foods": []}
+        assert follower.stats()["fallback"] == 1
+        assert "test:flight:result:apple" not in keys
+
+
+class TestFoodRanker:
+
+    FOODS = [
+        {"description": "Cheese, cheddar, sharp, sliced"},
+        {"description": "CHEDDAR CHEESE CRACKERS"},
+        {"description": "Cheese, cheddar"},
+        {"description": "Apples, raw, with skin"},
+        {"description": "Milk, whole"},
+    ]
+
+    @staticmethod
+    def _brute_force(query, foods):
+        scores = [(fuzzy_compare(query, food["description"])["ratio"], food) for food in foods]
+        return sorted(scores, key=lambda item: -item[0])
+
+    def test_top_k_matches_exhaustive_ranking(self):
+        ranker = FoodRanker(self.FOODS)
+        for query in ("cheddar cheese", "apple", "whole milk", "xyz"):
+            expected = self._brute_force(query, self.FOODS)[:3]
+            assert [score for score, _ in ranker.top_k(query, 3)] == pytest.approx([score for score, _ in expected])
+
+    def test_reused_ranker_keeps_exhaustive_order_and_ties(self):
+        words = ["cheese", "cheddar", "apple", "raw", "milk", "whole", "sliced", "apples"]
+        # Repeated descriptions tie exactly; the earlier food must win
+        foods = [{"description": " ".join(words[(i * 3 + j) % len(words)] for j in range(1 + i % 3))} for i in range(40)]
+        ranker = FoodRanker(foods)
+        for query in ("cheddar cheese", "apple", "raw milk", "apples raw"):
+            expected = self._brute_force(query, foods)[:5]
+            assert [(score, id(food)) for score, food in ranker.top_k(query, 5)] == [(score, id(food)) for score, food in expected]
+
+        # "cab" has the higher bound but only ties the ratio of the earlier "abx"
+        tied = [{"description": "abx"}, {"description": "cab"}]
+        assert FoodRanker(tied).top_k("abc", 1)[0][1] is tied[0]
+
+    def test_best_match_is_not_first_above_threshold(self):
+        best = CalorieService.get_best_fuzzy_match("cheese, cheddar", self.FOODS)
+        assert best["description"] == "Cheese, cheddar"
+        assert best["fuzzy_score"] == pytest.approx(1.0)
+
+    def test_empty_foods(self):
+        assert CalorieService.get_best_fuzzy_match("apple", []) == {}
+
+
+class TestNutrientResolver:
+
+    def test_extracts_by_number_id_and_name(self):
+        food_nutrients = [
+            {"nutrientId": 1062, "nutrientName": "Energy", "nutrientNumber": "268", "unitName": "kJ", "value": 1690},
+            {"nutrientId": 2047, "nutrientName": "Energy (Atwater General Factors)", "nutrientNumber": "957", "unitName": "KCAL", "value": 410},
+            {"nutrientId": 1008, "nutrientName": "Energy", "nutrientNumber": "208", "unitName": "KCAL", "value": 404},
+            {"nutrientName": "Protein", "unitName": "G", "value": 22.9},
+            {"nutrientId": 1004, "nutrientName": "Total lipid (fat)", "nutrientNumber": "204", "unitName": "G", "value": 33.3},
+        ]
+        nutrients = extract_nutrients(food_nutrients, MACRO_KEYS + ("sodium_mg",))
+        assert nutrients["calories"] == {"value": 404, "unit": "KCAL"}
+        assert nutrients["protein_g"]["value"] == 22.9
+        assert nutrients["fat_g"]["value"] == 33.3
+        assert nutrients["carbohydrates_g"] == {"value": None, "unit": None}
+        assert nutrients["sodium_mg"]["value"] is None
+
+    def test_food_details_shape(self):
+        food_nutrients = [{"nutrient": {"id": 1003, "number": "203", "name": "Protein", "unitName": "g"}, "amount": 3.5}]
+        assert extract_nutrients(food_nutrients, ("protein_g",))["protein_g"] == {"value": 3.5, "unit": "g"}
+
+    def test_kilojoules_are_not_calories(self):
+        assert resolve_nutrient({"nutrientName": "Energy", "unitName": "kJ", "value": 1}) is None
+
+
+class TestMealLookup:
+
+    def test_totals_scale_by_servings_and_failures_are_isolated(self, monkeypatch):
+        unwound = []
+
+        async def fake_lookup(query):
+            if query == "boom":
+                raise RuntimeError("redis://:secret@cache:6379 refused")
+            if query == "busy":
+                raise ServiceUnavailableException("FoodData Central answered 503.")
+            if query == "slow":
+                try:
+                    await asyncio.sleep(1)
+                finally:
+                    unwound.append(query)
+            if query == "nothing":
+                return None
+            return {"calories": 100, "carbohydrates_g": 10, "fat_g": None, "protein_g": 2.5}
+
+        monkeypatch.setattr(CalorieProcessor, "lookup", staticmethod(fake_lookup))
+        items = [MealItem(query="apple", servings=2), MealItem(query="pear"), MealItem(query="boom"),
+                 MealItem(query="busy"), MealItem(query="nothing"), MealItem(query="slow")]
+
+        async def scenario():
+            meal = await CalorieProcessor.lookup_meal(items, concurrency=2, timeout=0.2)
+            # The timed-out lookup was cancelled and finished before the response
+            assert unwound == ["slow"]
+            return meal
+
+        meal = asyncio.run(scenario())
+
+        assert [item["status"] for item in meal["items"]] == ["ok", "ok", "error", "error", "not_found", "timeout"]
+        # Only HTTP error details reach the client
+        assert meal["items"][2]["detail"] == "Lookup failed."
+        assert meal["items"][3]["detail"] == "FoodData Central answered 503."
+        assert meal["totals"]["calories"] == 300
+        assert meal["totals"]["protein_g"] == 7.5
+        assert meal["totals"]["fat_g"] == 0
+        assert meal["resolved"] == 2 and meal["failed"] == 4
+
+    def test_items_are_scaled_to_their_portions(self, monkeypatch):
+        PortionManager.clear()
+        PortionManager.table_for({"fdcId": 1, "servingSize": 28, "servingSizeUnit": "g", "householdServingFullText": "1/4 cup"})
+
+        async def fake_lookup(query):
+            return {"best_match": {"food_id": 1}, "calories": 400, "carbohydrates_g": 1.0, "fat_g": 33.0, "protein_g": 25.0}
+
+        monkeypatch.setattr(CalorieProcessor, "lookup", staticmethod(fake_lookup))
+        items = [MealItem(query="cheddar", servings=2), MealItem(query="cheddar", servings=1, unit="cup"),
+                 MealItem(query="cheddar", servings=50, unit="g"), MealItem(query="cheddar", unit="slice")]
+        meal = asyncio.run(CalorieProcessor.lookup_meal(items))
+        PortionManager.clear()
+
+        assert [item["status"] for item in meal["items"]] == ["ok", "ok", "ok", "error"]
+        assert "slice" in meal["items"][3]["detail"]
+        assert [item["portion"]["grams"] for item in meal["items"][:3]] == [56.0, 112.0, 50.0]
+        assert meal["items"][1]["portion"]["calories"] == 448.0
+        assert meal["totals"]["calories"] == 224 + 448 + 200
+
+
+_SEARCH_RESPONSE = {
+    "totalHits": 2,
+    "currentPage": 1,
+    "totalPages": 1,
+    "foodSearchCriteria": {"query": "cheddar", "pageSize": 100},
+    "foods": [
+        {
+            "fdcId": 1, "description": "Cheese, cheddar", "dataType": "Foundation", "score": 812.5,
+            "foodNutrients": [
+                {"nutrientId": 2047, "nutrientName": "Energy (Atwater General Factors)", "nutrientNumber": "957", "unitName": "KCAL", "value": 410, "rank": 1},
+                {"nutrientId": 1003, "nutrientName": "Protein", "nutrientNumber": "203", "unitName": "G", "value": 23.3, "derivationCode": "A"},
+                {"nutrientId": 1210, "nutrientName": "Tryptophan", "nutrientNumber": "501", "unitName": "G", "value": 0.3},
+            ],
+        },
+        {
+            "fdcId": 2, "description": "SHARP CHEDDAR", "dataType": "Branded", "brandOwner": "Dairy Co", "ingredients": "MILK, SALT \u00e9",
+            "servingSize": 28.0, "servingSizeUnit": "g",
+            "foodNutrients": [{"nutrientId": 1008, "nutrientName": "Energy", "nutrientNumber": "208", "unitName": "KCAL", "value": 393}],
+        },
+    ],
+    "aggregations": {"dataType": {"Branded": 1, "Foundation": 1}},
+}
+
+
+class TestFoodSearchParser:
+
+    def test_chunked_parse_keeps_only_used_fields(self):
+        body = json.dumps(_SEARCH_RESPONSE).encode()
+        expected = {"totalHits": 2, "currentPage": 1, "totalPages": 1, "foods": [slim_food(food) for food in _SEARCH_RESPONSE["foods"]]}
+        for chunk_size in (1, 7, 64, None):
+            assert parse_search_response(body, chunk_size) == expected
+
+        cheese, branded = expected["foods"]
+        assert "score" not in cheese and "ingredients" not in branded
+        assert [entry["nutrientId"] for entry in cheese["foodNutrients"]] == [2047, 1003]
+        assert set(cheese["foodNutrients"][0]) == {"nutrientId", "nutrientName", "nutrientNumber", "unitName", "value"}
+        assert branded["servingSize"] == 28.0
+
+    def test_slim_foods_give_the_same_result(self):
+        for food in _SEARCH_RESPONSE["foods"]:
+            assert CalorieProcessor.build_result(slim_food(food)) == CalorieProcessor.build_result(food)
+
+    def test_truncated_body_is_an_error(self):
+        with pytest.raises(ValueError):
+            parse_search_response(json.dumps(_SEARCH_RESPONSE).encode()[:-40])
+
+    def test_service_streams_search_responses(self, monkeypatch):
+        def handler(request):
+            if request.url.params["query"] == "broken":
+                return httpx.Response(500, json={"error": "upstream"})
+            return httpx.Response(200, content=json.dumps(_SEARCH_RESPONSE).encode())
+
+        async def scenario():
+            HttpClientManager._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            try:
+                service = CalorieService(api_key="test")
+                return await service._async_fetch_search("cheddar", 100), await service._async_fetch_search("broken", 100)
+            finally:
+                await HttpClientManager.close_client()
+
+        monkeypatch.setattr(settings, "USDA_STREAM_PARSE", True)
+        found, failed = asyncio.run(scenario())
+        assert [food["fdcId"] for food in found["foods"]] == [1, 2]
+        assert "aggregations" not in found
+        assert failed == {"error": "upstream"}
+
+
+class TestPageSizeTuner:
+
+    def test_first_page_covers_the_learned_depth(self):
+        tuner = PageSizeTuner([10, 25, 50, 100], max_queries=2)
+        assert tuner.initial_page_size("apple") == 10
+        tuner.record("apple", 3)
+        tuner.record("salmon", 40)
+        assert tuner.initial_page_size("apple") == 10
+        assert tuner.initial_page_size("salmon") == 50
+        tuner.record("salmon", 100)
+        assert tuner.initial_page_size("salmon") == 100
+        # Unseen queries start from the average over all queries
+        assert tuner.initial_page_size("pear") == 50
+
+        tuner.record("egg", 1)
+        assert tuner.stats()["queries"] == 2
+        assert tuner.expected_depth("apple") != 3
+
+
+class TestAdaptiveSearch:
+
+    @pytest.fixture
+    def search_pages(self, monkeypatch):
+        """Fake API with 60 hits where "Banana, raw" is result `position` (1-based)."""
+        monkeypatch.setattr(settings, "SEARCH_ADAPTIVE_PAGE_SIZES", [10, 25, 50, 100])
+        monkeypatch.setattr(settings, "SEARCH_ADAPTIVE_MAX_RESULTS", 100)
+        monkeypatch.setattr(settings, "SEARCH_ADAPTIVE_CONFIDENCE", 0.7)
+        monkeypatch.setattr(settings, "SEARCH_ADAPTIVE_FANOUT", 2)
+        monkeypatch.setattr(calorie_service, "page_size_tuner", PageSizeTuner(settings.SEARCH_ADAPTIVE_PAGE_SIZES))
+        calls = []
+        state = {"position": 1}
+
+        async def fake_search(self, query, page_size=100, page_number=1):
+            calls.append((page_size, page_number))
+            positions = range((page_number - 1) * page_size + 1, min(page_number * page_size, 60) + 1)
+            foods = [
+                {"fdcId": position, "description": "Banana, raw" if position == state["position"] else f"Banana split sundae {position}"}
+                for position in positions
+            ]
+            return {"totalHits": 60, "foods": foods}
+
+        monkeypatch.setattr(CalorieService, "async_search_food", fake_search)
+        return calls, state
+
+    def _find(self, query="banana"):
+        return asyncio.run(CalorieService(api_key="test", mode="remote").async_find_best_match(query))
+
+    def test_stops_on_the_first_page_with_a_confident_match(self, search_pages):
+        calls, _ = search_pages
+        best = self._find()
+        assert best["fdcId"] == 1 and best["fuzzy_score"] > 0.7
+        assert calls == [(10, 1)]
+
+    def test_fetches_further_pages_only_until_confident(self, search_pages):
+        calls, state = search_pages
+        state["position"] = 25
+        assert self._find()["fdcId"] == 25
+        assert calls == [(10, 1), (10, 2), (10, 3)]
+
+        # The next search for the query starts with a page deep enough
+        calls.clear()
+        assert self._find()["fdcId"] == 25
+        assert calls == [(25, 1)]
+
+    def test_without_confident_match_returns_best_of_all_pages(self, search_pages):
+        calls, state = search_pages
+        state["position"] = None
+        best = self._find()
+        assert best["fuzzy_score"] < 0.7
+        assert sorted(calls) == [(10, page) for page in range(1, 7)]
+        assert calorie_service.page_size_tuner.initial_page_size("banana") == 100
+
+    def test_default_confidence_keeps_the_full_search_result(self, monkeypatch):
+        # "Banana, raw" on page 1 scores about 0.7; the exact "Banana" is result 25
+        monkeypatch.setattr(settings, "SEARCH_ADAPTIVE_PAGE_SIZES", [10, 25, 50, 100])
+        monkeypatch.setattr(calorie_service, "page_size_tuner", PageSizeTuner(settings.SEARCH_ADAPTIVE_PAGE_SIZES))
+        descriptions = {1: "Banana, raw", 25: "Banana"}
+
+        async def fake_search(self, query, page_size=100, page_number=1):
+            positions = range((page_number - 1) * page_size + 1, min(page_number * page_size, 60) + 1)
+            foods = [{"fdcId": position, "description": descriptions.get(position, f"Banana split sundae {position}")}
+                     for position in positions]
+            return {"totalHits": 60, "foods": foods}
+
+        monkeypatch.setattr(CalorieService, "async_search_food", fake_search)
+        assert settings.SEARCH_ADAPTIVE_CONFIDENCE == settings.FUZZY_MATCH_THRESHOLD
+        adaptive = self._find()
+        monkeypatch.setattr(settings, "SEARCH_ADAPTIVE_ENABLED", False)
+        full = self._find()
+        assert adaptive["fdcId"] == full["fdcId"] == 25
+
+
+class TestSplitSearch:
+
+    BRANCHES = {
+        ("Foundation", "SR Legacy"): [
+            {"fdcId": 1, "description": "Bananas, raw", "dataType": "Foundation"},
+            {"fdcId": 2, "description": "Bananas, dehydrated", "dataType": "SR Legacy"},
+        ],
+        ("Branded",): [
+            {"fdcId": 3, "description": "BANANA", "dataType": "Branded"},
+            {"fdcId": 1, "description": "Bananas, raw", "dataType": "Foundation"},
+        ],
+    }
+
+    @pytest.fixture
+    def branches(self, monkeypatch):
+        monkeypatch.setattr(settings, "SEARCH_SPLIT_ENABLED", True)
+        monkeypatch.setattr(settings, "SEARCH_SPLIT_GROUPS", [list(group) for group in self.BRANCHES])
+        monkeypatch.setattr(settings, "SEARCH_SPLIT_PAGE_SIZE", 25)
+        monkeypatch.setattr(settings, "SEARCH_SPLIT_TIMEOUT", 0.5)
+        calls = []
+        delays = {}
+
+        async def fake_search(self, query, page_size=100, page_number=1, data_types=None):
+            calls.append((page_size, tuple(data_types)))
+            if tuple(data_types) in delays:
+                await asyncio.sleep(delays[tuple(data_types)])
+            return {"totalHits": 2, "foods": TestSplitSearch.BRANCHES[tuple(data_types)]}
+
+        monkeypatch.setattr(CalorieService, "async_search_food", fake_search)
+        return calls, delays
+
+    def test_cache_key_includes_data_types(self):
+        assert FoodSearchCache.make_key("apple", 25) != FoodSearchCache.make_key("apple", 25, data_types=["Branded"])
+        assert FoodSearchCache.make_key("apple", 25, data_types=["Branded"]) != FoodSearchCache.make_key("apple", 25, data_types=["Foundation"])
+
+    def test_merged_ranking_weights_data_types(self):
+        query = "banana"
+        branches = list(self.BRANCHES.values())
+        ranked = CalorieService.rank_merged(query, branches, {})
+        assert [food["fdcId"] for _, _, food in ranked] == [3, 1, 2]
+
+        ranked = CalorieService.rank_merged(query, branches, {"Branded": 0.4}, k=2)
+        assert [food["fdcId"] for _, _, food in ranked] == [1, 2]
+        score, ratio, _ = ranked[0]
+        assert score == ratio
+
+    def test_branches_are_searched_concurrently_and_merged(self, branches, monkeypatch):
+        calls, _ = branches
+        monkeypatch.setattr(settings, "SEARCH_SPLIT_PRIORITY", {"Branded": 0.5})
+        best = asyncio.run(CalorieService(api_key="test").async_find_best_match("banana"))
+        assert best["fdcId"] == 1 and 0 < best["fuzzy_score"] < 1
+        assert sorted(calls) == [(25, ("Branded",)), (25, ("Foundation", "SR Legacy"))]
+
+    def test_slow_branch_is_left_out(self, branches, monkeypatch):
+        _, delays = branches
+        monkeypatch.setattr(settings, "SEARCH_SPLIT_TIMEOUT", 0.05)
+        delays[("Branded",)] = 5
+        ranked = asyncio.run(asyncio.wait_for(CalorieService(api_key="test").async_search_split("banana"), 1))
+        assert [food["fdcId"] for _, _, food in ranked] == [1, 2]
+
+        delays[("Foundation", "SR Legacy")] = 5
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(CalorieService(api_key="test").async_search_split("banana"))
+
+
+class TestPortionEngine:
+
+    def test_tables_from_search_and_details_shapes(self):
+        branded = build_portion_table({"servingSize": 2, "servingSizeUnit": "oz", "householdServingFullText": "4 slices"})
+        assert branded.serving_grams == pytest.approx(56.7, abs=0.01)
+        assert grams_for(branded, 2, "slices") == pytest.approx(28.35, abs=0.01)
+
+        sr_legacy = build_portion_table({"foodMeasures": [
+            {"disseminationText": "1 slice", "gramWeight": 28, "rank": 2},
+            {"disseminationText": "1 cup, diced", "gramWeight": 132, "rank": 1},
+        ]})
+        assert sr_legacy.serving_grams == 132
+        assert grams_for(sr_legacy, 0.5, "cup") == 66
+
+        survey = build_portion_table({"foodPortions": [
+            {"measureUnit": {"name": "undetermined"}, "modifier": "10205", "portionDescription": "2 tablespoons", "gramWeight": 30, "sequenceNumber": 1},
+            {"measureUnit": {"name": "cup"}, "modifier": "shredded", "amount": 0.5, "gramWeight": 56, "sequenceNumber": 2},
+        ]})
+        assert survey.detailed and survey.measures == (("tablespoons", 15.0), ("cup, shredded", 112.0))
+        assert grams_for(survey, 1, "tablespoon") == 15 and grams_for(survey, 1, "cups") == 112
+
+    def test_units_without_a_table(self):
+        assert grams_for(None, 2) == 200
+        assert grams_for(None, 1, "lb") == pytest.approx(453.59, abs=0.01)
+        with pytest.raises(UnknownUnitError):
+            grams_for(None, 1, "cup")
+
+    def test_scale_rows(self):
+        assert scale_rows([[400, None], [10, 2]], [28, 250]) == [[112.0, None], [25.0, 5.0]]
+
+    def test_detailed_tables_are_kept(self):
+        PortionManager.clear()
+        detailed = PortionManager.table_for({"fdcId": 5, "foodPortions": [{"measureUnit": {"name": "cup"}, "gramWeight": 240}]})
+        assert PortionManager.table_for({"fdcId": 5, "foodMeasures": []}) is detailed
+        assert PortionManager.grams(5, 1, "cup") == 240
+        PortionManager.clear()
+
+    def test_lookup_scales_foods_without_an_fdc_id(self, monkeypatch):
+        async def fake_find(self, query):
+            return {"description": "Cheddar", "servingSize": 28, "servingSizeUnit": "g", "householdServingFullText": "1/4 cup",
+                    "foodNutrients": [{"nutrientName": "Energy", "unitName": "KCAL", "value": 400}]}
+
+        monkeypatch.setattr(CalorieService, "async_find_best_match", fake_find)
+        PortionManager.clear()
+        result = asyncio.run(CalorieProcessor.lookup("cheddar", 1, "cup"))
+        # Not cached without an fdcId, yet the table built for the match is used
+        assert PortionManager.stats()["entries"] == 0
+        assert result["portion"]["grams"] == 112.0
+        assert result["portion"]["calories"] == 448.0
+        assert result["portion"]["measures"] == {"cup": 112.0}
+
+
+class TestMicroBatcher:
+
+    def test_concurrent_loads_share_batches(self):
+        batches = []
+
+        async def fetch_many(keys):
+            batches.append(keys)
+            await asyncio.sleep(0)
+            return {key: key * 10 for key in keys if key != 7}
+
+        async def scenario():
+            batcher = MicroBatcher(fetch_many, max_batch=4, window=0.01)
+            values = await asyncio.gather(*(batcher.load(key) for key in [1, 2, 2, 3, 4, 5, 6, 7]))
+            return values, batcher.stats()
+
+        values, stats = asyncio.run(scenario())
+        assert values == [10, 20, 20, 30, 40, 50, 60, None]
+        # The first batch is sent as soon as it is full, the rest after the window
+        assert batches == [[1, 2, 3, 4], [5, 6, 7]]
+        assert stats == {"batches": 2, "keys": 7, "coalesced": 1, "pending": 0}
+
+    def test_errors_fail_the_whole_batch(self):
+        async def fetch_many(keys):
+            raise RuntimeError("upstream down")
+
+        async def scenario():
+            batcher = MicroBatcher(fetch_many, window=0.001)
+            return await asyncio.gather(batcher.load(1), batcher.load(2), return_exceptions=True)
+
+        assert [str(result) for result in asyncio.run(scenario())] == ["upstream down", "upstream down"]
+
+
+class TestFoodDetails:
+
+    @pytest.fixture
+    def upstream(self, monkeypatch):
+        """Runs scenarios against a fake `POST foods` knowing fdcIds below 1000."""
+        monkeypatch.setattr(settings, "SEARCH_CACHE_ENABLED", True)
+        monkeypatch.setattr(settings, "SEARCH_CACHE_REDIS_ENABLED", False)
+        FoodDetailCache.clear()
+        requests = []
+        state = {"status": 200}
+
+        def handler(request):
+            fdc_ids = json.loads(request.content)["fdcIds"]
+            requests.append((request.method, request.url.path, fdc_ids))
+            if state["status"] != 200:
+                return httpx.Response(state["status"], json={"error": "upstream"})
+            return httpx.Response(200, json=[
+                {"fdcId": fdc_id, "description": f"Food {fdc_id}", "foodCategory": {"description": "Fruits"},
+                 "foodNutrients": [{"nutrient": {"id": 1008, "number": "208", "name": "Energy", "unitName": "kcal"}, "amount": fdc_id}]}
+                for fdc_id in fdc_ids if fdc_id < 1000
+            ])
+
+        def run(scenario):
+            async def runner():
+                HttpClientManager._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+                try:
+                    return await scenario(CalorieService(api_key="test", mode="remote"))
+                finally:
+                    await HttpClientManager.close_client()
+
+            return asyncio.run(runner())
+
+        yield run, requests, state
+        FoodDetailCache.clear()
+
+    def test_concurrent_requests_are_batched_and_cached(self, upstream):
+        run, requests, _ = upstream
+
+        async def scenario(service):
+            single = await asyncio.gather(*(service.async_get_food(fdc_id) for fdc_id in range(1, 26)))
+            return single, await service.async_get_foods([3, 1000, 3])
+
+        single, foods = run(scenario)
+        assert [food["fdcId"] for food in single] == list(range(1, 26))
+        # 3 comes from the cache; unknown foods are None
+        assert foods == {3: single[2], 1000: None}
+        assert [(method, path, fdc_ids[0], len(fdc_ids)) for method, path, fdc_ids in requests] == [
+            ("POST", "/fdc/v1/foods", 1, 20), ("POST", "/fdc/v1/foods", 21, 5), ("POST", "/fdc/v1/foods", 1000, 1),
+        ]
+
+    def test_upstream_errors_are_service_unavailable(self, upstream):
+        run, _, state = upstream
+        state["status"] = 500
+        with pytest.raises(ServiceUnavailableException):
+            run(lambda service: service.async_get_food(1))
+
+    def test_details_result(self, upstream):
+        run, _, _ = upstream
+        result = run(lambda service: CalorieProcessor.food_details(7))
+        assert result["best_match"]["food_id"] == 7
+        assert result["best_match"]["food_category"] == "Fruits"
+        assert result["calories"] == 7
+        assert result["food"]["description"] == "Food 7"
+
+        result = run(lambda service: CalorieProcessor.food_details(8, 250, "g"))
+        assert result["portion"]["calories"] == 20.0
+        assert result["portion"]["serving_grams"] == 100
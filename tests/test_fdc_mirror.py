@@ -0,0 +1,148 @@
+import asyncio
+import csv
+import json
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.models_base import Base
+from app.managers.fdc_manager import FdcManager
+from app.models import fdc_food  # noqa: F401  (registers the mirror tables)
+from app.processors.fdc_import_processor import FdcImportProcessor
+from app.utils import json_stream
+from app.utils.json_stream import JsonArrayStreamer
+
+
+def _write_csv(path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def csv_dump(tmp_path):
+    _write_csv(tmp_path / "nutrient.csv", ["id", "name", "unit_name", "nutrient_nbr", "rank"], [
+        ["1008", "Energy", "KCAL", "208.0", "300"],
+        ["1003", "Protein", "G", "203.0", "600"],
+    ])
+    _write_csv(tmp_path / "food_category.csv", ["id", "code", "description"], [["1", "0100", "Dairy and Egg Products"]])
+    _write_csv(tmp_path / "measure_unit.csv", ["id", "name"], [["1000", "cup"]])
+    _write_csv(tmp_path / "branded_food.csv", ["fdc_id", "brand_owner", "brand_name", "serving_size", "serving_size_unit"], [
+        ["3", "Acme Foods", "ACME", "28", "g"],
+    ])
+    _write_csv(tmp_path / "food.csv", ["fdc_id", "data_type", "description", "food_category_id", "publication_date"], [
+        ["1", "sr_legacy_food", "Cheese, cheddar", "1", "2019-04-01"],
+        ["2", "sr_legacy_food", "Cheese, cheddar, sharp, sliced", "1", "2019-04-01"],
+        ["3", "branded_food", "CHEDDAR CHEESE CRACKERS", "", "2021-01-01"],
+        ["4", "sub_sample_food", "Cheese, cheddar (sample)", "1", "2019-04-01"],
+    ])
+    _write_csv(tmp_path / "food_nutrient.csv", ["id", "fdc_id", "nutrient_id", "amount"], [
+        ["10", "1", "1008", "404"], ["11", "1", "1003", "22.9"], ["12", "4", "1008", "400"],
+    ])
+    _write_csv(tmp_path / "food_portion.csv", ["id", "fdc_id", "amount", "measure_unit_id", "modifier", "gram_weight"], [
+        ["20", "1", "1", "1000", "diced", "132"],
+    ])
+    return tmp_path
+
+
+def _run_with_db(scenario):
+    async def runner():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)() as db:
+            result = await scenario(db)
+        await engine.dispose()
+        return result
+
+    return asyncio.run(runner())
+
+
+class TestFdcMirror:
+
+    def test_csv_import_and_search(self, csv_dump):
+        async def scenario(db):
+            counts = await FdcImportProcessor(db).import_path(csv_dump)
+            return counts, await FdcManager.search_foods(db, "cheddar cheese", page_size=10)
+
+        counts, data = _run_with_db(scenario)
+        assert counts["foods"] == 3
+        assert counts["food_nutrients"] == 2
+        assert data["totalHits"] == 3
+        best = data["foods"][0]
+        assert best["description"] == "Cheese, cheddar"
+        assert best["dataType"] == "SR Legacy"
+        assert best["foodCategory"] == "Dairy and Egg Products"
+        assert {n["nutrientNumber"]: n["value"] for n in best["foodNutrients"]} == {"208": 404.0, "203": 22.9}
+        branded = next(food for food in data["foods"] if food["fdcId"] == 3)
+        assert branded["brandOwner"] == "Acme Foods" and branded["servingSize"] == 28.0
+
+    def test_json_import(self, tmp_path):
+        dump = tmp_path / "sr_legacy.json"
+        dump.write_text(json.dumps({"SRLegacyFoods": [{
+            "fdcId": 171279,
+            "dataType": "SR Legacy",
+            "description": "Cheese, cheddar",
+            "foodCategory": {"description": "Dairy and Egg Products"},
+            "foodNutrients": [{"nutrient": {"id": 1008, "number": "208", "name": "Energy", "unitName": "kcal"}, "amount": 404}],
+            "foodPortions": [{"id": 1, "gramWeight": 132, "amount": 1, "measureUnit": {"name": "cup"}, "modifier": "diced"}],
+        }]}))
+
+        async def scenario(db):
+            await FdcImportProcessor(db).import_path(dump)
+            return await FdcManager.search_foods(db, "cheddar", page_size=10), await FdcManager.get_portions(db, [171279])
+
+        data, portions = _run_with_db(scenario)
+        assert [food["fdcId"] for food in data["foods"]] == [171279]
+        assert portions[171279][0].gram_weight == 132.0
+
+
+    def test_food_details(self, csv_dump):
+        async def scenario(db):
+            await FdcImportProcessor(db).import_path(csv_dump)
+            return await FdcManager.get_foods(db, [1, 99])
+
+        foods = _run_with_db(scenario)
+        assert list(foods) == [1]
+        details = foods[1]
+        assert details["description"] == "Cheese, cheddar"
+        assert {entry["nutrient"]["number"]: entry["amount"] for entry in details["foodNutrients"]} == {"208": 404.0, "203": 22.9}
+        assert details["foodPortions"][0]["gramWeight"] == 132.0
+        assert details["foodPortions"][0]["measureUnit"] == {"name": "cup"}
+
+
+class TestJsonArrayStreamer:
+
+    def test_items_are_yielded_across_chunk_boundaries(self):
+        document = {"totalHits": 12345, "foods": [{"fdcId": i, "description": "é" * i} for i in range(20)], "aggregations": {}}
+        raw = json.dumps(document).encode()
+        streamer = JsonArrayStreamer("foods")
+        items = []
+        for start in range(0, len(raw), 7):
+            items += streamer.feed(raw[start:start + 7])
+        items += streamer.close()
+        assert items == document["foods"]
+        assert streamer.fields == {"totalHits": 12345, "aggregations": {}}
+
+    def test_large_items_are_decoded_once_complete(self, monkeypatch):
+        decoder = json_stream._decoder
+        calls = []
+
+        class CountingDecoder:
+            def raw_decode(self, text, pos):
+                calls.append(pos)
+                return decoder.raw_decode(text, pos)
+
+        monkeypatch.setattr(json_stream, "_decoder", CountingDecoder())
+        # Brackets and escaped quotes inside strings do not count towards the depth
+        food = {"fdcId": 1, "foodNutrients": [{"name": 'x]}"[{\\', "value": i} for i in range(200)]}
+        raw = json.dumps({"foods": [food, {"fdcId": 2}]}).encode()
+        streamer = JsonArrayStreamer("foods")
+        items = []
+        for start in range(0, len(raw), 16):
+            items += streamer.feed(raw[start:start + 16])
+        items += streamer.close()
+        assert items == [food, {"fdcId": 2}]
+        # Two attempts while incomplete and one once whole, not one per chunk
+        assert len(calls) < 10
@@ -0,0 +1,24 @@
+import asyncio
+from app.managers.http_client_manager import HttpClientManager
+from app.services.external_services.calorie_service import CalorieService
+from app.config.settings import settings
+
+
+class TestHttpClientManager:
+
+    def test_client_is_shared_until_closed(self):
+        async def scenario():
+            first = await HttpClientManager.get_client()
+            second = await HttpClientManager.get_client()
+            assert first is second
+            await HttpClientManager.close_client()
+            assert first.is_closed
+            third = await HttpClientManager.get_client()
+            assert third is not first
+            await HttpClientManager.close_client()
+
+        asyncio.run(scenario())
+
+    def test_calorie_service_uses_configured_timeout(self):
+        service = CalorieService(api_key="test")
+        assert service.timeout == settings.USDA_API_TIMEOUT
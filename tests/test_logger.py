@@ -3,6 +3,10 @@ Example usage of the AppLogger class for the meal calorie counter application.
 This file demonstrates various logging features and patterns.
 """
 
+import asyncio
+import json
+import pytest
+from app.utils.metrics import LatencyHistogram, latency_snapshot
 from app.utils.logger import AppLogger, log_function_call, info, error, debug
 
 
@@ -142,6 +146,130 @@ def custom_logger_example():
     custom_logger.debug("Debug message from custom logger")
 
 
+class _CountingStr:
+    renders = 0
+
+    def __str__(self):
+        _CountingStr.renders += 1
+        return "rendered"
+
+
+class TestLoggingPipeline:
+
+    def _logger(self, tmp_path, **kwargs):
+        return AppLogger(
+            name="pipeline_test",
+            log_file=str(tmp_path / "app.log"),
+            enable_console=False,
+            **kwargs
+        )
+
+    def test_json_lines_are_written_by_the_writer_thread(self, tmp_path):
+        logger = self._logger(tmp_path, json_format=True)
+        logger.info("Lookup done", query="apple", calories=52)
+        logger.close()
+        entry = json.loads((tmp_path / "app.log").read_text().strip())
+        assert entry["message"] == "Lookup done"
+        assert entry["level"] == "INFO"
+        assert (entry["query"], entry["calories"]) == ("apple", 52)
+
+    def test_text_format_keeps_context_suffix(self, tmp_path):
+        logger = self._logger(tmp_path)
+        logger.log_request("GET", "/api", 200, 0.5)
+        logger.close()
+        line = (tmp_path / "app.log").read_text()
+        assert "HTTP GET /api - Status: 200 - Time: 0.500s | Context: method=GET" in line
+
+    def test_disabled_levels_do_no_formatting(self, tmp_path):
+        logger = self._logger(tmp_path, log_level="WARNING")
+        _CountingStr.renders = 0
+        logger.info("never shown", value=_CountingStr())
+        logger.log_api_call("USDA", _CountingStr(), True)
+        logger.close()
+        assert _CountingStr.renders == 0
+        assert (tmp_path / "app.log").read_text() == ""
+
+    def test_sampling_keeps_failures(self, tmp_path):
+        logger = self._logger(tmp_path, json_format=True, sample_rates={"request": 0.0, "api_call": 0.0})
+        for _ in range(10):
+            logger.log_request("GET", "/api", 200, 0.1)
+            logger.log_api_call("USDA", "/foods/search", True)
+        logger.log_request("GET", "/api", 503, 0.1)
+        logger.log_api_call("USDA", "/foods/search", False)
+        logger.close()
+        lines = (tmp_path / "app.log").read_text().splitlines()
+        assert [json.loads(line)["message"] for line in lines] == [
+            "HTTP GET /api - Status: 503 - Time: 0.100s",
+            "API Call: USDA /foods/search - FAILED",
+        ]
+
+    def test_full_queue_drops_instead_of_blocking(self, tmp_path):
+        logger = self._logger(tmp_path, queue_size=1)
+        # With the writer stopped nothing drains the queue
+        logger.close()
+        for i in range(5):
+            logger.info("burst %s", i)
+        assert logger.dropped_records() == 4
+
+
+class TestLogFunctionCall:
+
+    def _logger(self, tmp_path, level):
+        return AppLogger(name="decorator_test", log_level=level, log_file=str(tmp_path / "calls.log"), enable_console=False, json_format=True)
+
+    def test_coroutines_are_timed_into_a_histogram(self, tmp_path):
+        logger = self._logger(tmp_path, "INFO")
+
+        @log_function_call(logger, histogram="test.async_call")
+        async def lookup(query):
+            await asyncio.sleep(0.01)
+            return query
+
+        _CountingStr.renders = 0
+        assert asyncio.run(lookup(_CountingStr())) is not None
+        logger.close()
+        snapshot = latency_snapshot("test.async_call")["test.async_call"]
+        assert snapshot["count"] == 1 and snapshot["max_seconds"] >= 0.01
+        # INFO level: arguments were never rendered and nothing was written
+        assert _CountingStr.renders == 0
+        assert (tmp_path / "calls.log").read_text() == ""
+
+    def test_debug_records_are_sampled(self, tmp_path):
+        logger = self._logger(tmp_path, "DEBUG")
+        traced = log_function_call(logger, sample_rate=1.0)(lambda value: value)
+        skipped = log_function_call(logger, sample_rate=0.0)(lambda value: value)
+        traced(1)
+        skipped(2)
+        logger.close()
+        messages = [json.loads(line)["message"] for line in (tmp_path / "calls.log").read_text().splitlines()]
+        assert messages == ["Entering function <lambda>", "Function <lambda> completed successfully"]
+        assert skipped.histogram.count >= 1
+
+    def test_exceptions_are_logged_and_reraised(self, tmp_path):
+        logger = self._logger(tmp_path, "INFO")
+
+        @log_function_call(logger)
+        async def broken():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            asyncio.run(broken())
+        logger.close()
+        entry = json.loads((tmp_path / "calls.log").read_text())
+        assert entry["message"] == "Exception in Function broken: boom"
+        assert broken.histogram.count >= 1
+
+    def test_histogram_percentiles(self):
+        histogram = LatencyHistogram("test.percentiles")
+        for _ in range(90):
+            histogram.observe(0.002)
+        for _ in range(10):
+            histogram.observe(0.2)
+        assert 0.001 <= histogram.percentile(50) <= 0.0025
+        assert 0.1 <= histogram.percentile(99) <= 0.2
+        assert histogram.snapshot()["buckets"]["0.0025"] == 90
+
+
 if __name__ == "__main__":
     # Run all examples
     print("Running logger examples...")
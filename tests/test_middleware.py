@@ -0,0 +1,362 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import httpx
+from fastapi import FastAPI, Request
+from app.api.deps import get_request_db
+from app.config.settings import settings
+from app.managers.metrics_manager import MetricsManager
+from app.middleware.authentication_middleware import CustomAuthMiddleware
+from app.middleware.metrics import HTTP_REQUESTS, MetricsMiddleware
+from app.middleware.rate_limiter import RateLimiterMiddleware
+from app.middleware.security import SecurityHeadersMiddleware, DBSessionMiddleware
+from app.managers.rate_limit_manager import RATE_LIMIT_DECISIONS, RateLimiter, TOKEN_BUCKET, LEASED
+from app.processors.auth_processor import AuthProcessor
+from app.utils.metrics import MetricsRegistry, merge_snapshots, render_prometheus
+
+
+def _build_app(max_requests: int = 100) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/whoami")
+    async def whoami(request: Request):
+        return {"sub": request.state.user["sub"]}
+
+    @app.post("/api/v1/auth/login/")
+    async def login():
+        return {"ok": True}
+
+    app.add_middleware(CustomAuthMiddleware)
+    app.add_middleware(RateLimiterMiddleware, max_requests=max_requests, window_seconds=60, use_redis=False)
+    app.add_middleware(SecurityHeadersMiddleware)
+    return app
+
+
+def _requests(app: FastAPI, calls):
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return [await call(client) for call in calls]
+
+    return asyncio.run(scenario())
+
+
+class TestMiddlewareStack:
+
+    def test_authentication(self):
+        token = AuthProcessor.create_access_token({"sub": "user-1", "email": "user@example.com"})
+        missing, invalid, valid, exempt = _requests(_build_app(), [
+            lambda client: client.get("/whoami"),
+            lambda client: client.get("/whoami", headers={"Authorization": "Bearer not-a-jwt"}),
+            lambda client: client.get("/whoami", headers={"Authorization": f"Bearer {token}"}),
+            lambda client: client.post("/api/v1/auth/login/"),
+        ])
+        assert missing.status_code == 401
+        assert missing.json() == {"detail": "Unauthorized: Missing or invalid token."}
+        assert invalid.json() == {"detail": "Unauthorized: Invalid or expired token."}
+        assert valid.json() == {"sub": "user-1"}
+        assert exempt.status_code == 200
+
+    def test_security_headers_are_added_to_every_response(self):
+        response, = _requests(_build_app(), [lambda client: client.get("/whoami")])
+        assert response.headers["x-frame-options"] == "DENY"
+        assert response.headers["x-content-type-options"] == "nosniff"
+
+    def test_rate_limit_returns_429(self):
+        responses = _requests(_build_app(max_requests=2), [lambda client: client.post("/api/v1/auth/login/")] * 3)
+        assert [response.status_code for response in responses] == [200, 200, 429]
+        assert responses[-1].json() == {"detail": "Too Many Requests"}
+        assert int(responses[-1].headers["retry-after"]) >= 1
+
+    def test_rate_limit_is_keyed_on_authenticated_user(self):
+        first = AuthProcessor.create_access_token({"sub": "user-1", "email": "one@example.com"})
+        second = AuthProcessor.create_access_token({"sub": "user-2", "email": "two@example.com"})
+        responses = _requests(_build_app(max_requests=1), [
+            lambda client: client.get("/whoami", headers={"Authorization": f"Bearer {first}"}),
+            lambda client: client.get("/whoami", headers={"Authorization": f"Bearer {first}"}),
+            lambda client: client.get("/whoami", headers={"Authorization": f"Bearer {second}"}),
+        ])
+        assert [response.status_code for response in responses] == [200, 429, 200]
+
+    def test_rejected_tokens_are_rate_limited_by_ip(self):
+        responses = _requests(_build_app(max_requests=2), [
+            lambda client: client.get("/whoami", headers={"Authorization": "Bearer not-a-jwt"}),
+        ] * 3 + [lambda client: client.get("/whoami")])
+        assert [response.status_code for response in responses] == [401, 401, 429, 429]
+
+
+class TestRateLimiter:
+
+    def _hits(self, limiter, keys):
+        async def scenario():
+            return [await limiter.hit(key) for key in keys]
+
+        return asyncio.run(scenario())
+
+    def test_sliding_window_counts_only_allowed_hits(self):
+        limiter = RateLimiter(limit=3, window_seconds=3600, use_redis=False)
+        decisions = self._hits(limiter, ["a"] * 5 + ["b"])
+        assert [decision.allowed for decision in decisions] == [True, True, True, False, False, True]
+        assert decisions[0].remaining == 2
+        assert decisions[3].retry_after > 0
+        assert limiter.stats["limited"] == 2
+
+    def test_token_bucket_refills_over_time(self):
+        limiter = RateLimiter(limit=2, window_seconds=3600, strategy=TOKEN_BUCKET, use_redis=False)
+        assert [decision.allowed for decision in self._hits(limiter, ["a"] * 3)] == [True, True, False]
+        # Pretend the last refill was a full window ago
+        limiter._local["a"][2] -= 3600
+        assert self._hits(limiter, ["a"])[0].allowed
+
+    def test_local_fallback_is_bounded(self):
+        limiter = RateLimiter(limit=5, window_seconds=60, use_redis=False, max_local_keys=10)
+        self._hits(limiter, [f"client-{i}" for i in range(100)])
+        assert len(limiter._local) == 10
+        assert "client-99" in limiter._local and "client-0" not in limiter._local
+
+    def test_expired_windows_are_evicted(self):
+        limiter = RateLimiter(limit=5, window_seconds=60, use_redis=False)
+        self._hits(limiter, ["old"])
+        limiter._local["old"][0] -= 121
+        self._hits(limiter, ["new"])
+        assert list(limiter._local) == ["new"]
+
+    def test_unreachable_redis_falls_back_to_local_limits(self, monkeypatch):
+        limiter = RateLimiter(limit=1, window_seconds=60)
+
+        async def unreachable(key):
+            raise ConnectionError("redis down")
+
+        monkeypatch.setattr(limiter, "_hit_redis", unreachable)
+        decisions = self._hits(limiter, ["a", "a"])
+        assert [decision.allowed for decision in decisions] == [True, False]
+        # Redis is not retried on every request while it is down
+        assert limiter.stats["redis_errors"] == 1
+
+
+class _SharedQuota:
+    """Stands in for the Redis reservation scripts shared by several workers."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.calls = 0
+
+    def attach(self, limiter):
+        async def reserve(key, requested, now):
+            self.calls += 1
+            granted = min(requested, self.limit - self.used)
+            self.used += granted
+            return granted, self.limit - self.used, 0.0 if granted else 30.0, key, int(now // limiter.window_seconds)
+
+        async def release(releases):
+            self.used -= sum(amount for _, amount in releases)
+
+        limiter._reserve = reserve
+        limiter._release = release
+        return limiter
+
+
+class TestLeasedRateLimiter:
+
+    def test_workers_never_exceed_the_shared_limit(self):
+        quota = _SharedQuota(limit=100)
+        workers = [quota.attach(RateLimiter(limit=100, window_seconds=3600, mode=LEASED, lease_fraction=0.1)) for _ in range(2)]
+
+        async def scenario():
+            return [await workers[i % 2].hit("user:1") for i in range(150)]
+
+        decisions = asyncio.run(scenario())
+        assert sum(decision.allowed for decision in decisions) == 100
+        # One reservation per lease of 10, plus one refusal per worker
+        assert quota.calls == 12
+
+    def test_decisions_are_labelled_by_source(self):
+        limiter = _SharedQuota(limit=100).attach(RateLimiter(limit=100, window_seconds=3600, mode=LEASED, lease_fraction=0.1))
+        from_redis = RATE_LIMIT_DECISIONS.labels(LEASED, "redis", "allowed")
+        from_lease = RATE_LIMIT_DECISIONS.labels(LEASED, "lease", "allowed")
+        before = from_redis.value, from_lease.value
+
+        async def scenario():
+            return [await limiter.hit("user:1") for _ in range(10)]
+
+        asyncio.run(scenario())
+        # One reservation of 10 hits, then nine decisions from the lease
+        assert (from_redis.value, from_lease.value) == (before[0] + 1, before[1] + 9)
+
+    def test_idle_leases_are_handed_back(self):
+        quota = _SharedQuota(limit=100)
+        limiter = quota.attach(RateLimiter(limit=100, window_seconds=3600, mode=LEASED, lease_fraction=0.1, sync_interval=0.01))
+
+        async def scenario():
+            await limiter.hit("user:1")
+            assert quota.used == 10
+            await asyncio.sleep(0.02)
+            await limiter.hit("user:2")
+            await limiter._sync_task
+
+        asyncio.run(scenario())
+        # user:1 returned its 9 unused hits; user:2 holds a fresh lease
+        assert quota.used == 11
+        assert list(limiter._leases) == ["user:2"]
+
+
+class _FakeSession:
+    instances = []
+
+    def __init__(self):
+        self.closed = False
+        _FakeSession.instances.append(self)
+
+    async def close(self):
+        self.closed = True
+
+
+class TestLazyDBSession:
+
+    def _build_app(self):
+        app = FastAPI()
+
+        @app.get("/no-db")
+        async def no_db():
+            return {"ok": True}
+
+        @app.get("/with-db")
+        async def with_db(request: Request):
+            return {"same": get_request_db(request) is get_request_db(request)}
+
+        app.add_middleware(DBSessionMiddleware, session_factory=_FakeSession)
+        return app
+
+    def test_session_is_only_opened_on_demand_and_always_closed(self):
+        _FakeSession.instances.clear()
+        no_db, with_db = _requests(self._build_app(), [
+            lambda client: client.get("/no-db"),
+            lambda client: client.get("/with-db"),
+        ])
+        assert no_db.status_code == 200
+        assert with_db.json() == {"same": True}
+        assert len(_FakeSession.instances) == 1
+        assert _FakeSession.instances[0].closed
+
+
+class TestMetrics:
+
+    def test_registry_renders_prometheus_text(self):
+        registry = MetricsRegistry()
+        requests = registry.counter("requests_total", "Requests", ("route",))
+        latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        registry.register_collector(lambda: [("queue_depth", "gauge", "Queued items", (), [((), 3)])])
+        requests.inc('/a"b')
+        requests.inc('/a"b', amount=2)
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(5)
+
+        text = render_prometheus(registry.collect())
+        assert "# TYPE requests_total counter" in text
+        assert 'requests_total{route="/a\\"b"} 3' in text
+        assert 'latency_seconds_bucket{le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{le="1.0"} 2' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+        assert "latency_seconds_count 3" in text
+        assert "queue_depth 3" in text
+
+    def test_merge_snapshots_adds_up_processes(self):
+        registry = MetricsRegistry()
+        requests = registry.counter("requests_total", "Requests", ("route",))
+        latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1,))
+        requests.inc("/a")
+        latency.observe(0.05)
+        snapshot = registry.collect()
+
+        merged = merge_snapshots([snapshot, snapshot])
+        assert merged["requests_total"]["samples"] == [[["/a"], 2.0]]
+        histogram = merged["latency_seconds"]["samples"][0][1]
+        assert histogram["counts"] == [2, 0]
+        assert histogram["count"] == 2
+
+    def test_middleware_labels_requests_by_route_template(self):
+        app = FastAPI()
+
+        @app.get("/items/{item_id}")
+        async def item(item_id: int):
+            return {"id": item_id}
+
+        app.add_middleware(MetricsMiddleware)
+        matched = HTTP_REQUESTS.labels("GET", "/items/{item_id}", "200")
+        unmatched = HTTP_REQUESTS.labels("GET", "unmatched", "404")
+        before = matched.value, unmatched.value
+
+        _requests(app, [
+            lambda client: client.get("/items/1"),
+            lambda client: client.get("/items/2"),
+            lambda client: client.get("/missing"),
+        ])
+        assert (matched.value, unmatched.value) == (before[0] + 2, before[1] + 1)
+
+    def test_endpoint_needs_the_metrics_token_unless_public(self, monkeypatch):
+        app = FastAPI()
+
+        @app.get("/metrics")
+        async def metrics():
+            return {"ok": True}
+
+        app.add_middleware(CustomAuthMiddleware)
+        user_token = AuthProcessor.create_access_token({"sub": "user-1", "email": "user@example.com"})
+        calls = [
+            lambda client: client.get("/metrics"),
+            lambda client: client.get("/metrics", headers={"Authorization": f"Bearer {user_token}"}),
+            lambda client: client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}),
+        ]
+        monkeypatch.setattr(settings, "METRICS_PUBLIC", False)
+        monkeypatch.setattr(settings, "METRICS_TOKEN", "")
+        assert [response.status_code for response in _requests(app, calls)] == [401, 401, 401]
+        monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-secret")
+        assert [response.status_code for response in _requests(app, calls)] == [401, 401, 200]
+        monkeypatch.setattr(settings, "METRICS_PUBLIC", True)
+        assert [response.status_code for response in _requests(app, calls)] == [200, 200, 200]
+
+    def test_multiprocess_render_sums_worker_files(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "METRICS_MULTIPROC_DIR", str(tmp_path))
+        other = {"http_requests_total": {
+            "type": "counter", "help": "HTTP requests", "labelnames": ["method", "route", "status"],
+            "samples": [[["GET", "/other-worker", "200"], 5.0]],
+        }}
+        (tmp_path / "metrics_1.json").write_text(json.dumps(other))
+
+        text = MetricsManager.render()
+        assert 'http_requests_total{method="GET",route="/other-worker",status="200"} 5' in text
+        assert {path.name for path in tmp_path.iterdir()} == {"metrics_1.json", f"metrics_{os.getpid()}.json"}
+
+    def test_restarted_worker_archives_dead_worker_files(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "METRICS_MULTIPROC_DIR", str(tmp_path))
+        monkeypatch.setattr(settings, "METRICS_ENABLED", True)
+        exited = subprocess.Popen([sys.executable, "-c", ""])
+        exited.wait()
+
+        def snapshot(route, requests):
+            return {
+                "http_requests_total": {
+                    "type": "counter", "help": "HTTP requests", "labelnames": ["method", "route", "status"],
+                    "samples": [[["GET", route, "200"], requests]],
+                },
+                "calorie_history_queue_depth": {"type": "gauge", "help": "Queued", "labelnames": [], "samples": [[[], 7.0]]},
+            }
+
+        # A crashed worker, and an earlier worker whose PID this process now has
+        (tmp_path / f"metrics_{exited.pid}.json").write_text(json.dumps(snapshot("/dead-worker", 5.0)))
+        (tmp_path / f"metrics_{os.getpid()}.json").write_text(json.dumps(snapshot("/dead-worker", 3.0)))
+
+        async def restart():
+            await MetricsManager.start()
+            await MetricsManager.stop()
+
+        asyncio.run(restart())
+        files = {path.name for path in tmp_path.iterdir()}
+        assert files == {"metrics.lock", MetricsManager.ARCHIVE_NAME, f"metrics_{os.getpid()}.json"}
+        text = MetricsManager.render()
+        assert 'http_requests_total{method="GET",route="/dead-worker",status="200"} 8' in text
+        archived = json.loads((tmp_path / MetricsManager.ARCHIVE_NAME).read_text())
+        assert "calorie_history_queue_depth" not in archived